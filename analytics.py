@@ -0,0 +1,440 @@
+# ============================================================
+# 🦆 DuckDB Analytics Engine (optional)
+# ------------------------------------------------------------
+# The Analysis page's GROUP BY / SUM / COUNT queries scan whole
+# tables, which row-oriented SQLite does one row at a time. With
+# the "DuckDB engine" toggle on they run in an in-process DuckDB
+# instead, on a columnar copy of the four base tables that is
+# refreshed in the background whenever the database changed.
+# Features:
+# ✅ Optional: duckdb is imported on first use; without it the toggle is hidden
+# ✅ Results come back as Arrow tables (straight into st.dataframe)
+# ✅ Read-only: one SELECT per query, no file / network access
+# ✅ Same time budget, row cap & cancel button as the SQLite jobs
+# ✅ SQLite-only SQL (e.g. date('now', '+3 day')) falls back to SQLite
+# ✅ Each process's copy is a CDC consumer, so compaction keeps the changes it
+#    still needs; consumers of copies gone idle expire
+#
+# Only the predefined queries run here (their results match SQLite's);
+# Custom SQL always runs on SQLite, since DuckDB's dialect differs in ways
+# that change results silently (LIKE case, integer division, NULL order).
+#
+# Command line (SQLite vs DuckDB timings of the predefined queries):
+#   python analytics.py --db food_1m.db
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import atexit                  # Atexit - unregister this process's CDC consumer on shutdown
+import json                    # JSON - changed ids handed to SQLite's json_each
+import os                      # OS - to read configuration from environment variables & process id
+import socket                  # Socket - host name in the per-process consumer name
+import sqlite3                 # SQLite - the copy is read from food_wastage.db
+import threading               # Threading - one copy shared by all sessions, timeouts
+import time                    # Time - copy age & query timings
+from datetime import datetime  # Datetime - "as of" time of the copy
+from pathlib import Path
+
+import database
+from database import TABLE_COLUMNS, BROWSE_TABLES, QueryTimeout, CUSTOM_QUERY_TIMEOUT, CUSTOM_QUERY_MAX_ROWS
+from cdc import last_seq, register_consumer, ack, drop_consumer, drop_idle_consumers
+from metrics import query_metrics
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+# Engine the Analysis page starts with: "sqlite" or "duckdb" (users can switch with the toggle)
+ANALYTICS_ENGINE = os.environ.get("FOOD_APP_ANALYTICS_ENGINE", "sqlite")
+
+# Seconds between two checks whether the DuckDB copy is out of date
+ANALYTICS_REFRESH_INTERVAL = float(os.environ.get("FOOD_APP_ANALYTICS_REFRESH_INTERVAL", "60"))
+
+# Rows read from SQLite per Arrow batch while copying, and per batch fetched from DuckDB
+ANALYTICS_BATCH_ROWS = int(os.environ.get("FOOD_APP_ANALYTICS_BATCH_ROWS", "100000"))
+
+# DuckDB worker threads (0 = DuckDB's default: one per core)
+ANALYTICS_THREADS = int(os.environ.get("FOOD_APP_ANALYTICS_THREADS", "0"))
+
+# Most outbox records applied to the copy one by one; beyond that it is rebuilt from scratch
+ANALYTICS_INCREMENTAL_LIMIT = int(os.environ.get("FOOD_APP_ANALYTICS_INCREMENTAL_LIMIT", "200000"))
+
+# Prefix of the CDC consumer each process's copy acknowledges its position as ("<prefix>:<host>:<pid>")
+ANALYTICS_CDC_CONSUMER = os.environ.get("FOOD_APP_ANALYTICS_CDC_CONSUMER", "analytics_copy")
+
+# Seconds without an acknowledgement after which a copy's consumer is dropped (its process is gone)
+ANALYTICS_CONSUMER_TTL = float(os.environ.get("FOOD_APP_ANALYTICS_CONSUMER_TTL", "3600"))
+
+SQLITE, DUCKDB = "sqlite", "duckdb"
+
+# TABLE_COLUMNS kinds stored as integers; dates stay text, exactly as stored in SQLite
+_DUCKDB_TYPES = {"int": "BIGINT"}
+
+
+def _arrow_schema(table):
+    import pyarrow as pa
+    return pa.schema([(c, pa.int64() if _DUCKDB_TYPES.get(kind) == "BIGINT" else pa.string())
+                      for c, kind in TABLE_COLUMNS[table].items()])
+
+
+def _sqlite_types(table):
+    """
+    DuckDB sums integers into 128-bit DECIMALs; give them back as int64 /
+    float64 like SQLite does, so charts see numeric columns.
+    """
+    import pyarrow as pa
+    for i, field in enumerate(table.schema):
+        if pa.types.is_decimal(field.type):
+            target = pa.int64() if field.type.scale == 0 else pa.float64()
+            table = table.set_column(i, field.name, table.column(i).cast(target, safe=False))
+    return table
+
+
+class AnalyticsUnsupported(Exception):
+    """A query DuckDB cannot run (SQLite dialect, not a SELECT, ...): run it on SQLite instead."""
+
+
+def _duckdb():
+    """The duckdb module, or None when it is not installed."""
+    try:
+        import duckdb
+    except ImportError:
+        return None
+    return duckdb
+
+
+class AnalyticsEngine:
+    """
+    An in-memory DuckDB database holding a copy of the four base tables.
+
+    The copy is built on first use. ``refresh`` then brings it up to date
+    once the base tables changed: from the CDC outbox (see cdc.py) it
+    re-copies just the changed rows, in one DuckDB transaction, so queries
+    always see one consistent snapshot. When the outbox no longer holds
+    every change since the copy (compacted) or holds too many, a whole new
+    copy is built next to the old one and swapped in.
+
+    Each process's copy is a CDC consumer of its own (``consumer``, None =
+    not registered): it acknowledges the sequence number it is up to date
+    with, so compaction only removes records the copy has already applied.
+    A loaded copy acknowledges at least every ANALYTICS_CONSUMER_TTL / 2
+    seconds; consumers silent for longer belong to processes that stopped
+    (or never loaded the copy again) and are dropped by ``maintain``.
+    """
+
+    def __init__(self, consumer_prefix=ANALYTICS_CDC_CONSUMER):
+        self.consumer_prefix = consumer_prefix
+        self.consumer = f"{consumer_prefix}:{socket.gethostname()}:{os.getpid()}" if consumer_prefix else None
+        self._acked_at = None       # time.monotonic() of the last acknowledgement
+        self._conn = None           # duckdb connection holding the current copy
+        self._version = None        # cdc_outbox sequence number the copy is up to date with
+        self._refreshed_at = None
+        self._build_seconds = None
+        self._lock = threading.Lock()  # One build / refresh at a time
+
+    @property
+    def available(self):
+        """True if the duckdb package is installed."""
+        return _duckdb() is not None
+
+    def _snapshot(self):
+        """A read-only SQLite connection inside a read transaction (one snapshot for every table)."""
+        uri = Path(database.DB_PATH).resolve().as_uri() + "?mode=ro"
+        source = sqlite3.connect(uri, uri=True)
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1")  # The snapshot starts with the first read
+        return source
+
+    def _copy_rows(self, duck, table, cursor):
+        """Insert the rows of an executed SQLite cursor into a DuckDB table, in Arrow batches."""
+        import pyarrow as pa
+        schema = _arrow_schema(table)
+        while True:
+            rows = cursor.fetchmany(ANALYTICS_BATCH_ROWS)
+            if not rows:
+                return
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)], schema=schema)
+            duck.register("_batch", batch)
+            duck.execute(f"INSERT INTO {table} SELECT * FROM _batch")
+            duck.unregister("_batch")
+
+    def _build(self):
+        """Copy the base tables into a new DuckDB database."""
+        duckdb = _duckdb()
+        started = time.perf_counter()
+        duck = duckdb.connect(":memory:")
+        if ANALYTICS_THREADS:
+            duck.execute(f"SET threads = {ANALYTICS_THREADS}")
+        if self.consumer is not None:
+            # Starts at the end of the log, at or before the snapshot taken next
+            register_consumer(self.consumer)
+        source = self._snapshot()
+        try:
+            version = last_seq(source)
+            for table, columns in TABLE_COLUMNS.items():
+                definition = ", ".join(f"{c} {_DUCKDB_TYPES.get(kind, 'VARCHAR')}" for c, kind in columns.items())
+                duck.execute(f"CREATE TABLE {table} ({definition})")
+                self._copy_rows(duck, table, source.execute(f"SELECT {', '.join(columns)} FROM {table}"))
+        finally:
+            source.close()
+        # Queries only ever read from here on: no files, no extensions, no settings changes
+        duck.execute("SET enable_external_access = false")
+        duck.execute("SET lock_configuration = true")
+        return duck, version, time.perf_counter() - started
+
+    def _apply_changes(self):
+        """
+        Re-copy the rows changed since the copy was taken. Returns False
+        (nothing done) when the outbox cannot tell what changed.
+        """
+        import pyarrow as pa
+        source = self._snapshot()
+        try:
+            version = last_seq(source)
+            if version == self._version:
+                return True
+            logged = source.execute("SELECT COUNT(*) FROM cdc_outbox WHERE seq > ? AND seq <= ?",
+                                    (self._version, version)).fetchone()[0]
+            if logged != version - self._version or logged > ANALYTICS_INCREMENTAL_LIMIT:
+                return False
+            duck = self._conn.cursor()
+            duck.execute("BEGIN")
+            try:
+                for table, columns in TABLE_COLUMNS.items():
+                    id_col = BROWSE_TABLES[table][0]
+                    # Every id touched: the row's own, and its new id if an update changed it
+                    ids = [row[0] for row in source.execute(f"""
+                        SELECT row_id FROM cdc_outbox WHERE seq > ? AND seq <= ? AND table_name = ?
+                        UNION
+                        SELECT json_extract(changes, '$.{id_col}') FROM cdc_outbox
+                        WHERE seq > ? AND seq <= ? AND table_name = ? AND json_extract(changes, '$.{id_col}') IS NOT NULL
+                    """, (self._version, version, table) * 2)]
+                    if not ids:
+                        continue
+                    duck.register("_ids", pa.table({"id": pa.array(ids, type=pa.int64())}))
+                    duck.execute(f"DELETE FROM {table} WHERE {id_col} IN (SELECT id FROM _ids)")
+                    duck.unregister("_ids")
+                    self._copy_rows(duck, table, source.execute(
+                        f"SELECT {', '.join(columns)} FROM {table} WHERE {id_col} IN (SELECT value FROM json_each(?))",
+                        (json.dumps(ids),)))
+                duck.execute("COMMIT")
+            except BaseException:
+                duck.execute("ROLLBACK")
+                raise
+            finally:
+                duck.close()
+        finally:
+            source.close()
+        self._version = version
+        return True
+
+    def refresh(self, force=False):
+        """
+        Bring the copy up to date with the database (a whole new copy with
+        ``force``). Runs periodically in the background (see app.py); does
+        nothing until the engine has been used once.
+
+        Returns:
+        -------
+        bool
+            True if the copy changed.
+        """
+        if not self.available or (self._conn is None and not force):
+            return False
+        with self._lock:
+            if not force:
+                with database.get_connection() as conn:
+                    if last_seq(conn) == self._version:
+                        return False
+            if not force and self._apply_changes():
+                self._refreshed_at = datetime.now().isoformat(sep=" ", timespec="seconds")
+                self._acknowledge()
+            else:
+                self._swap(*self._build())
+        return True
+
+    def maintain(self):
+        """
+        Periodic job (see app.py): refresh the copy if it is loaded, keep its
+        consumer from expiring, and drop the consumers of idle copies - also
+        in processes that never load the copy, so none can hold back compaction.
+        """
+        if self.consumer_prefix:
+            drop_idle_consumers(self.consumer_prefix, ANALYTICS_CONSUMER_TTL)
+        self.refresh()
+        if self._acked_at is not None and time.monotonic() - self._acked_at > ANALYTICS_CONSUMER_TTL / 2:
+            with self._lock:
+                self._acknowledge()
+
+    def release(self):
+        """Unregister this process's consumer (on shutdown)."""
+        if self.consumer is not None and self._acked_at is not None:
+            drop_consumer(self.consumer)
+            self._acked_at = None
+
+    def _swap(self, duck, version, seconds):
+        self._conn, self._version, self._build_seconds = duck, version, seconds
+        self._refreshed_at = datetime.now().isoformat(sep=" ", timespec="seconds")
+        self._acknowledge()
+
+    def _acknowledge(self):
+        """Let compaction drop the outbox records the copy has applied."""
+        if self.consumer is None:
+            return
+        try:
+            ack(self.consumer, self._version)
+        except KeyError:  # Dropped meanwhile (expired, or python cdc.py drop ...)
+            register_consumer(self.consumer, from_start=True)
+            ack(self.consumer, self._version)
+        self._acked_at = time.monotonic()
+
+    def status(self):
+        """{"loaded", "refreshed_at", "build_seconds", "stale"} of the current copy."""
+        if self._conn is None:
+            return {"loaded": False, "refreshed_at": None, "build_seconds": None, "stale": False}
+        with database.get_connection() as conn:
+            stale = last_seq(conn) != self._version
+        return {"loaded": True, "refreshed_at": self._refreshed_at,
+                "build_seconds": self._build_seconds, "stale": stale}
+
+    def cursor(self):
+        """A cursor on the current copy (building it first if needed); one per thread."""
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:  # Another session may have built it meanwhile
+                    self._swap(*self._build())
+        return self._conn.cursor()
+
+    def run(self, sql, params=(), timeout=CUSTOM_QUERY_TIMEOUT, max_rows=CUSTOM_QUERY_MAX_ROWS,
+            on_cursor=None, on_batch=None):
+        """
+        Run one read-only query on DuckDB.
+
+        Parameters:
+        ----------
+        sql, params :
+            A single SELECT statement ("?" placeholders, as for SQLite) and its parameters.
+        timeout : float
+            Wall-clock budget in seconds for executing and fetching.
+        max_rows : int
+            Rows kept at most.
+        on_cursor : callable, optional
+            Called with the DuckDB cursor before the query starts (its
+            ``interrupt()`` cancels the query, see jobs.QueryJob.cancel) and
+            with None before the cursor is closed.
+        on_batch : callable, optional
+            Called with the rows fetched so far after every batch.
+
+        Returns:
+        -------
+        (pyarrow.Table, bool)
+            The rows, and whether the result was cut off at ``max_rows``.
+
+        Raises:
+        ------
+        AnalyticsUnsupported
+            If DuckDB cannot run the query (run it on SQLite instead).
+        QueryTimeout
+            If the budget runs out.
+        sqlite3.OperationalError("interrupted")
+            If the query was cancelled.
+        """
+        duckdb = _duckdb()
+        if duckdb is None:
+            raise AnalyticsUnsupported("duckdb is not installed")
+        import pyarrow as pa
+        try:
+            statements = duckdb.extract_statements(sql)
+        except duckdb.Error as exc:
+            raise AnalyticsUnsupported(str(exc)) from exc
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise AnalyticsUnsupported("Only a single SELECT statement runs on DuckDB")
+
+        cursor = self.cursor()
+        if on_cursor is not None:
+            on_cursor(cursor)
+        timed_out = threading.Event()
+
+        def stop():
+            timed_out.set()
+            cursor.interrupt()
+
+        timer = threading.Timer(timeout, stop)
+        timer.daemon = True
+        started = time.perf_counter()
+        timer.start()
+        try:
+            cursor.execute(sql, list(params))
+            reader = cursor.to_arrow_reader(ANALYTICS_BATCH_ROWS)
+            batches, rows = [], 0
+            for batch in reader:
+                batches.append(batch)
+                rows += batch.num_rows
+                if on_batch is not None:
+                    on_batch(min(rows, max_rows))
+                if rows > max_rows:
+                    break
+            table = pa.Table.from_batches(batches, schema=reader.schema)
+        except duckdb.InterruptException as exc:
+            if timed_out.is_set():
+                raise QueryTimeout(f"Query stopped after the {timeout:g}s time limit") from exc
+            raise sqlite3.OperationalError("interrupted") from exc
+        except duckdb.Error as exc:  # Dialect differences surface as parser, binder or conversion errors
+            raise AnalyticsUnsupported(str(exc)) from exc
+        finally:
+            timer.cancel()
+            if on_cursor is not None:
+                on_cursor(None)
+            cursor.close()
+        table = _sqlite_types(table.slice(0, max_rows))
+        query_metrics.record(sql, time.perf_counter() - started, min(rows, max_rows), table.nbytes, source=DUCKDB)
+        return table, rows > max_rows
+
+
+# Shared by every session in the process (like the connection pool)
+analytics_engine = AnalyticsEngine()
+
+
+@atexit.register
+def _release_consumer():
+    # Best effort: a process that dies without this has its consumer expire instead
+    try:
+        analytics_engine.release()
+    except Exception:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the predefined queries on SQLite and on DuckDB")
+    parser.add_argument("--db", default=database.DB_PATH, help="Database to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per query and engine")
+    args = parser.parse_args()
+
+    from queries import PREDEFINED_QUERIES
+    database.DB_PATH = args.db
+    analytics_engine.consumer = None  # A one-off copy: do not hold back the outbox's compaction
+    if not analytics_engine.available:
+        raise SystemExit("duckdb is not installed (pip install duckdb)")
+    started = time.perf_counter()
+    analytics_engine.refresh(force=True)
+    print(f"DuckDB copy built in {time.perf_counter() - started:.2f}s")
+
+    def best(func):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    print(f"{'query':<45} {'SQLite ms':>10} {'DuckDB ms':>10} {'speed-up':>9}")
+    for title, sql in PREDEFINED_QUERIES.items():
+        sqlite_ms = best(lambda: database.read_dataframe(sql, cache=False))
+        try:
+            duck_ms = best(lambda: analytics_engine.run(sql, timeout=600, max_rows=10 ** 9))
+        except AnalyticsUnsupported:
+            print(f"{title:<45} {sqlite_ms:>10.1f} {'(SQLite only)':>10}")
+            continue
+        print(f"{title:<45} {sqlite_ms:>10.1f} {duck_ms:>10.1f} {sqlite_ms / duck_ms:>8.1f}x")
@@ -17,16 +17,41 @@
 import streamlit as st        # Streamlit - to create interactive web app
 import pandas as pd           # Pandas - for handling tabular data
 import sqlite3                # SQLite - lightweight relational database
+import os                     # OS - temporary export files
+import tempfile               # Tempfile - exports are streamed to disk before download
+import time                   # Time - timing nearest-receiver lookups
+import uuid                   # UUID - one id per browser session (for background query jobs)
 import plotly.express as px   # Plotly Express - for data visualizations
+from datetime import date     # Dates - validating expiry dates & the matching batch day
+
+from database import read_dataframe, execute_write, query_cache  # Cached reads & queued writes (see database.py)
+from database import distinct_values, count_rows, fetch_page       # Server-side filters & pagination
+from database import dashboard_counts, provider_city_counts       # Trigger-maintained dashboard counters
+from database import QueryTimeout, CUSTOM_QUERY_TIMEOUT, CUSTOM_QUERY_MAX_ROWS  # Guarded custom SQL limits
+from dates import to_iso_date                        # ISO-8601 date storage (see dates.py)
+from queries import PREDEFINED_QUERIES               # The 15 predefined analysis queries
+from scheduler import schedule, job_status, run_soon  # Background jobs
+from materialized import read_view, refresh_view, refresh_stale_views, has_view, MV_REFRESH_INTERVAL
+from jobs import query_jobs, ANALYSIS_JOB_TIMEOUT, QUEUED, DONE, CANCELLED  # Cancellable background queries
+from analytics import analytics_engine, ANALYTICS_ENGINE, ANALYTICS_REFRESH_INTERVAL, SQLITE, DUCKDB  # Optional DuckDB engine
+from expiry import expiry_index, EXPIRY_REFRESH_INTERVAL  # In-memory "expiring soon" priority index
+from reservations import reserve_claim, set_claim_status, WON, FULLY_CLAIMED, NOT_ENOUGH_LEFT, NO_SUCH_LISTING  # Atomic claims
+from matching import propose_matches, accept_matches, busy_receivers, MATCH_HORIZON_DAYS  # Optimal receiver-listing matching
+from geocoding import geo_index, GEO_REFRESH_INTERVAL    # Offline geocoding & nearest receivers
+from search import search                                 # Full-text search (SQLite FTS5)
+from trigram import provider_names, receiver_names, refresh_name_indexes, rebuild_name_indexes  # Typo-tolerant name lookup
+from trigram import TRIGRAM_REFRESH_INTERVAL, TRIGRAM_REBUILD_INTERVAL
+from cdc import compact as compact_cdc_outbox, CDC_COMPACT_INTERVAL  # Change-data-capture outbox for downstream consumers
+from bulk_import import import_file                     # Chunked CSV / Parquet loading
+from export_data import export_query, export_table, FORMATS, MIME_TYPES, CUSTOM_EXPORT_TIMEOUT  # Streaming CSV / Parquet / Arrow export
+from metrics import query_metrics, DIAGNOSTICS_ENABLED, METRICS_FILE, METRICS_FILE_INTERVAL  # Query latency histograms
 
 # ------------------------------
 # DATABASE CONFIGURATION & UTILITY FUNCTION
 # ------------------------------
-DB_PATH = "food_wastage.db"  # Path to the SQLite database file
-
-def run_query(query, params=(), commit=False):
+def run_query(query, params=(), commit=False, cache=True):
     """
-    Executes a SQL query on the SQLite database.
+    Executes a SQL query on the SQLite database using a pooled connection.
     
     Parameters:
     ----------
@@ -36,27 +61,209 @@ def run_query(query, params=(), commit=False):
         Parameters for the query (for security and flexibility).
     commit : bool
         If True, commit changes (used for INSERT, UPDATE, DELETE).
+    cache : bool
+        If True, SELECT results are served from the shared query cache
+        until one of the tables they read is changed.
     
     Returns:
     -------
-    pd.DataFrame or None
+    pd.DataFrame or int or None
         If SELECT query: returns DataFrame with query result.
-        Otherwise: returns None.
+        Otherwise: returns the id of the inserted row (INSERT) or None.
     """
-    # Connect to the database (allow multiple threads with check_same_thread=False)
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    
     if commit:
-        # For INSERT, UPDATE, DELETE queries
-        conn.execute(query, params)
-        conn.commit()   # Save changes to DB
-        conn.close()
-        return None
+        # For INSERT, UPDATE, DELETE queries - queued behind other writers & committed
+        _rowcount, lastrowid = execute_write(query, params)
+        return lastrowid if query.lstrip().upper().startswith("INSERT") else None
+
+    # For SELECT queries - return a DataFrame (from the cache when possible)
+    return read_dataframe(query, params, cache=cache)
+
+def show_table_page(table, filters):
+    """
+    Displays one page of a table with Previous/Next buttons.
+
+    Filtering and paging happen in SQL (see database.fetch_page), so only the
+    rows on screen are ever loaded, no matter how big the table is.
+    
+    Parameters:
+    ----------
+    table : str
+        Table to browse (providers, receivers, food_listings or claims).
+    filters : dict
+        {column: value} filters chosen by the user ("All" filters left out).
+    """
+    # The cursor lives in session state; changing a filter starts again at page 1
+    state_key = f"cursor_{table}"
+    filter_key = tuple(sorted(filters.items()))
+    if st.session_state.get(state_key, {}).get("filters") != filter_key:
+        st.session_state[state_key] = {"filters": filter_key, "after": None, "before": None}
+    cursor = st.session_state[state_key]
+
+    df, has_prev, has_next = fetch_page(table, filters, after_id=cursor["after"], before_id=cursor["before"])
+    st.caption(f"{count_rows(table, filters)} matching rows")
+    st.dataframe(df)
+
+    # Previous / Next buttons move the cursor to the first / last id on this page
+    id_col = df.columns[0]
+    prev_col, next_col = st.columns(2)
+    if prev_col.button("⬅️ Previous", disabled=not has_prev, key=f"prev_{table}"):
+        cursor.update(after=None, before=int(df[id_col].iloc[0]))
+        st.rerun()
+    if next_col.button("Next ➡️", disabled=not has_next, key=f"next_{table}"):
+        cursor.update(after=int(df[id_col].iloc[-1]), before=None)
+        st.rerun()
+
+    # Export every matching row (not just this page)
+    export_widget(table, lambda path, fmt: export_table(table, path, fmt, filters))
+
+def export_widget(name, write):
+    """
+    Format picker, "Prepare export" button and download button.
+
+    The export is streamed to a temporary file in batches (see export_data.py),
+    so the result is never held as a DataFrame. The prepared file is kept
+    for the session until the next export with the same name replaces it.
+    
+    Parameters:
+    ----------
+    name : str
+        Used for widget keys and the downloaded file's name.
+    write : callable
+        write(path, fmt) writes the export and returns the number of rows.
+    """
+    state_key = f"export_{name}"
+    fmt_col, button_col = st.columns(2)
+    fmt = fmt_col.selectbox("Export format", list(FORMATS), key=f"export_fmt_{name}")
+    if button_col.button("📤 Prepare export", key=f"export_btn_{name}"):
+        old = st.session_state.pop(state_key, None)
+        if old and os.path.exists(old["path"]):
+            os.remove(old["path"])
+        fd, path = tempfile.mkstemp(prefix="food_export_", suffix=FORMATS[fmt])
+        os.close(fd)
+        try:
+            with st.spinner("Exporting..."):
+                rows = write(path, fmt)
+            st.session_state[state_key] = {"path": path, "fmt": fmt, "rows": rows}
+        except Exception as e:
+            os.remove(path)
+            st.error(f"❌ Export failed: {e}")
+
+    ready = st.session_state.get(state_key)
+    if ready and os.path.exists(ready["path"]):
+        with open(ready["path"], "rb") as f:
+            st.download_button(f"⬇️ Download {ready['rows']:,} rows ({ready['fmt']})", data=f,
+                               file_name=f"{name}{FORMATS[ready['fmt']]}", mime=MIME_TYPES[ready["fmt"]],
+                               key=f"export_dl_{name}")
+
+def current_job(slot):
+    """This session's latest background query job in a slot ("predefined" / "custom"), or None."""
+    return query_jobs.get(st.session_state.get("query_jobs", {}).get(slot))
+
+def submit_job(slot, title, sql, engine=SQLITE, **limits):
+    """Start a background query for this session, cancelling the slot's previous one."""
+    previous = current_job(slot)
+    if previous is not None:
+        previous.cancel()
+    job = query_jobs.submit(title, sql, owner=st.session_state["session_id"], engine=engine, **limits)
+    st.session_state.setdefault("query_jobs", {})[slot] = job.id
+    return job
+
+@st.fragment(run_every=1)
+def job_progress(slot):
+    """
+    Progress of a running job with a Cancel button, refreshed every second.
+
+    Only this fragment reruns while the query works; once the job has
+    finished the whole page reruns to show the result.
+    """
+    job = current_job(slot)
+    if job is None or job.finished:
+        st.rerun()
+    info_col, cancel_col = st.columns([4, 1])
+    if job.status == QUEUED:
+        info_col.info("⏳ Waiting for a free query worker...")
     else:
-        # For SELECT queries - return results as DataFrame
-        df = pd.read_sql_query(query, conn, params=params)
-        conn.close()
-        return df
+        info_col.info(f"⏳ Running **{job.title}** · {job.elapsed:.1f}s · {job.rows:,} rows fetched")
+    if cancel_col.button("✖️ Cancel", key=f"cancel_{slot}"):
+        job.cancel()
+        st.rerun()
+
+def engine_caption(job):
+    """Which engine answered a finished job (and why DuckDB handed it to SQLite)."""
+    if job.engine == SQLITE:
+        return ""
+    if job.fallback:
+        return " on SQLite (not supported by DuckDB)"
+    return " on DuckDB"
+
+def show_query_error(error, timeout):
+    """Explain why a read-only query failed."""
+    if isinstance(error, QueryTimeout):
+        st.error(f"⏱️ Query stopped: it ran longer than {timeout:g} seconds. "
+                 "Narrow it down (WHERE, LIMIT, fewer joins) and try again.")
+    elif isinstance(error, sqlite3.OperationalError) and "readonly" in str(error):
+        st.error("🔒 Only read queries (SELECT) can be run here - use CRUD Operations to change data.")
+    else:
+        st.error(f"❌ Error: {error}")
+
+def name_lookup(index, label, key):
+    """
+    Typo-tolerant name box (see trigram.py) with a pick list of the closest names.
+
+    Parameters:
+    ----------
+    index : trigram.TrigramIndex
+        provider_names or receiver_names.
+    label : str
+        What is being looked up ("Provider", "Receiver").
+    key : str
+        Prefix of the widget keys.
+
+    Returns:
+    -------
+    int or None
+        ID of the picked row (None until a name is typed and matched).
+    """
+    text = st.text_input(f"🔤 Find {label} by name", key=f"{key}_text",
+                         placeholder="Type a name - spelling mistakes are fine")
+    if not text.strip():
+        return None
+    started = time.perf_counter()
+    matches = index.search(text)
+    elapsed = time.perf_counter() - started
+    if not matches:
+        st.caption(f"No {label.lower()} name is similar to \"{text}\".")
+        return None
+    ids = [row_id for row_id, _name, _similarity in matches]
+    marks = ", ".join("?" for _ in ids)
+    cities = run_query(f"SELECT {index.id_column} AS ID, City FROM {index.table} WHERE {index.id_column} IN ({marks})", ids)
+    city = dict(zip(cities["ID"], cities["City"]))
+    options = {f"{name} · {city.get(row_id) or '?'} (ID {row_id}, {similarity:.0%} similar)": row_id
+               for row_id, name, similarity in matches}
+    picked = st.selectbox(f"Matching {label.lower()}s", list(options), key=f"{key}_pick")
+    st.caption(f"{len(matches)} closest of {len(index):,} names · looked up in {elapsed * 1000:.1f} ms")
+    return options[picked]
+
+# ------------------------------
+# BACKGROUND JOBS
+# ------------------------------
+# Keep the Analysis page's materialized views fresh (started once per process)
+schedule("refresh_views", MV_REFRESH_INTERVAL, refresh_stale_views)
+# Rebuild the expiry index now and then to pick up changes made outside the CRUD forms
+schedule("rebuild_expiry_index", EXPIRY_REFRESH_INTERVAL, expiry_index.rebuild)
+# Geocode new or changed providers / receivers and add them to the nearest-receiver index
+schedule("refresh_geo_index", GEO_REFRESH_INTERVAL, geo_index.refresh)
+# Add new providers / receivers to the name lookup; a full rebuild drops renamed & deleted rows
+schedule("refresh_name_indexes", TRIGRAM_REFRESH_INTERVAL, refresh_name_indexes, run_now=True)
+schedule("rebuild_name_indexes", TRIGRAM_REBUILD_INTERVAL, rebuild_name_indexes)
+# Drop change records every downstream consumer has acknowledged (see cdc.py)
+schedule("compact_cdc_outbox", CDC_COMPACT_INTERVAL, compact_cdc_outbox)
+# Bring the DuckDB copy of the tables up to date (once the engine has been used) and expire idle copies' consumers
+schedule("refresh_analytics_copy", ANALYTICS_REFRESH_INTERVAL, analytics_engine.maintain)
+# Write the query metrics for a Prometheus textfile scraper (only if FOOD_APP_METRICS_FILE is set)
+if METRICS_FILE:
+    schedule("write_metrics_file", METRICS_FILE_INTERVAL, query_metrics.write_prometheus_file)
 
 # ------------------------------
 # STREAMLIT PAGE CONFIGURATION
@@ -76,11 +283,47 @@ menu = [
     "🎯 Receivers",       # View Receivers data
     "🍛 Food Listings",   # View Food Listings
     "📋 Claims",          # View Claims made by Receivers
+    "⏰ Expiring Soon",   # Food still available that spoils first
+    "🤝 Proposed Matches", # Suggested claims (who should get what)
     "📊 Analysis",        # Insights (Predefined & Custom SQL)
     "✏️ CRUD Operations"  # Add, Update, Delete Records
 ]
+# Hidden page: open the app with ?diagnostics=1 (or set FOOD_APP_DIAGNOSTICS=1)
+if DIAGNOSTICS_ENABLED or st.query_params.get("diagnostics") == "1":
+    menu.append("🩺 Diagnostics")  # Query latency histograms
 
 choice = st.sidebar.selectbox("Navigation", menu)
+# Every statement run during this script run is recorded under the chosen page
+query_metrics.set_page(choice)
+
+# Background Analysis queries belong to this browser session; leaving the
+# Analysis page cancels them so abandoned work does not keep running
+st.session_state.setdefault("session_id", uuid.uuid4().hex)
+if choice != "📊 Analysis" and st.session_state.get("query_jobs"):
+    query_jobs.cancel_owner(st.session_state["session_id"])
+    st.session_state["query_jobs"] = {}
+
+# Sidebar full-text search across listings, providers & receivers (FTS5 - see search.py)
+search_text = st.sidebar.text_input("🔎 Search", placeholder="Food, provider, receiver or city")
+if search_text.strip():
+    # A new search starts again at the first page
+    if st.session_state.get("search", {}).get("text") != search_text:
+        st.session_state["search"] = {"text": search_text, "page": 0}
+    search_state = st.session_state["search"]
+    hits, info = search(search_text, search_state["page"])
+    counts = info["counts"]
+    st.sidebar.caption(f"{sum(counts.values()):,} hits ({counts['food_listings']:,} listings · "
+                       f"{counts['providers']:,} providers · {counts['receivers']:,} receivers) · "
+                       f"page {search_state['page'] + 1} · {info['seconds'] * 1000:.0f} ms")
+    if not hits.empty:
+        st.sidebar.dataframe(hits.drop(columns="score"), hide_index=True)
+    prev_col, next_col = st.sidebar.columns(2)
+    if prev_col.button("⬅️ Previous", disabled=search_state["page"] == 0, key="search_prev"):
+        search_state["page"] -= 1
+        st.rerun()
+    if next_col.button("Next ➡️", disabled=not info["has_next"], key="search_next"):
+        search_state["page"] += 1
+        st.rerun()
 
 # Sidebar Help Instructions
 st.sidebar.markdown("## 📖 How to Use")
@@ -91,6 +334,16 @@ st.sidebar.markdown("""
 - **Charts** → Explore data visually.
 """)
 
+# Sidebar Query Cache statistics (shared by all sessions)
+with st.sidebar.expander("⚡ Query Cache"):
+    cache_stats = query_cache.stats()
+    st.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+    st.caption(f"{cache_stats['hits']} hits · {cache_stats['misses']} misses · "
+               f"{cache_stats['entries']}/{cache_stats['max_entries']} entries · "
+               f"{cache_stats['invalidations']} invalidated · {cache_stats['evictions']} evicted")
+    if st.button("Clear Cache"):
+        query_cache.invalidate()
+
 # ------------------------------
 # HOME PAGE: DASHBOARD OVERVIEW
 # ------------------------------
@@ -100,11 +353,12 @@ if choice == "🏠 Home":
     # Create 4 columns for displaying summary metrics
     col1, col2, col3, col4 = st.columns(4)
 
-    # Fetch total counts from the database
-    total_providers = run_query("SELECT COUNT(*) as count FROM providers")["count"][0]
-    total_receivers = run_query("SELECT COUNT(*) as count FROM receivers")["count"][0]
-    total_listings = run_query("SELECT COUNT(*) as count FROM food_listings")["count"][0]
-    total_claims = run_query("SELECT COUNT(*) as count FROM claims")["count"][0]
+    # Fetch total counts (kept up to date by triggers - no COUNT(*) needed)
+    counts = dashboard_counts()
+    total_providers = counts["providers"]
+    total_receivers = counts["receivers"]
+    total_listings = counts["food_listings"]
+    total_claims = counts["claims"]
 
     # Display the metrics using Streamlit's metric widget
     col1.metric("Providers", total_providers)
@@ -112,12 +366,17 @@ if choice == "🏠 Home":
     col3.metric("Food Listings", total_listings)
     col4.metric("Claims", total_claims)
 
+    # The counters are checked against real counts by a background job
+    reconcile = job_status("reconcile_stats")
+    if reconcile and reconcile["last_run"]:
+        st.caption(f"Counters last verified {reconcile['last_run']}")
+
     # Separator line
     st.markdown("---")
     
     # Visualization: Bar chart of providers by city
     st.subheader("Top Provider Cities")
-    df_city = run_query("SELECT City, COUNT(*) as provider_count FROM providers GROUP BY City ORDER BY provider_count DESC")
+    df_city = provider_city_counts()
     fig = px.bar(df_city, x="City", y="provider_count", color="provider_count", title="Providers per City")
     st.plotly_chart(fig, use_container_width=True)
 
@@ -126,60 +385,125 @@ if choice == "🏠 Home":
 # ------------------------------
 elif choice == "📦 Providers":
     st.subheader("All Providers")
-    df = run_query("SELECT * FROM providers")
     
-    # Filter providers by city
-    city_filter = st.selectbox("Filter by City", ["All"] + sorted(df["City"].unique()))
-    if city_filter != "All":
-        df = df[df["City"] == city_filter]
+    # Filter providers by city (options come from a cached SELECT DISTINCT)
+    city_filter = st.selectbox("Filter by City", ["All"] + distinct_values("providers", "City"))
+    filters = {} if city_filter == "All" else {"City": city_filter}
     
-    st.dataframe(df)
+    show_table_page("providers", filters)
 
 # ------------------------------
 # RECEIVERS SECTION
 # ------------------------------
 elif choice == "🎯 Receivers":
     st.subheader("All Receivers")
-    df = run_query("SELECT * FROM receivers")
     
     # Filter receivers by city
-    city_filter = st.selectbox("Filter by City", ["All"] + sorted(df["City"].unique()))
-    if city_filter != "All":
-        df = df[df["City"] == city_filter]
+    city_filter = st.selectbox("Filter by City", ["All"] + distinct_values("receivers", "City"))
+    filters = {} if city_filter == "All" else {"City": city_filter}
     
-    st.dataframe(df)
+    show_table_page("receivers", filters)
 
 # ------------------------------
 # FOOD LISTINGS SECTION
 # ------------------------------
 elif choice == "🍛 Food Listings":
     st.subheader("Available Food Listings")
-    df = run_query("SELECT * FROM food_listings")
     
     # Apply two filters: by Location and Meal Type
-    city_filter = st.selectbox("Filter by Location", ["All"] + sorted(df["Location"].unique()))
-    meal_filter = st.selectbox("Filter by Meal Type", ["All"] + sorted(df["Meal_Type"].unique()))
+    city_filter = st.selectbox("Filter by Location", ["All"] + distinct_values("food_listings", "Location"))
+    meal_filter = st.selectbox("Filter by Meal Type", ["All"] + distinct_values("food_listings", "Meal_Type"))
     
+    filters = {}
     if city_filter != "All":
-        df = df[df["Location"] == city_filter]
+        filters["Location"] = city_filter
     if meal_filter != "All":
-        df = df[df["Meal_Type"] == meal_filter]
+        filters["Meal_Type"] = meal_filter
     
-    st.dataframe(df)
+    show_table_page("food_listings", filters)
 
 # ------------------------------
 # CLAIMS SECTION
 # ------------------------------
 elif choice == "📋 Claims":
     st.subheader("Claims Data")
-    df = run_query("SELECT * FROM claims")
     
-    # Filter claims by status (Pending or Completed)
-    status_filter = st.selectbox("Filter by Status", ["All"] + sorted(df["Status"].unique()))
-    if status_filter != "All":
-        df = df[df["Status"] == status_filter]
+    # Filter claims by status (Pending, Completed or Cancelled)
+    status_filter = st.selectbox("Filter by Status", ["All"] + distinct_values("claims", "Status"))
+    filters = {} if status_filter == "All" else {"Status": status_filter}
     
-    st.dataframe(df)
+    show_table_page("claims", filters)
+
+# ------------------------------
+# EXPIRING SOON SECTION
+# ------------------------------
+elif choice == "⏰ Expiring Soon":
+    st.subheader("Available Food Expiring Soon")
+
+    # Read from the in-memory priority index - no table scan per rerun
+    location = st.selectbox("Location", ["All"] + expiry_index.locations())
+    top_n = st.slider("Number of items", min_value=5, max_value=100, value=20, step=5)
+    include_expired = st.checkbox("Include listings that have already expired")
+
+    items = expiry_index.top(None if location == "All" else location, n=top_n, include_expired=include_expired)
+    st.caption(f"{len(expiry_index)} listings with food left indexed · last full rebuild {expiry_index.built_at}")
+
+    if items:
+        # Fetch the details of just these listings, in priority order
+        food_ids = [food_id for _expiry, food_id, _loc in items]
+        marks = ", ".join("?" for _ in food_ids)
+        df = run_query(f"SELECT * FROM food_listings WHERE Food_ID IN ({marks})", food_ids)
+        df = df.set_index("Food_ID").loc[[i for i in food_ids if i in set(df["Food_ID"])]].reset_index()
+        st.dataframe(df)
+    else:
+        st.info("ℹ️ No food listings with food left match.")
+
+# ------------------------------
+# PROPOSED MATCHES SECTION
+# ------------------------------
+elif choice == "🤝 Proposed Matches":
+    st.subheader("Proposed Matches")
+    st.caption("What is left of each listing allocated to receivers in the same city: food that spoils first and "
+               "large quantities go first, portion sizes suit the receiver type, and each receiver's "
+               "open claims count against what it can take per day.")
+
+    col1, col2, col3 = st.columns(3)
+    city = col1.selectbox("City", ["All"] + distinct_values("food_listings", "Location"))
+    as_of = col2.date_input("Batch for", value=date.today())
+    horizon = col3.number_input("Expiring within (days)", min_value=0, max_value=60, value=MATCH_HORIZON_DAYS)
+
+    if st.button("🔍 Propose Matches"):
+        with st.spinner("Solving..."):
+            matches, stats = propose_matches(as_of, int(horizon), None if city == "All" else city)
+        st.session_state["proposed_matches"] = (matches, stats)
+
+    if "proposed_matches" in st.session_state:
+        matches, stats = st.session_state["proposed_matches"]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Listings Matched", f"{stats['matched']:,} / {stats['listings']:,}")
+        col2.metric("Quantity Matched", f"{stats['quantity']:,}")
+        col3.metric("Quantity Left", f"{stats['unmatched_quantity']:,}")
+        col4.metric("Cities", f"{stats['cities']:,}")
+        st.caption(f"{stats['receivers']:,} receivers with free slots · solved in {stats['seconds']:.2f}s")
+
+        if matches.empty:
+            st.info("ℹ️ No matches to propose.")
+        else:
+            # Everything is accepted unless unticked
+            edited = st.data_editor(matches.assign(Accept=True), hide_index=True,
+                                    disabled=[c for c in matches.columns], key="matches_editor")
+            accepted = edited[edited["Accept"]]
+            if st.button(f"✅ Accept {len(accepted):,} Matches as Claims", disabled=accepted.empty):
+                claimed = accept_matches(zip(accepted["Food_ID"], accepted["Receiver_ID"]))
+                if len(claimed) > 100:
+                    expiry_index.rebuild()  # Many listings changed at once
+                else:
+                    for food_id in claimed:
+                        expiry_index.sync_listing(food_id)
+                del st.session_state["proposed_matches"]
+                st.success(f"✅ {len(claimed):,} claims added.")
+                if len(claimed) < len(accepted):
+                    st.warning(f"⚠️ {len(accepted) - len(claimed):,} listings were claimed by someone else meanwhile.")
 
 # ------------------------------
 # ANALYSIS SECTION: Predefined + Custom SQL Queries
@@ -187,56 +511,70 @@ elif choice == "📋 Claims":
 elif choice == "📊 Analysis":
     st.subheader("Analytical Queries")
 
-    # Dictionary of predefined queries
-    queries = {
-        "Providers per City": "SELECT City, COUNT(*) AS provider_count FROM providers GROUP BY City ORDER BY provider_count DESC",
-        "Receivers per City": "SELECT City, COUNT(*) AS receiver_count FROM receivers GROUP BY City ORDER BY receiver_count DESC",
-        "Top Provider Types by Total Quantity": "SELECT Provider_Type, SUM(Quantity) AS total_qty FROM food_listings GROUP BY Provider_Type ORDER BY total_qty DESC",
-        "Contact Info of Providers in a City": "SELECT Name, Contact, City FROM providers WHERE City='Delhi'",  # Example fixed query
-        "Top Receivers by Claimed Quantity": """SELECT r.Name, SUM(f.Quantity) AS total_claimed 
-                                                FROM claims c 
-                                                JOIN receivers r ON c.Receiver_ID = r.Receiver_ID 
-                                                JOIN food_listings f ON c.Food_ID = f.Food_ID 
-                                                GROUP BY r.Name ORDER BY total_claimed DESC""",
-        "Total Quantity of Food Available": "SELECT SUM(Quantity) AS total_available FROM food_listings",
-        "City with Most Food Listings": """SELECT Location, COUNT(*) AS listings_count 
-                                           FROM food_listings 
-                                           GROUP BY Location ORDER BY listings_count DESC LIMIT 1""",
-        "Most Common Food Types": "SELECT Food_Type, COUNT(*) AS type_count FROM food_listings GROUP BY Food_Type ORDER BY type_count DESC",
-        "Claims per Food Item": """SELECT f.Food_Name, COUNT(c.Claim_ID) AS claims_count 
-                                   FROM claims c 
-                                   JOIN food_listings f ON c.Food_ID = f.Food_ID 
-                                   GROUP BY f.Food_Name ORDER BY claims_count DESC""",
-        "Top Provider by Completed Claims": """SELECT p.Name, COUNT(c.Claim_ID) AS completed_claims 
-                                               FROM claims c 
-                                               JOIN food_listings f ON c.Food_ID = f.Food_ID 
-                                               JOIN providers p ON f.Provider_ID = p.Provider_ID 
-                                               WHERE c.Status = 'Completed' 
-                                               GROUP BY p.Name ORDER BY completed_claims DESC""",
-        "Claim Status Percentage": """SELECT Status, COUNT(*) * 100.0 / (SELECT COUNT(*) FROM claims) AS pct 
-                                      FROM claims GROUP BY Status""",
-        "Average Quantity Claimed per Receiver": """SELECT r.Name, AVG(f.Quantity) AS avg_claimed 
-                                                    FROM claims c 
-                                                    JOIN receivers r ON c.Receiver_ID = r.Receiver_ID 
-                                                    JOIN food_listings f ON c.Food_ID = f.Food_ID 
-                                                    GROUP BY r.Name ORDER BY avg_claimed DESC""",
-        "Most Claimed Meal Type": """SELECT Meal_Type, COUNT(*) AS meal_count 
-                                     FROM food_listings f 
-                                     JOIN claims c ON f.Food_ID = c.Food_ID 
-                                     GROUP BY Meal_Type ORDER BY meal_count DESC""",
-        "Total Quantity Donated by Each Provider": """SELECT p.Name, SUM(f.Quantity) AS total_donated 
-                                                      FROM food_listings f 
-                                                      JOIN providers p ON f.Provider_ID = p.Provider_ID 
-                                                      GROUP BY p.Name ORDER BY total_donated DESC""",
-        "Food Items Expiring Soon": "SELECT * FROM food_listings WHERE date(Expiry_Date) <= date('now','+3 day') ORDER BY Expiry_Date ASC"
-    }
+    # Dictionary of predefined queries (defined in queries.py)
+    queries = PREDEFINED_QUERIES
     # Dropdown for predefined query selection
     selected_query = st.selectbox("Select a Predefined Query", list(queries.keys()))
-    df = run_query(queries[selected_query])
-    st.dataframe(df)
+
+    # Optional DuckDB engine: columnar copy of the tables, much faster aggregations (see analytics.py)
+    engine = SQLITE
+    if analytics_engine.available:
+        if st.toggle("🦆 DuckDB engine", value=ANALYTICS_ENGINE == DUCKDB, key="use_duckdb",
+                     help="Run the predefined queries on an in-memory DuckDB copy of the tables "
+                          "(kept up to date in the background). Queries DuckDB cannot run use SQLite; "
+                          "Custom SQL always runs on SQLite."):
+            engine = DUCKDB
+            copy = analytics_engine.status()
+            if copy["loaded"]:
+                st.caption(f"🦆 Copy as of {copy['refreshed_at']}" + (" · newer changes are being copied" if copy["stale"] else ""))
+            else:
+                st.caption("🦆 The first query copies the tables into DuckDB - this takes a moment on large databases.")
+
+    df = None
+    if engine == SQLITE and has_view(selected_query):
+        # Results come from a materialized view that is refreshed in the background
+        df, view_status = read_view(selected_query)
+        info_col, refresh_col = st.columns([4, 1])
+        pending = view_status["pending_changes"]
+        info_col.caption(f"🕒 As of {view_status['refreshed_at']}"
+                         + (f" · {pending} newer change(s) not included yet" if pending else " · up to date"))
+        if refresh_col.button("🔄 Refresh now"):
+            refresh_view(selected_query, force=True)
+            st.rerun()
+    else:
+        # Live query (or view not computed yet): run it in the background so the page stays usable
+        job = current_job("predefined")
+        if job is None or job.title != selected_query or job.engine != engine:
+            job = submit_job("predefined", selected_query, queries[selected_query], engine, timeout=ANALYSIS_JOB_TIMEOUT)
+            if engine == SQLITE:
+                run_soon("refresh_views")  # Compute any missing view for next time
+        if not job.finished:
+            job_progress("predefined")
+        elif job.status == DONE:
+            df = job.result
+            info_col, rerun_col = st.columns([4, 1])
+            info_col.caption(f"🕒 Ran in {job.elapsed:.2f}s{engine_caption(job)}" + (" · first rows only" if job.truncated else ""))
+            if rerun_col.button("🔄 Run again"):
+                submit_job("predefined", selected_query, queries[selected_query], engine, timeout=ANALYSIS_JOB_TIMEOUT)
+                st.rerun()
+        else:
+            if job.status == CANCELLED:
+                st.info("✖️ Query cancelled.")
+            else:
+                show_query_error(job.error, ANALYSIS_JOB_TIMEOUT)
+            if st.button("🔄 Run again"):
+                submit_job("predefined", selected_query, queries[selected_query], engine, timeout=ANALYSIS_JOB_TIMEOUT)
+                st.rerun()
+
+    if df is not None:
+        st.dataframe(df)  # DuckDB results are Arrow tables, shown without converting
+        if not isinstance(df, pd.DataFrame):
+            df = df.to_pandas()  # Aggregates are small; Plotly wants pandas
 
     # Auto-generate charts for numeric data
-    if "pct" in df.columns:
+    if df is None:
+        fig = None
+    elif "pct" in df.columns:
         # Pie chart for percentage data
         fig = px.pie(df, names="Status", values="pct", title=selected_query)
     elif df.shape[1] == 2 and pd.api.types.is_numeric_dtype(df.iloc[:, 1]):
@@ -253,16 +591,36 @@ elif choice == "📊 Analysis":
     st.subheader("🔎 Custom SQL Query Executor")
     custom_query = st.text_area("Enter your SQL query below and click Run:", height=120)
     
+    st.caption(f"Runs read-only · stopped after {CUSTOM_QUERY_TIMEOUT:g}s · "
+               f"shows at most {CUSTOM_QUERY_MAX_ROWS:,} rows")
+    
     if st.button("Run Custom Query"):
-        try:
-            df_custom = run_query(custom_query)
-            if not df_custom.empty:
-                st.success("✅ Query executed successfully!")
-                st.dataframe(df_custom)
-            else:
-                st.info("ℹ️ Query executed but returned no results.")
-        except Exception as e:
-            st.error(f"❌ Error: {e}")
+        # Background job on a read-only connection with a time budget & row cap (see jobs.py).
+        # Always SQLite: DuckDB's dialect would silently change some results (LIKE case, integer division, ...)
+        submit_job("custom", "Custom SQL", custom_query)
+
+    custom_job = current_job("custom")
+    if custom_job is not None and not custom_job.finished:
+        job_progress("custom")
+    elif custom_job is not None and custom_job.status == DONE:
+        df_custom = custom_job.result
+        if len(df_custom):
+            st.success(f"✅ Query executed successfully in {custom_job.elapsed:.2f}s{engine_caption(custom_job)}!")
+            if custom_job.truncated:
+                st.warning(f"✂️ Result cut off at {CUSTOM_QUERY_MAX_ROWS:,} rows. "
+                           "Add a LIMIT / WHERE, or use Export below for the full result.")
+            st.dataframe(df_custom)
+        else:
+            st.info("ℹ️ Query executed but returned no results.")
+    elif custom_job is not None and custom_job.status == CANCELLED:
+        st.info("✖️ Query cancelled.")
+    elif custom_job is not None:
+        show_query_error(custom_job.error, CUSTOM_QUERY_TIMEOUT)
+
+    # Export the full result of the query (streamed, any size, also time-limited)
+    if custom_query.strip():
+        export_widget("custom_query", lambda path, fmt: export_query(custom_query, path, fmt,
+                                                                    timeout=CUSTOM_EXPORT_TIMEOUT))
 
 # ------------------------------
 # CRUD OPERATIONS SECTION
@@ -271,12 +629,13 @@ elif choice == "✏️ CRUD Operations":
     st.subheader("Manage Records")
     
     # Radio buttons for selecting CRUD operation
-    crud_menu = st.radio("Select Operation", ["Add Food Listing", "Add Claim", "Update Claim Status", "Delete Record"])
+    crud_menu = st.radio("Select Operation", ["Add Food Listing", "Add Claim", "Update Claim Status", "Delete Record", "Bulk Import"])
 
     # ADD FOOD LISTING
     if crud_menu == "Add Food Listing":
+        picked_provider = name_lookup(provider_names, "Provider", "listing_provider")
         with st.form("add_listing"):
-            provider_id = st.number_input("Provider ID", min_value=1)
+            provider_id = st.number_input("Provider ID", min_value=1, value=picked_provider or 1)
             food_name = st.text_input("Food Name")
             food_type = st.text_input("Food Type")
             quantity = st.number_input("Quantity", min_value=1)
@@ -285,44 +644,101 @@ elif choice == "✏️ CRUD Operations":
             expiry_date = st.date_input("Expiry Date")
             
             submitted = st.form_submit_button("Add Listing")
-            if submitted:
-                run_query(
-                    "INSERT INTO food_listings (Provider_ID, Food_Name, Food_Type, Quantity, Meal_Type, Location, Expiry_Date) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (provider_id, food_name, food_type, quantity, meal_type, location, str(expiry_date)),
-                    commit=True
-                )
-                st.success("✅ Food listing added successfully!")
+            if submitted and expiry_date < date.today():
+                st.error("❌ Expiry date cannot be in the past.")
+            elif submitted:
+                try:
+                    new_food_id = run_query(
+                        "INSERT INTO food_listings (Provider_ID, Food_Name, Food_Type, Quantity, Meal_Type, Location, Expiry_Date) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (provider_id, food_name, food_type, quantity, meal_type, location, to_iso_date(expiry_date)),
+                        commit=True
+                    )
+                    expiry_index.sync_listing(new_food_id)
+                    st.success("✅ Food listing added successfully!")
+                except sqlite3.IntegrityError as e:
+                    if "FOREIGN KEY" in str(e):
+                        # Foreign key check: the provider must exist
+                        st.error(f"❌ Provider ID {provider_id} does not exist.")
+                    else:
+                        st.error(f"❌ Error: {e}")
 
     # ADD CLAIM
     elif crud_menu == "Add Claim":
+        # Help the dispatcher pick a receiver close to the listing's provider
+        with st.expander("📍 Find receivers near a listing"):
+            col1, col2 = st.columns(2)
+            near_food_id = col1.number_input("Listing (Food ID)", min_value=1, key="near_food_id")
+            near_k = col2.slider("Receivers", min_value=1, max_value=50, value=10, key="near_k")
+            provider = run_query("SELECT Provider_ID FROM food_listings WHERE Food_ID = ?", (near_food_id,))
+            location = geo_index.provider_location(int(provider["Provider_ID"][0])) if len(provider) else None
+            if provider.empty:
+                st.info(f"ℹ️ Food ID {near_food_id} does not exist.")
+            elif location is None:
+                st.info("ℹ️ The provider's address could not be located.")
+            else:
+                exclude = busy_receivers()
+                started = time.perf_counter()
+                nearest = geo_index.nearest(location[0], location[1], near_k, exclude=exclude)
+                elapsed = time.perf_counter() - started
+                # Receivers without coordinates are invisible to the search: list those in the provider's city too
+                provider_id = int(provider["Provider_ID"][0])
+                unlocated = geo_index.unlocated_in_provider_city(provider_id, near_k, exclude=exclude)
+                ids = [receiver_id for receiver_id, _km in nearest] + unlocated
+                marks = ", ".join("?" for _ in ids)
+                df = run_query(f"SELECT Receiver_ID, Name, Type, City, Contact FROM receivers "
+                               f"WHERE Receiver_ID IN ({marks})", ids) if ids else pd.DataFrame()
+                if not df.empty:
+                    distances = dict(nearest)
+                    # assign() copies: df is the shared cached result, which must stay unchanged
+                    df = df.assign(**{"Distance (km)": df["Receiver_ID"].map(distances).round(1)})
+                    st.dataframe(df.sort_values(["Distance (km)", "Receiver_ID"]), hide_index=True)
+                located, receivers_total = geo_index.stats()["receivers"], dashboard_counts()["receivers"]
+                st.caption(f"Receivers with free slots nearest to Provider {provider_id} "
+                           f"(located by {location[2]}) · looked up in {elapsed * 1e6:,.0f} µs · "
+                           f"{located:,} of {receivers_total:,} receivers located"
+                           + (f"; {len(unlocated)} unlocated in the provider's city listed without a distance"
+                              if unlocated else ""))
+
+        picked_receiver = name_lookup(receiver_names, "Receiver", "claim_receiver")
         with st.form("add_claim"):
             food_id = st.number_input("Food ID", min_value=1)
-            receiver_id = st.number_input("Receiver ID", min_value=1)
+            receiver_id = st.number_input("Receiver ID", min_value=1, value=picked_receiver or 1)
+            claim_quantity = st.number_input("Quantity (0 = all that is left)", min_value=0)
             status = st.selectbox("Status", ["Pending", "Completed"])
             
             submitted = st.form_submit_button("Add Claim")
             if submitted:
-                run_query(
-                    "INSERT INTO claims (Food_ID, Receiver_ID, Status) VALUES (?, ?, ?)",
-                    (food_id, receiver_id, status),
-                    commit=True
-                )
-                st.success("✅ Claim added successfully!")
+                # Atomic: the quantity comes off the listing only if that much is still left
+                result = reserve_claim(food_id, receiver_id, status, quantity=claim_quantity or None)
+                if result["outcome"] == WON:
+                    expiry_index.sync_listing(food_id)  # Drops out of "Expiring Soon" once nothing is left
+                    st.success(f"✅ Claim {result['claim_id']} added successfully: {result['quantity']} taken, "
+                               f"{result['remaining']} left.")
+                elif result["outcome"] == FULLY_CLAIMED:
+                    st.error(f"❌ Food ID {food_id} has already been claimed in full.")
+                elif result["outcome"] == NOT_ENOUGH_LEFT:
+                    st.error(f"❌ Only {result['remaining']} of Food ID {food_id} is left.")
+                elif result["outcome"] == NO_SUCH_LISTING:
+                    st.error(f"❌ Food ID {food_id} does not exist.")
+                else:
+                    st.error(f"❌ Receiver ID {receiver_id} does not exist.")
 
     # UPDATE CLAIM STATUS
     elif crud_menu == "Update Claim Status":
         with st.form("update_claim"):
             claim_id = st.number_input("Claim ID", min_value=1)
-            new_status = st.selectbox("New Status", ["Pending", "Completed"])
+            new_status = st.selectbox("New Status", ["Pending", "Completed", "Cancelled"])
             
             submitted = st.form_submit_button("Update Status")
             if submitted:
-                run_query(
-                    "UPDATE claims SET Status = ? WHERE Claim_ID = ?",
-                    (new_status, claim_id),
-                    commit=True
-                )
-                st.success("✅ Claim status updated successfully!")
+                # Re-activating a claim is refused when its quantity is no longer left
+                if set_claim_status(claim_id, new_status):
+                    # A cancelled claim gives its quantity back to the listing
+                    for food_id in run_query("SELECT Food_ID FROM claims WHERE Claim_ID = ?", (claim_id,), cache=False)["Food_ID"]:
+                        expiry_index.sync_listing(int(food_id))
+                    st.success("✅ Claim status updated successfully!")
+                else:
+                    st.error(f"❌ Claim {claim_id} does not exist, or its quantity is no longer left on the listing.")
 
     # DELETE RECORD
     elif crud_menu == "Delete Record":
@@ -333,5 +749,77 @@ elif choice == "✏️ CRUD Operations":
             submitted = st.form_submit_button("Delete")
             if submitted:
                 id_col = "Food_ID" if table == "food_listings" else "Claim_ID"
+                # Remember which listing is affected before the row is gone
+                affected = run_query(f"SELECT Food_ID FROM {table} WHERE {id_col} = ?", (record_id,), cache=False)["Food_ID"]
                 run_query(f"DELETE FROM {table} WHERE {id_col} = ?", (record_id,), commit=True)
+                for food_id in affected:
+                    expiry_index.sync_listing(int(food_id))
                 st.success("✅ Record deleted successfully!")
+
+    # BULK IMPORT (CSV / PARQUET)
+    elif crud_menu == "Bulk Import":
+        with st.form("bulk_import"):
+            table = st.selectbox("Table", ["food_listings", "claims", "providers", "receivers"])
+            uploaded = st.file_uploader("CSV or Parquet file (column names must match the table)", type=["csv", "parquet"])
+            skip_duplicates = st.checkbox("Skip rows whose ID already exists")
+            
+            submitted = st.form_submit_button("Import")
+            if submitted and uploaded is None:
+                st.error("❌ Please choose a file first.")
+            elif submitted:
+                progress = st.empty()
+                show = lambda r: progress.info(f"⏳ {r['rows_read']:,} rows read · {r['rows_loaded']:,} loaded · "
+                                               f"{r['rows_per_sec']:,.0f} rows/sec")
+                try:
+                    result = import_file(uploaded, table, skip_duplicates=skip_duplicates, progress=show)
+                except Exception as e:
+                    progress.empty()
+                    st.error(f"❌ Error: {e}")
+                else:
+                    progress.empty()
+                    if table in ("food_listings", "claims"):
+                        expiry_index.rebuild()  # Many listings changed at once
+                    if table in ("providers", "receivers"):
+                        run_soon("refresh_geo_index")  # Geocode the new rows
+                        run_soon("rebuild_name_indexes")  # Imported IDs may be below the highest indexed one
+                    st.success(f"✅ Loaded {result['rows_loaded']:,} of {result['rows_read']:,} rows "
+                               f"in {result['seconds']:.1f}s ({result['rows_per_sec']:,.0f} rows/sec)")
+                    if result["rows_rejected"]:
+                        st.warning(f"⚠️ {result['rows_rejected']:,} rows were rejected")
+                        st.dataframe(pd.DataFrame(result["errors"], columns=["Row", "Reason"]))
+
+# ------------------------------
+# DIAGNOSTICS SECTION (hidden)
+# ------------------------------
+elif choice == "🩺 Diagnostics":
+    st.subheader("🩺 Query Diagnostics")
+    st.caption("Every statement since the app started (all sessions). Latencies come from "
+               "log-linear histograms, so percentiles are accurate to about 6%.")
+
+    # Latency of all statements issued while each page was rendering
+    st.markdown("### Per Page")
+    page_df = pd.DataFrame(query_metrics.page_summary())
+    if page_df.empty:
+        st.info("ℹ️ No statements recorded yet.")
+    else:
+        st.dataframe(page_df)
+
+        # One row per (page, statement, source); the slowest in total first
+        st.markdown("### Per Statement")
+        statement_df = pd.DataFrame(query_metrics.summary())
+        sources = st.multiselect("Source", ["db", "cache", "write", "custom", "job", "duckdb"],
+                                 default=["db", "write", "custom", "job", "duckdb"])
+        st.dataframe(statement_df[statement_df["source"].isin(sources)])
+
+        fig = px.bar(page_df, x="page", y=["p50_ms", "p95_ms", "p99_ms"], barmode="group",
+                     title="Statement Latency by Page (ms)")
+        st.plotly_chart(fig, use_container_width=True)
+
+    export_col, reset_col = st.columns(2)
+    export_col.download_button("⬇️ Prometheus metrics", data=query_metrics.prometheus_text(),
+                               file_name="food_app_metrics.prom", mime="text/plain")
+    if reset_col.button("🧹 Reset metrics"):
+        query_metrics.reset()
+        st.rerun()
+    if METRICS_FILE:
+        st.caption(f"Also written to {METRICS_FILE} every {METRICS_FILE_INTERVAL:.0f}s.")
@@ -0,0 +1,241 @@
+# ============================================================
+# 🏁 Query Benchmark Suite
+# ------------------------------------------------------------
+# Times what the app does against a database of any size:
+# ✅ Every predefined Analysis query (queries.py), on SQLite & DuckDB (if installed)
+# ✅ Each browse page's load path (filters, count, first & deep page)
+# ✅ Each CRUD write (add listing, add claim, update status, deletes)
+# Results are written as JSON so runs can be compared over time.
+#
+# Command line:
+#   python generate_data.py --rows 1m -o food_1m.db
+#   python benchmark.py --db food_1m.db -o before.json
+#   python benchmark.py --db food_1m.db -o after.json --compare before.json
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import json                    # JSON - results files
+import platform                # Platform - recorded with the results
+import sqlite3                 # SQLite - library version for the results
+import statistics              # Statistics - median of the repeats
+import subprocess              # Subprocess - git commit of the code being measured
+import sys                     # Sys - exit code for --fail-on-regression
+import time                    # Time - perf_counter timings
+from datetime import date, datetime
+
+import database
+from analytics import analytics_engine, AnalyticsUnsupported
+from database import BROWSE_TABLES, query_cache
+from queries import PREDEFINED_QUERIES
+from reservations import reserve_claim
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+DEFAULT_REPEAT = 5             # Timed runs per benchmark (after one warm-up run)
+REGRESSION_THRESHOLD = 0.10    # Median slower by more than this = regression in --compare
+
+
+# ------------------------------
+# TIMING
+# ------------------------------
+def time_call(func, repeat=DEFAULT_REPEAT, setup=None):
+    """
+    Run ``func`` once to warm up, then ``repeat`` times, and summarise.
+
+    ``setup`` (if given) runs before every call and is not timed - used to
+    clear the query cache so each run measures the database, not the cache.
+    """
+    timings = []
+    for run in range(repeat + 1):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        if run:  # The first run only warms the page cache
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {"median_ms": statistics.median(timings), "min_ms": timings[0], "max_ms": timings[-1],
+            "p95_ms": timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+            "runs": len(timings)}
+
+
+def _cold():
+    query_cache.invalidate()
+
+
+# ------------------------------
+# BENCHMARKS
+# ------------------------------
+def bench_queries(repeat):
+    """Every predefined Analysis query, executed on SQLite (never cached)."""
+    return {f"query: {title}": time_call(lambda sql=sql: database.read_dataframe(sql, cache=False), repeat)
+            for title, sql in PREDEFINED_QUERIES.items()}
+
+
+def bench_duckdb_queries(repeat):
+    """
+    The same queries on the DuckDB engine (analytics.py), plus building its
+    copy of the tables once. Queries DuckDB cannot run are left out.
+    """
+    started = time.perf_counter()
+    analytics_engine.refresh(force=True)
+    build_ms = (time.perf_counter() - started) * 1000
+    results = {"duckdb: copy tables": {"median_ms": build_ms, "min_ms": build_ms, "max_ms": build_ms,
+                                       "p95_ms": build_ms, "runs": 1}}
+    for title, sql in PREDEFINED_QUERIES.items():
+        try:
+            analytics_engine.run(sql, timeout=3600, max_rows=10 ** 9)
+        except AnalyticsUnsupported:
+            continue
+        results[f"duckdb: {title}"] = time_call(lambda sql=sql: analytics_engine.run(sql, timeout=3600, max_rows=10 ** 9),
+                                                repeat)
+    return results
+
+
+def bench_browse_pages(repeat):
+    """
+    What a browse page runs on load: filter dropdown values, the matching
+    row count and a page of rows - first page, a page deep in the table and
+    the same with the first value of each filter applied.
+    """
+    results = {}
+    for table, (id_col, filter_columns) in BROWSE_TABLES.items():
+        def load(filters, after_id=None):
+            for column in filter_columns:
+                database.distinct_values(table, column)
+            database.count_rows(table, filters)
+            database.fetch_page(table, filters, after_id=after_id)
+
+        middle = int(database.read_dataframe(f"SELECT MAX({id_col}) / 2 AS m FROM {table}", cache=False)["m"][0] or 0)
+        results[f"browse: {table} first page"] = time_call(lambda: load({}), repeat, _cold)
+        results[f"browse: {table} middle page"] = time_call(lambda: load({}, middle), repeat, _cold)
+        for column in filter_columns:
+            values = database.distinct_values(table, column)
+            if values:
+                filters = {column: values[0]}
+                results[f"browse: {table} filtered by {column}"] = time_call(lambda: load(filters), repeat, _cold)
+    return results
+
+
+def bench_writes(repeat):
+    """
+    Each CRUD form's write, through the write queue like the app. Every
+    timed row is deleted again, so the database is left as it was.
+    """
+    provider_id = int(database.read_dataframe("SELECT MIN(Provider_ID) AS id FROM providers", cache=False)["id"][0])
+    receiver_id = int(database.read_dataframe("SELECT MIN(Receiver_ID) AS id FROM receivers", cache=False)["id"][0])
+    today = date.today().isoformat()
+    created = {"food": [], "claims": []}
+
+    def add_listing():
+        _rows, food_id = database.execute_write(
+            """INSERT INTO food_listings (Food_Name, Quantity, Expiry_Date, Provider_ID, Provider_Type,
+                                          Location, Food_Type, Meal_Type)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            ("Benchmark Bread", 10, today, provider_id, "Supermarket", "Benchmark City", "Vegan", "Lunch"))
+        created["food"].append(food_id)
+
+    def add_claim():
+        # A listing can only be claimed once: each run claims another of the listings added above
+        created["claims"].append(reserve_claim(created["food"][len(created["claims"])], receiver_id)["claim_id"])
+
+    def update_claim():
+        database.execute_write("UPDATE claims SET Status = ? WHERE Claim_ID = ?", ("Completed", created["claims"][-1]))
+
+    def delete_claim():
+        database.execute_write("DELETE FROM claims WHERE Claim_ID = ?", (created["claims"].pop(),))
+
+    def delete_listing():
+        database.execute_write("DELETE FROM food_listings WHERE Food_ID = ?", (created["food"].pop(),))
+
+    results = {"write: add food listing": time_call(add_listing, repeat)}
+    results["write: add claim"] = time_call(add_claim, repeat)
+    results["write: update claim status"] = time_call(update_claim, repeat)
+    results["write: delete claim"] = time_call(delete_claim, repeat)
+    # add_listing left one listing per run (incl. warm-up) - exactly what this deletes
+    results["write: delete food listing"] = time_call(delete_listing, repeat)
+    return results
+
+
+def run_benchmarks(repeat=DEFAULT_REPEAT, include_writes=True, include_duckdb=True):
+    """Run every benchmark against database.DB_PATH and return the results document."""
+    counts = database.dashboard_counts()
+    results = {}
+    results.update(bench_queries(repeat))
+    if include_duckdb and analytics_engine.available:
+        results.update(bench_duckdb_queries(repeat))
+    results.update(bench_browse_pages(repeat))
+    if include_writes:
+        results.update(bench_writes(repeat))
+    return {"environment": environment(counts, repeat), "results": results}
+
+
+def environment(counts, repeat):
+    """What the numbers depend on, stored next to them."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"database": database.DB_PATH, "row_counts": {t: int(n) for t, n in counts.items()},
+            "repeat": repeat, "git_commit": commit, "sqlite_version": sqlite3.sqlite_version,
+            "python": platform.python_version(), "machine": platform.machine(),
+            "started_at": datetime.now().isoformat(timespec="seconds")}
+
+
+# ------------------------------
+# COMPARISON
+# ------------------------------
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare medians of two results documents.
+
+    Returns:
+    -------
+    list of (name, baseline_ms, current_ms, ratio, flag)
+        ``flag`` is "regression", "improvement" or "" (within the threshold).
+    """
+    rows = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        flag = "regression" if ratio > 1 + threshold else "improvement" if ratio < 1 - threshold else ""
+        rows.append((name, before["median_ms"], result["median_ms"], ratio, flag))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the app's queries, browse pages and writes")
+    parser.add_argument("--db", default=database.DB_PATH, help="Database to benchmark (see generate_data.py)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed runs per benchmark")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative change that counts as a regression / improvement")
+    parser.add_argument("--no-writes", action="store_true", help="Skip the CRUD write benchmarks")
+    parser.add_argument("--no-duckdb", action="store_true", help="Skip the DuckDB engine benchmarks")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on any regression")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    document = run_benchmarks(args.repeat, include_writes=not args.no_writes, include_duckdb=not args.no_duckdb)
+    for name, result in document["results"].items():
+        print(f"{name:<70} {result['median_ms']:>10.2f} ms  (p95 {result['p95_ms']:.2f})")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            rows = compare(json.load(f), document, args.threshold)
+        print(f"\nCompared with {args.compare}:")
+        for name, before, after, ratio, flag in rows:
+            print(f"{name:<70} {before:>9.2f} -> {after:>9.2f} ms  x{ratio:.2f} {flag}")
+        if args.fail_on_regression and any(flag == "regression" for *_rest, flag in rows):
+            sys.exit(1)
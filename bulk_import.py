@@ -0,0 +1,234 @@
+# ============================================================
+# 📥 Bulk Import of CSV / Parquet Files
+# ------------------------------------------------------------
+# Loads large files into providers, receivers, food_listings or
+# claims without going through the one-row-at-a-time forms.
+# Features:
+# ✅ Streams the file in chunks (never loads it all in memory)
+# ✅ Validates & converts every column to the table's type
+# ✅ executemany() inside one transaction per chunk
+# ✅ Reports rows/sec and the rows it had to reject
+#
+# Command line:
+#   python bulk_import.py food_listings listings.csv
+#   python bulk_import.py claims claims.parquet --chunk-size 100000
+# The same import is available in the app under "✏️ CRUD Operations".
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import sqlite3                 # SQLite - to catch constraint errors
+import time                    # Time - to measure rows/sec
+
+import pandas as pd            # Pandas - chunked CSV reading & vectorized type checks
+
+import database
+from database import TABLE_COLUMNS, get_writer
+from dates import to_iso_date, to_iso_timestamp
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+CHUNK_SIZE = 50_000            # Rows read, validated and committed together
+MAX_REPORTED_ERRORS = 20       # Rejected rows listed in the result (all are counted)
+
+
+# ------------------------------
+# READING
+# ------------------------------
+def read_chunks(source, file_format, chunk_size=CHUNK_SIZE):
+    """
+    Yield the file as DataFrames of at most ``chunk_size`` rows.
+
+    Parameters:
+    ----------
+    source : str or file-like
+        Path or open binary file (e.g. a Streamlit upload).
+    file_format : str
+        "csv" or "parquet".
+    """
+    if file_format == "csv":
+        # Read everything as text; coerce_chunk() does the type conversion
+        yield from pd.read_csv(source, dtype=str, chunksize=chunk_size)
+    elif file_format == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise RuntimeError("Reading Parquet files needs the 'pyarrow' package") from exc
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported format: {file_format} (use csv or parquet)")
+
+
+def detect_format(filename):
+    """Guess the file format from its extension."""
+    return "parquet" if str(filename).lower().endswith((".parquet", ".pq")) else "csv"
+
+
+# ------------------------------
+# VALIDATION
+# ------------------------------
+def coerce_chunk(df, table):
+    """
+    Convert a chunk to the table's column types.
+
+    Returns:
+    -------
+    (columns, rows, errors)
+        Column names, list of row tuples ready for executemany, and a list of
+        (row number in chunk, reason) for rows that were rejected.
+    """
+    types = TABLE_COLUMNS[table]
+    columns = [c for c in types if c in df.columns]
+    if not columns:
+        raise ValueError(f"None of the columns of {table} ({', '.join(types)}) are in the file")
+
+    invalid = pd.Series(False, index=df.index)
+    reasons = pd.Series("", index=df.index)
+    values = {}
+    for column in columns:
+        raw = df[column]
+        missing = raw.isna() | (raw.astype(str).str.strip() == "")
+        kind = types[column]
+
+        if kind == "int":
+            number = pd.to_numeric(raw.where(~missing), errors="coerce")
+            bad = ~missing & (number.isna() | (number % 1 != 0))
+            converted = number.where(~bad).astype("Int64").astype(object)
+        elif kind in ("date", "timestamp"):
+            # Dates repeat a lot - convert each distinct value only once
+            convert = to_iso_date if kind == "date" else to_iso_timestamp
+            mapping = {}
+            for value in raw[~missing].unique():
+                try:
+                    mapping[value] = convert(value)
+                except ValueError:
+                    mapping[value] = None
+            converted = raw.where(~missing).map(mapping)
+            bad = ~missing & converted.isna()
+        else:
+            converted = raw.astype(object).where(~missing).map(lambda v: v if v is None else str(v).strip(),
+                                                             na_action="ignore")
+            bad = pd.Series(False, index=df.index)
+
+        reasons = reasons.where(~bad | (reasons != ""), f"invalid {kind} in {column}")
+        invalid |= bad
+        values[column] = [None if pd.isna(v) else v for v in converted.tolist()]
+
+    keep = (~invalid).tolist()
+    rows = [row for row, ok in zip(zip(*(values[c] for c in columns)), keep) if ok]
+    errors = [(i, reasons.iloc[i]) for i, ok in enumerate(keep) if not ok]
+    return columns, rows, errors
+
+
+# ------------------------------
+# LOADING
+# ------------------------------
+def load_rows(table, columns, rows, skip_duplicates=False):
+    """
+    Insert rows in one transaction on the write queue.
+
+    If a constraint fails (e.g. a Food_ID that does not exist), the chunk is
+    rolled back and retried row by row, so only the bad rows are rejected.
+
+    Returns:
+    -------
+    (loaded, errors)
+        Number of rows inserted and (row number, reason) for rejected rows.
+    """
+    verb = "INSERT OR IGNORE" if skip_duplicates else "INSERT"
+    sql = f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
+    def write(conn):
+        try:
+            cursor = conn.executemany(sql, rows)
+            return cursor.rowcount, []
+        except sqlite3.IntegrityError:
+            # The chunk is the whole transaction, so undo it and go row by row
+            conn.rollback()
+
+        loaded, errors = 0, []
+        for i, row in enumerate(rows):
+            try:
+                loaded += conn.execute(sql, row).rowcount
+            except sqlite3.IntegrityError as exc:
+                errors.append((i, str(exc)))
+        return loaded, errors
+
+    return get_writer().submit(write, tables=[table])
+
+
+def import_file(source, table, file_format=None, chunk_size=CHUNK_SIZE, skip_duplicates=False, progress=None):
+    """
+    Stream a CSV or Parquet file into a table.
+
+    Parameters:
+    ----------
+    source : str or file-like
+        Path or open binary file.
+    table : str
+        providers, receivers, food_listings or claims.
+    file_format : str or None
+        "csv" or "parquet" (None = guess from the file name).
+    chunk_size : int
+        Rows per chunk / transaction.
+    skip_duplicates : bool
+        If True, rows whose id already exists are skipped instead of rejected.
+    progress : callable or None
+        Called with the running result dict after every chunk.
+
+    Returns:
+    -------
+    dict
+        rows_read, rows_loaded, rows_rejected, seconds, rows_per_sec and the
+        first MAX_REPORTED_ERRORS errors as (row number in file, reason).
+    """
+    if table not in TABLE_COLUMNS:
+        raise ValueError(f"Unknown table: {table}")
+    file_format = file_format or detect_format(getattr(source, "name", source))
+
+    result = {"table": table, "rows_read": 0, "rows_loaded": 0, "rows_rejected": 0,
+              "seconds": 0.0, "rows_per_sec": 0.0, "errors": []}
+    started = time.perf_counter()
+
+    for chunk in read_chunks(source, file_format, chunk_size):
+        offset = result["rows_read"]
+        columns, rows, errors = coerce_chunk(chunk.reset_index(drop=True), table)
+        # Row numbers of the rows that survived validation, for error messages
+        kept = sorted(set(range(len(chunk))) - {i for i, _ in errors})
+        loaded, load_errors = load_rows(table, columns, rows, skip_duplicates) if rows else (0, [])
+        errors += [(kept[i], reason) for i, reason in load_errors]
+
+        result["rows_read"] += len(chunk)
+        result["rows_loaded"] += loaded
+        result["rows_rejected"] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(result["errors"])
+        result["errors"] += [(offset + i + 1, reason) for i, reason in sorted(errors)[:max(room, 0)]]
+        result["seconds"] = time.perf_counter() - started
+        result["rows_per_sec"] = result["rows_read"] / result["seconds"] if result["seconds"] else 0.0
+        if progress is not None:
+            progress(result)
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load a CSV or Parquet file into the food wastage database")
+    parser.add_argument("table", choices=sorted(TABLE_COLUMNS), help="Table to load into")
+    parser.add_argument("file", help="CSV or Parquet file")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="File format (default: from extension)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per chunk / transaction")
+    parser.add_argument("--skip-duplicates", action="store_true", help="Skip rows whose id already exists")
+    parser.add_argument("--db", default=database.DB_PATH, help="Path to the SQLite database file")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    report = lambda r: print(f"\r{r['rows_read']:,} rows read · {r['rows_loaded']:,} loaded · "
+                             f"{r['rows_rejected']:,} rejected · {r['rows_per_sec']:,.0f} rows/sec", end="")
+    result = import_file(args.file, args.table, args.format, args.chunk_size, args.skip_duplicates, report)
+    print(f"\nDone in {result['seconds']:.2f}s")
+    for row_number, reason in result["errors"]:
+        print(f"  row {row_number}: {reason}")
@@ -0,0 +1,307 @@
+# ============================================================
+# 📤 Change-Data Capture (outbox)
+# ------------------------------------------------------------
+# Triggers on the four base tables (migration 8) append one
+# compact record per inserted, updated or deleted row to the
+# cdc_outbox table. Downstream consumers (e.g. the data
+# warehouse) read it from their own cursor instead of copying
+# the whole database every night.
+# Features:
+# ✅ Monotonic sequence numbers, never reused after compaction
+# ✅ Inserts carry the whole row, updates only the changed columns
+# ✅ Named consumers with their own acknowledged position
+# ✅ Acknowledged entries are compacted away in the background
+# ✅ Command line tail that emits JSONL batches (optionally following)
+#
+# Command line:
+#   python cdc.py --db food_wastage.db register warehouse
+#   python cdc.py --db food_wastage.db tail warehouse -o changes.jsonl [--follow]
+#   python cdc.py --db food_wastage.db status
+#
+# A new consumer starts at the end of the log: register it first, then take
+# the initial copy of the database. Changes made in between are in both, so
+# apply records as upserts / deletes by id.
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import json                    # JSON - change records & JSONL output
+import os                      # OS - to read configuration from environment variables
+import sys                     # Sys - JSONL goes to stdout by default
+import time                    # Time - polling interval when following the log
+
+import database
+from database import get_connection, get_writer
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+# Records handed to a consumer at a time (one JSONL batch)
+CDC_BATCH_SIZE = int(os.environ.get("FOOD_APP_CDC_BATCH_SIZE", "1000"))
+
+# Seconds between two background compactions of acknowledged records
+CDC_COMPACT_INTERVAL = float(os.environ.get("FOOD_APP_CDC_COMPACT_INTERVAL", "300"))
+
+# Records deleted per write transaction while compacting (keeps other writers moving)
+CDC_COMPACT_CHUNK = int(os.environ.get("FOOD_APP_CDC_COMPACT_CHUNK", "50000"))
+
+# Seconds between two polls of the outbox when following it
+CDC_POLL_INTERVAL = float(os.environ.get("FOOD_APP_CDC_POLL_INTERVAL", "1"))
+
+# Operations as stored in cdc_outbox.op and as written to JSONL
+OPERATIONS = {"I": "insert", "U": "update", "D": "delete"}
+
+
+# ------------------------------
+# CONSUMERS
+# ------------------------------
+def last_seq(conn):
+    """Highest sequence number ever handed out (0 for an empty log)."""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'cdc_outbox'").fetchone()
+    return row[0] if row else 0
+
+
+def register_consumer(name, from_start=False):
+    """
+    Register a consumer (does nothing if it already exists).
+
+    Parameters:
+    ----------
+    name : str
+        Consumer name, e.g. "warehouse".
+    from_start : bool
+        Start at the oldest record still in the outbox instead of the end.
+
+    Returns:
+    -------
+    int
+        The consumer's acknowledged sequence number.
+    """
+    def register(conn):
+        start = 0 if from_start else last_seq(conn)
+        conn.execute("INSERT OR IGNORE INTO cdc_consumers (name, acked_seq, registered_at) "
+                     "VALUES (?, ?, datetime('now'))", (name, start))
+        return conn.execute("SELECT acked_seq FROM cdc_consumers WHERE name = ?", (name,)).fetchone()[0]
+
+    return get_writer().submit(register, tables=["cdc_consumers"])
+
+
+def drop_consumer(name):
+    """Forget a consumer; the records only it was waiting for are compacted next time."""
+    def drop(conn):
+        return conn.execute("DELETE FROM cdc_consumers WHERE name = ?", (name,)).rowcount > 0
+
+    return get_writer().submit(drop, tables=["cdc_consumers"])
+
+
+def drop_idle_consumers(prefix, max_idle):
+    """
+    Forget the consumers named ``prefix`` or ``prefix:...`` that have not
+    acknowledged anything for ``max_idle`` seconds (e.g. the DuckDB copy of
+    an app process that has stopped), so they no longer hold back compaction.
+
+    Returns:
+    -------
+    list of str
+        The names dropped.
+    """
+    where = ("(name = ? OR name LIKE ? || ':%') "
+             "AND ifnull(acked_at, registered_at) < datetime('now', ? || ' seconds')")
+    params = (prefix, prefix, f"-{max_idle:g}")
+    with get_connection() as conn:
+        idle = [row[0] for row in conn.execute(f"SELECT name FROM cdc_consumers WHERE {where}", params)]
+    if not idle:
+        return []  # Nothing to write (keeps other processes' query caches intact)
+
+    def drop(conn):
+        names = [row[0] for row in conn.execute(f"SELECT name FROM cdc_consumers WHERE {where}", params)]
+        conn.execute(f"DELETE FROM cdc_consumers WHERE {where}", params)
+        return names
+
+    return get_writer().submit(drop, tables=["cdc_consumers"])
+
+
+def consumer_position(name):
+    """Acknowledged sequence number of a consumer (KeyError if it is not registered)."""
+    with get_connection() as conn:
+        row = conn.execute("SELECT acked_seq FROM cdc_consumers WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        raise KeyError(f"CDC consumer {name!r} is not registered")
+    return row[0]
+
+
+def ack(name, seq):
+    """
+    Acknowledge every record up to ``seq`` for a consumer.
+
+    The position only moves forward, so acknowledging an older batch again
+    (e.g. after a retry) is harmless. Raises KeyError for an unknown consumer.
+    """
+    def move(conn):
+        updated = conn.execute("""UPDATE cdc_consumers SET acked_seq = max(acked_seq, ?), acked_at = datetime('now')
+                                  WHERE name = ?""", (seq, name)).rowcount
+        if not updated:
+            raise KeyError(f"CDC consumer {name!r} is not registered")
+
+    get_writer().submit(move, tables=["cdc_consumers"])
+
+
+# ------------------------------
+# READING CHANGES
+# ------------------------------
+def _record(seq, table, op, row_id, changes, changed_at):
+    return {"seq": seq, "table": table, "op": OPERATIONS[op], "id": row_id,
+            "changes": json.loads(changes) if changes is not None else None, "at": changed_at}
+
+
+def read_changes(after_seq, limit=CDC_BATCH_SIZE, tables=None):
+    """
+    Change records after a sequence number, oldest first.
+
+    Parameters:
+    ----------
+    after_seq : int
+        Return records with a higher sequence number than this.
+    limit : int
+        Most records returned.
+    tables : list of str, optional
+        Only records of these tables (default: all four).
+
+    Returns:
+    -------
+    list of dict
+        {"seq", "table", "op" ("insert" / "update" / "delete"), "id",
+        "changes" ({column: new value}, None for deletes), "at"}. The id of
+        an update is the row's id before the update; a changed id shows up
+        in "changes".
+    """
+    sql = "SELECT seq, table_name, op, row_id, changes, changed_at FROM cdc_outbox WHERE seq > ?"
+    params = [after_seq]
+    if tables:
+        sql += f" AND table_name IN ({', '.join('?' for _ in tables)})"
+        params += list(tables)
+    sql += " ORDER BY seq LIMIT ?"
+    with get_connection() as conn:
+        rows = conn.execute(sql, params + [limit]).fetchall()
+    return [_record(*row) for row in rows]
+
+
+def read_batch(name, limit=CDC_BATCH_SIZE):
+    """Next unacknowledged records of a consumer (call ``ack`` with the last seq once processed)."""
+    return read_changes(consumer_position(name), limit)
+
+
+def tail(name, limit=CDC_BATCH_SIZE, follow=False, poll_interval=CDC_POLL_INTERVAL):
+    """
+    Yield a consumer's unacknowledged records batch by batch.
+
+    Each batch is acknowledged when the caller asks for the next one, i.e.
+    after it has been processed; a batch the caller did not finish is handed
+    out again next time. Stops at the end of the log unless ``follow``.
+    """
+    position = consumer_position(name)
+    while True:
+        batch = read_changes(position, limit)
+        if not batch:
+            if not follow:
+                return
+            time.sleep(poll_interval)
+            continue
+        yield batch
+        position = batch[-1]["seq"]
+        ack(name, position)
+
+
+# ------------------------------
+# COMPACTION
+# ------------------------------
+def compact(chunk=CDC_COMPACT_CHUNK):
+    """
+    Delete the records every registered consumer has acknowledged.
+
+    With no consumer registered nobody is waiting for the log and it is
+    emptied. Runs periodically in the background (see app.py).
+
+    Returns:
+    -------
+    int
+        Number of records deleted.
+    """
+    def delete_chunk(conn):
+        upto = conn.execute("SELECT ifnull(MIN(acked_seq), ?) FROM cdc_consumers", (last_seq(conn),)).fetchone()[0]
+        return conn.execute("""DELETE FROM cdc_outbox WHERE seq IN
+                                   (SELECT seq FROM cdc_outbox WHERE seq <= ? ORDER BY seq LIMIT ?)""",
+                            (upto, chunk)).rowcount
+
+    removed = 0
+    while True:
+        deleted = get_writer().submit(delete_chunk, tables=["cdc_outbox"])
+        removed += deleted
+        if deleted < chunk:
+            return removed
+
+
+def outbox_status():
+    """Size of the outbox and every consumer's position and lag (records not yet acknowledged)."""
+    with get_connection() as conn:
+        count, oldest = conn.execute("SELECT COUNT(*), MIN(seq) FROM cdc_outbox").fetchone()
+        newest = last_seq(conn)
+        consumers = [{"name": name, "acked_seq": acked, "lag": newest - acked, "acked_at": acked_at}
+                     for name, acked, acked_at in conn.execute(
+                         "SELECT name, acked_seq, acked_at FROM cdc_consumers ORDER BY name")]
+    return {"records": count, "oldest_seq": oldest, "last_seq": newest, "consumers": consumers}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Change-data capture: read the outbox of food_wastage.db")
+    parser.add_argument("--db", default=database.DB_PATH, help="Database to read")
+    commands = parser.add_subparsers(dest="command", required=True)
+    register_cmd = commands.add_parser("register", help="Register a consumer (starting at the end of the log)")
+    register_cmd.add_argument("consumer")
+    register_cmd.add_argument("--from-start", action="store_true", help="Start at the oldest record still kept")
+    tail_cmd = commands.add_parser("tail", help="Write a consumer's new records as JSONL and acknowledge them")
+    tail_cmd.add_argument("consumer")
+    tail_cmd.add_argument("-o", "--output", help="Append to this file instead of writing to stdout")
+    tail_cmd.add_argument("--batch-size", type=int, default=CDC_BATCH_SIZE, help="Records per batch")
+    tail_cmd.add_argument("--follow", action="store_true", help="Keep polling for new records")
+    drop_cmd = commands.add_parser("drop", help="Forget a consumer")
+    drop_cmd.add_argument("consumer")
+    commands.add_parser("compact", help="Delete the records every consumer has acknowledged")
+    commands.add_parser("status", help="Outbox size and consumer lag")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    if args.command == "register":
+        print(f"{args.consumer} starts after seq {register_consumer(args.consumer, args.from_start):,}")
+    elif args.command == "drop":
+        print(f"{args.consumer} dropped" if drop_consumer(args.consumer) else f"{args.consumer} was not registered")
+    elif args.command == "compact":
+        print(f"{compact():,} records deleted")
+    elif args.command == "status":
+        status = outbox_status()
+        print(f"{status['records']:,} records kept (seq {status['oldest_seq'] or '-'} .. {status['last_seq']})")
+        for consumer in status["consumers"]:
+            print(f"  {consumer['name']}: acknowledged {consumer['acked_seq']:,}, {consumer['lag']:,} behind "
+                  f"(last ack {consumer['acked_at'] or 'never'})")
+    else:
+        try:
+            consumer_position(args.consumer)
+        except KeyError as error:
+            parser.error(f"{error.args[0]} (run: python cdc.py register {args.consumer})")
+        out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+        written = 0
+        try:
+            for batch in tail(args.consumer, args.batch_size, args.follow):
+                out.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch))
+                out.flush()
+                if out is not sys.stdout:
+                    os.fsync(out.fileno())  # On disk before the batch is acknowledged
+                written += len(batch)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(f"{written:,} records written", file=sys.stderr)
@@ -0,0 +1,1027 @@
+# ============================================================
+# 🗄️ Database Layer for the Food Wastage Management System
+# ------------------------------------------------------------
+# Shared SQLite helpers used by the Streamlit app (app.py).
+# Features:
+# ✅ Connection pool reused across Streamlit reruns & sessions
+# ✅ Pragmas applied once when a connection is opened
+# ✅ Health checks for idle connections
+# ✅ WAL journal + single writer queue so readers never wait on writers
+# ✅ Shared LRU result cache, invalidated per table by the write queue
+#    and as a whole by writes from other processes (PRAGMA data_version)
+# ✅ Server-side filtering with keyset pagination for the browse pages
+# ✅ Trigger-maintained dashboard counters with periodic reconciliation
+# ✅ Every statement timed & recorded in metrics.query_metrics
+# ✅ Custom SQL on read-only connections with time & row limits
+# ✅ Results fetched in batches straight into typed Arrow columns
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import os                      # OS - to read configuration from environment variables
+import queue                   # Queue - thread-safe store of idle connections
+import re                      # Regex - to find the tables a SQL statement touches
+import sqlite3                 # SQLite - lightweight relational database
+import threading               # Threading - locks & per-thread state
+import time                    # Time - to track how long a connection was idle
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd            # Pandas - query results are returned as DataFrames
+try:
+    import pyarrow as pa       # PyArrow - typed column buffers while fetching results
+except ImportError:            # Optional: without it results are built from Python rows
+    pa = None
+
+from migrations import apply_migrations  # Versioned schema changes (see migrations.py)
+from scheduler import schedule           # Periodic background jobs (see scheduler.py)
+from metrics import query_metrics        # Per-statement latency histograms (see metrics.py)
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+DB_PATH = os.environ.get("FOOD_DB_PATH", "food_wastage.db")  # Path to the SQLite database file
+
+# Maximum number of open connections shared by all Streamlit sessions
+POOL_SIZE = int(os.environ.get("FOOD_DB_POOL_SIZE", "8"))
+
+# Seconds to wait for a free connection before giving up
+POOL_TIMEOUT = float(os.environ.get("FOOD_DB_POOL_TIMEOUT", "30"))
+
+# Connections idle for longer than this (seconds) are checked with "SELECT 1" before reuse
+HEALTH_CHECK_INTERVAL = float(os.environ.get("FOOD_DB_HEALTH_CHECK_INTERVAL", "60"))
+
+# Journal mode set once on the database file. WAL lets readers keep reading
+# while a write is in progress (rollback journals block them).
+JOURNAL_MODE = os.environ.get("FOOD_DB_JOURNAL_MODE", "WAL")
+
+# Pragmas applied once to every new connection (each can be overridden with an env var)
+CONNECTION_PRAGMAS = {
+    # NORMAL is safe with WAL and avoids an fsync on every commit
+    "synchronous": os.environ.get("FOOD_DB_SYNCHRONOUS", "NORMAL"),
+    # Page cache per connection; negative values are in KiB (-16000 = ~16 MB)
+    "cache_size": int(os.environ.get("FOOD_DB_CACHE_SIZE", "-16000")),
+    # Memory-map up to 256 MB of the file so reads skip a copy
+    "mmap_size": int(os.environ.get("FOOD_DB_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Keep temporary tables/indexes (GROUP BY, ORDER BY) in memory
+    "temp_store": os.environ.get("FOOD_DB_TEMP_STORE", "MEMORY"),
+    # Wait this many ms on a locked database instead of failing at once
+    "busy_timeout": int(os.environ.get("FOOD_DB_BUSY_TIMEOUT", "5000")),
+    # Enforce the REFERENCES constraints added by migration 1
+    "foreign_keys": "ON",
+}
+
+
+# Number of query results kept in the shared cache (least recently used are evicted)
+QUERY_CACHE_ENTRIES = int(os.environ.get("FOOD_DB_QUERY_CACHE_ENTRIES", "256"))
+
+# Results with more rows than this are not cached (they would crowd out everything else)
+QUERY_CACHE_MAX_ROWS = int(os.environ.get("FOOD_DB_QUERY_CACHE_MAX_ROWS", "100000"))
+
+# Seconds a cached result is served at most (backstop for changes the cache cannot see; 0 = no limit)
+QUERY_CACHE_TTL = float(os.environ.get("FOOD_DB_QUERY_CACHE_TTL", "300"))
+
+
+# Seconds between two checks of the dashboard counters against real COUNT(*)s
+RECONCILE_INTERVAL = float(os.environ.get("FOOD_DB_RECONCILE_INTERVAL", "600"))
+
+# Rows fetched from SQLite at a time while a result is turned into a DataFrame
+FETCH_BATCH_ROWS = int(os.environ.get("FOOD_DB_FETCH_BATCH_ROWS", "10000"))
+
+# Rows shown per page on the Providers / Receivers / Food Listings / Claims pages
+PAGE_SIZE = int(os.environ.get("FOOD_DB_PAGE_SIZE", "50"))
+
+
+# Custom SQL (Analysis page): wall-clock budget in seconds, rows returned at most,
+# and how many custom queries may run at once across all sessions
+CUSTOM_QUERY_TIMEOUT = float(os.environ.get("FOOD_DB_CUSTOM_QUERY_TIMEOUT", "10"))
+CUSTOM_QUERY_MAX_ROWS = int(os.environ.get("FOOD_DB_CUSTOM_QUERY_MAX_ROWS", "10000"))
+CUSTOM_QUERY_CONCURRENCY = int(os.environ.get("FOOD_DB_CUSTOM_QUERY_CONCURRENCY", "2"))
+
+# The deadline is checked every this many SQLite virtual machine instructions
+PROGRESS_HANDLER_STEPS = 10_000
+
+# Browse pages: table -> (id column used for keyset pagination, filterable columns)
+BROWSE_TABLES = {
+    "providers": ("Provider_ID", ["City"]),
+    "receivers": ("Receiver_ID", ["City"]),
+    "food_listings": ("Food_ID", ["Location", "Meal_Type"]),
+    "claims": ("Claim_ID", ["Status"]),
+}
+
+# Column types of the four main tables (used to validate imports & type results)
+#   int -> INTEGER, text -> TEXT, date -> "YYYY-MM-DD", timestamp -> "YYYY-MM-DD HH:MM:SS"
+TABLE_COLUMNS = {
+    "providers": {"Provider_ID": "int", "Name": "text", "Type": "text", "Address": "text",
+                  "City": "text", "Contact": "text"},
+    "receivers": {"Receiver_ID": "int", "Name": "text", "Type": "text", "City": "text", "Contact": "text"},
+    "food_listings": {"Food_ID": "int", "Food_Name": "text", "Quantity": "int", "Expiry_Date": "date",
+                      "Provider_ID": "int", "Provider_Type": "text", "Location": "text",
+                      "Food_Type": "text", "Meal_Type": "text"},
+    "claims": {"Claim_ID": "int", "Food_ID": "int", "Receiver_ID": "int", "Status": "text",
+               "Timestamp": "timestamp", "Quantity": "int"},
+}
+
+# Low-cardinality text columns, returned as categoricals (each distinct value stored once)
+DICTIONARY_COLUMNS = {"City", "Location", "Status", "Type", "Provider_Type", "Food_Type", "Meal_Type"}
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no connection becomes free within POOL_TIMEOUT seconds."""
+
+
+class QueryTimeout(sqlite3.OperationalError):
+    """Raised when a guarded read-only query runs past its time budget."""
+
+
+# ------------------------------
+# DATABASE BOOTSTRAP
+# ------------------------------
+def open_connection(db_path, pragmas=None):
+    """Open a SQLite connection and apply the configured pragmas to it."""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    for name, value in (CONNECTION_PRAGMAS if pragmas is None else pragmas).items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def bootstrap_database(db_path):
+    """
+    Prepare the database file before the app starts using it.
+
+    The journal mode is stored in the file itself, so switching to WAL only
+    has to happen once; afterwards every connection picks it up. Pending
+    schema migrations are applied here as well.
+    """
+    conn = open_connection(db_path)
+    try:
+        conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+    finally:
+        conn.close()
+    apply_migrations(db_path)
+
+
+# ------------------------------
+# CONNECTION POOL
+# ------------------------------
+class ConnectionPool:
+    """
+    A small pool of SQLite connections shared by all Streamlit script threads.
+
+    A thread checks a connection out with ``pool.connection()``; nested calls on
+    the same thread reuse that connection, so one script run (one rerun of
+    app.py) only ever holds a single connection. When the outermost block exits,
+    the connection goes back to the pool instead of being closed.
+
+    Parameters:
+    ----------
+    db_path : str
+        Path to the SQLite database file.
+    max_size : int
+        Maximum number of connections open at the same time.
+    timeout : float
+        Seconds to wait for a free connection when all are in use.
+    health_check_interval : float
+        Idle connections older than this are validated before reuse.
+    pragmas : dict
+        PRAGMA name -> value, applied once when a connection is opened.
+    """
+
+    def __init__(self, db_path, max_size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 health_check_interval=HEALTH_CHECK_INTERVAL, pragmas=None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.pragmas = dict(CONNECTION_PRAGMAS if pragmas is None else pragmas)
+
+        self._idle = queue.LifoQueue()                  # (connection, time it was returned)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._local = threading.local()                 # Connection checked out by this thread
+        self._lock = threading.Lock()
+        self._all = set()                               # Every open connection (for close_all)
+        self.opened = 0                                 # Statistics
+        self.reused = 0
+
+    def _open(self):
+        """Open a new connection and apply the configured pragmas."""
+        conn = open_connection(self.db_path, self.pragmas)
+        with self._lock:
+            self._all.add(conn)
+            self.opened += 1
+        return conn
+
+    def _discard(self, conn):
+        """Close a connection and forget about it."""
+        with self._lock:
+            self._all.discard(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _checkout(self):
+        """Take an idle connection (or open a new one) once a slot is free."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No database connection available after {self.timeout}s")
+        try:
+            while True:
+                try:
+                    conn, returned_at = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open()
+                # Only ping connections that sat idle for a while
+                if time.monotonic() - returned_at < self.health_check_interval or self._is_healthy(conn):
+                    self.reused += 1
+                    return conn
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn):
+        """Return a connection to the pool, rolling back anything left open."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put((conn, time.monotonic()))
+        except sqlite3.Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager yielding this thread's connection.
+
+        Usage:
+        ------
+        with pool.connection() as conn:
+            conn.execute("SELECT 1")
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            # Nested use on the same thread - share the checked-out connection
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._checkout()
+        self._local.conn, self._local.depth = conn, 1
+        try:
+            yield conn
+        finally:
+            self._local.conn, self._local.depth = None, 0
+            self._checkin(conn)
+
+    def stats(self):
+        """Return pool statistics as a dict (useful for debugging)."""
+        return {
+            "max_size": self.max_size,
+            "open": len(self._all),
+            "idle": self._idle.qsize(),
+            "opened": self.opened,
+            "reused": self.reused,
+        }
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones are closed on return)."""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+# ------------------------------
+# WRITE QUEUE
+# ------------------------------
+class WriteQueue:
+    """
+    Runs every write on one background thread with its own connection.
+
+    SQLite only allows one writer at a time. Sending all writes through a
+    single queue means they never fight over the write lock (no more
+    "database is locked"), and with WAL the pooled read connections are
+    never blocked by them.
+
+    Usage:
+    ------
+    writer.submit(lambda conn: conn.execute("DELETE FROM claims WHERE Claim_ID = ?", (5,)),
+                  tables=["claims"])
+    """
+
+    def __init__(self, db_path, pragmas=None, on_commit=None):
+        self.db_path = db_path
+        self.pragmas = pragmas
+        self.on_commit = on_commit  # Called with the written tables after each commit
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        conn = open_connection(self.db_path, self.pragmas)
+        while True:
+            func, tables, future = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with conn:  # Commits on success, rolls back on error
+                    result = func(conn)
+                # Invalidate cached reads before the caller is told the write is done
+                if self.on_commit is not None:
+                    self.on_commit(tables)
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+    def submit(self, func, tables=None, timeout=None):
+        """
+        Run ``func(conn)`` in a transaction on the writer thread and wait for it.
+
+        ``tables`` lists the tables the write changes (None = possibly all of
+        them); it decides which cached query results are thrown away.
+        Returns whatever ``func`` returns; exceptions are re-raised here.
+        """
+        future = Future()
+        self._queue.put((func, tables, future))
+        return future.result(timeout=timeout)
+
+    def pending(self):
+        """Number of writes waiting in the queue."""
+        return self._queue.qsize()
+
+
+# ------------------------------
+# QUERY RESULT CACHE
+# ------------------------------
+class QueryCache:
+    """
+    Least-recently-used cache of query results, keyed on (SQL, params).
+
+    Every table has a version number that the write queue bumps after each
+    commit touching it. A cached result remembers the versions of the tables
+    it read, and is thrown away as soon as one of them changes.
+
+    Writes that do not go through this process's write queue (the bulk import
+    and matching command lines, another app process, ...) are noticed with a
+    watcher (see watch()): when it reports a change the whole cache is
+    dropped. Results older than ``ttl`` seconds are not served either.
+
+    Cached DataFrames are shared by all sessions - treat them as read-only.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_ENTRIES, max_rows=QUERY_CACHE_MAX_ROWS, ttl=QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._entries = OrderedDict()   # (sql, params) -> (table versions, time cached, DataFrame)
+        self._versions = {}             # table name -> version number
+        self._watcher = None            # Returns a value that changes when someone else writes
+        self._seen = None               # Watcher value the cached entries are valid for
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = self.external_writes = 0
+
+    def watch(self, watcher):
+        """
+        Drop the whole cache whenever ``watcher()`` returns a new value.
+
+        It is called (under the cache lock) before every lookup, so it has to
+        be cheap - e.g. ``PRAGMA data_version`` on a dedicated connection.
+        """
+        with self._lock:
+            self._watcher, self._seen = watcher, watcher()
+
+    def absorb_own_write(self):
+        """
+        Accept the watcher's current value without dropping the cache.
+
+        Called right after this process's own commits (whose tables were just
+        invalidated one by one), so they do not also clear everything else.
+        An outside commit landing in between goes unnoticed until the ttl.
+        """
+        with self._lock:
+            if self._watcher is not None:
+                self._seen = self._watcher()
+
+    def _check_watcher(self):
+        if self._watcher is None:
+            return
+        seen = self._watcher()
+        if seen != self._seen:
+            self._seen = seen
+            self.external_writes += 1
+            self._clear()
+
+    def _clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._versions = {t: v + 1 for t, v in self._versions.items()}
+
+    def versions(self, tables):
+        """Snapshot the current version of each table."""
+        with self._lock:
+            self._check_watcher()
+            # Registered, so that clearing the cache while the query runs bumps them too
+            return {table: self._versions.setdefault(table, 0) for table in tables}
+
+    def get(self, key):
+        """Return the cached DataFrame for ``key``, or None if missing or stale."""
+        with self._lock:
+            self._check_watcher()
+            entry = self._entries.get(key)
+            if entry is not None:
+                versions, cached_at, df = entry
+                fresh = not self.ttl or time.monotonic() - cached_at < self.ttl
+                if fresh and all(self._versions.get(t, 0) == v for t, v in versions.items()):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return df
+                # A table it depends on was written to since it was cached (or it expired)
+                del self._entries[key]
+                self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, versions, df):
+        """
+        Store a result. ``versions`` must be taken *before* running the query,
+        so a write that commits while the query runs still invalidates it.
+        """
+        if len(df) > self.max_rows:
+            return
+        with self._lock:
+            if not all(self._versions.get(t, 0) == v for t, v in versions.items()):
+                return  # Written to while the query ran
+            self._entries[key] = (versions, time.monotonic(), df)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, tables=None):
+        """Bump the version of ``tables`` (None = clear the whole cache)."""
+        with self._lock:
+            if tables is None:
+                self._clear()
+                return
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def stats(self):
+        """Return hit/miss statistics as a dict (shown in the app sidebar)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "external_writes": self.external_writes,
+            }
+
+
+# ------------------------------
+# TABLE DEPENDENCIES
+# ------------------------------
+class TableCatalog:
+    """
+    Knows the tables in the database and which other tables change when one is
+    written to (through triggers or cascading foreign keys), so a write to
+    ``claims`` also invalidates anything its triggers keep up to date.
+    """
+
+    def __init__(self, conn):
+        rows = conn.execute("SELECT type, name, tbl_name, sql FROM sqlite_master "
+                            "WHERE type IN ('table', 'view', 'trigger')").fetchall()
+        self.tables = sorted({name for kind, name, _tbl, _sql in rows if kind != "trigger"},
+                             key=len, reverse=True)
+        self._pattern = re.compile(r"\b(" + "|".join(map(re.escape, self.tables)) + r")\b",
+                                   re.IGNORECASE) if self.tables else None
+        self._by_lower = {t.lower(): t for t in self.tables}
+
+        # Direct edges: table -> tables written by its triggers ...
+        self._trigger_targets = {}
+        for kind, name, tbl_name, sql in rows:
+            if kind == "trigger" and sql:
+                body = sql[sql.upper().find("BEGIN"):]
+                self._trigger_targets.setdefault(tbl_name, set()).update(self.tables_in_sql(body))
+        # ... and child tables changed by ON DELETE / ON UPDATE foreign key actions
+        for kind, name, _tbl, _sql in rows:
+            if kind != "table":
+                continue
+            for fk in conn.execute(f'PRAGMA foreign_key_list("{name}")').fetchall():
+                parent, on_update, on_delete = fk[2], fk[5], fk[6]
+                if on_update != "NO ACTION" or on_delete != "NO ACTION":
+                    self._trigger_targets.setdefault(parent, set()).add(name)
+
+    def tables_in_sql(self, sql):
+        """Return the known table names mentioned in a SQL statement."""
+        if self._pattern is None:
+            return set()
+        return {self._by_lower[m.lower()] for m in self._pattern.findall(sql)}
+
+    def affected_by_write(self, tables):
+        """Expand written tables with everything their triggers write to."""
+        affected, todo = set(), list(tables)
+        while todo:
+            table = todo.pop()
+            if table not in affected:
+                affected.add(table)
+                todo.extend(self._trigger_targets.get(table, ()))
+        return affected
+
+
+# ------------------------------
+# SHARED INSTANCES
+# ------------------------------
+# Python caches imported modules, so the pool, writer and cache survive
+# Streamlit reruns and are shared by every browser session served by the
+# same process.
+_pool = None
+_writer = None
+_catalog = None
+_init_lock = threading.Lock()
+_custom_query_slots = threading.BoundedSemaphore(CUSTOM_QUERY_CONCURRENCY)
+query_cache = QueryCache()
+
+
+def _invalidate_after_write(tables):
+    query_cache.invalidate(None if tables is None else _catalog.affected_by_write(tables))
+    query_cache.absorb_own_write()
+
+
+def _data_version_watcher(db_path):
+    """
+    Watcher for query_cache: PRAGMA data_version on a connection of its own.
+
+    The value changes whenever another connection (the write queue, another
+    process) commits, so the cache notices writes it was not told about.
+    """
+    conn = open_connection(db_path)
+    return lambda: conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _init():
+    """Bootstrap the database and create the shared pool and writer once."""
+    global _pool, _writer, _catalog
+    with _init_lock:
+        if _pool is None:
+            bootstrap_database(DB_PATH)
+            pool = ConnectionPool(DB_PATH)
+            with pool.connection() as conn:
+                _catalog = TableCatalog(conn)
+            query_cache.watch(_data_version_watcher(DB_PATH))
+            _writer = WriteQueue(DB_PATH, on_commit=_invalidate_after_write)
+            _pool = pool  # Set last: other threads treat a non-None pool as "ready"
+            schedule("reconcile_stats", RECONCILE_INTERVAL, reconcile_stats)
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    if _pool is None:
+        _init()
+    return _pool
+
+
+def get_writer():
+    """Return the process-wide write queue, creating it on first use."""
+    if _writer is None:
+        _init()
+    return _writer
+
+
+def get_connection():
+    """Shortcut for ``get_pool().connection()``."""
+    return get_pool().connection()
+
+
+def refresh_catalog():
+    """Re-read the table list and trigger graph after tables were created at runtime."""
+    global _catalog
+    with get_connection() as conn:
+        _catalog = TableCatalog(conn)
+
+
+def tables_in_sql(sql):
+    """Return the names of the database tables a SQL statement mentions."""
+    get_pool()
+    return _catalog.tables_in_sql(sql)
+
+
+def read_dataframe(query, params=(), cache=True):
+    """
+    Run a SELECT on a pooled connection and return a DataFrame.
+
+    With ``cache=True`` the result is served from (and stored in) the shared
+    query cache until one of the tables it reads is written to.
+
+    Wall time, rows and DataFrame memory are recorded in ``query_metrics``.
+    """
+    started = time.perf_counter()
+    key = (query, tuple(params))
+    df = query_cache.get(key) if cache else None
+    if df is not None:
+        query_metrics.record(query, time.perf_counter() - started, len(df), source="cache")
+        return df
+
+    versions = query_cache.versions(tables_in_sql(query)) if cache else None
+    with get_connection() as conn:
+        df, _truncated = fetch_dataframe(conn.execute(query, params))
+    elapsed = time.perf_counter() - started
+    if cache:
+        query_cache.put(key, versions, df)
+    query_metrics.record(query, elapsed, len(df), int(df.memory_usage(deep=True).sum()))
+    return df
+
+
+def execute_write(query, params=()):
+    """
+    Execute one INSERT/UPDATE/DELETE through the write queue and commit it.
+
+    Returns (rowcount, lastrowid) of the statement.
+    """
+    def write(conn):
+        cursor = conn.execute(query, params)
+        return cursor.rowcount, cursor.lastrowid
+
+    started = time.perf_counter()
+    rowcount, lastrowid = get_writer().submit(write, tables=tables_in_sql(query))
+    # Includes the wait in the write queue, which is what the user experiences
+    query_metrics.record(query, time.perf_counter() - started, max(rowcount, 0), source="write")
+    return rowcount, lastrowid
+
+
+# ------------------------------
+# GUARDED READ-ONLY QUERIES (Custom SQL)
+# ------------------------------
+@contextmanager
+def readonly_connection(timeout=CUSTOM_QUERY_TIMEOUT):
+    """
+    A dedicated read-only connection for untrusted SQL, with a time budget.
+
+    The file is opened with ``mode=ro`` (and ``query_only``), so no statement
+    can change anything, and a progress handler aborts the statement once
+    ``timeout`` seconds have passed - a runaway join gives its connection
+    back instead of holding it for minutes. Pooled connections are never
+    used, and at most CUSTOM_QUERY_CONCURRENCY of these exist at once.
+
+    Raises:
+    ------
+    QueryTimeout
+        If the budget runs out while a statement is executing or fetching.
+    PoolTimeout
+        If too many guarded queries are already running.
+    """
+    get_pool()  # Make sure the database has been bootstrapped / migrated
+    if not _custom_query_slots.acquire(timeout=POOL_TIMEOUT):
+        raise PoolTimeout("Too many custom queries are running - try again shortly")
+    try:
+        uri = Path(DB_PATH).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        try:
+            for name in ("cache_size", "mmap_size", "temp_store", "busy_timeout"):
+                conn.execute(f"PRAGMA {name} = {CONNECTION_PRAGMAS[name]}")
+            conn.execute("PRAGMA query_only = ON")
+            deadline = time.monotonic() + timeout
+            # Returning True from the handler interrupts the running statement
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_HANDLER_STEPS)
+            try:
+                yield conn
+            except sqlite3.OperationalError as exc:
+                if "interrupted" in str(exc) and time.monotonic() > deadline:
+                    raise QueryTimeout(f"Query stopped after the {timeout:g}s time limit") from exc
+                raise
+        finally:
+            conn.close()
+    finally:
+        _custom_query_slots.release()
+
+
+def run_readonly_query(query, params=(), timeout=CUSTOM_QUERY_TIMEOUT, max_rows=CUSTOM_QUERY_MAX_ROWS):
+    """
+    Run untrusted SQL (the Custom SQL Query Executor) safely.
+
+    Rows are fetched in batches and fetching stops after ``max_rows``, so a
+    huge result is never fully built in memory.
+
+    Parameters:
+    ----------
+    query : str
+        A single SQL statement. Anything that writes fails (read-only connection).
+    params : tuple
+        Query parameters.
+    timeout : float
+        Wall-clock budget in seconds for executing and fetching.
+    max_rows : int
+        Maximum number of rows returned.
+
+    Returns:
+    -------
+    (pd.DataFrame, bool)
+        The rows, and whether the result was cut off at ``max_rows``.
+    """
+    started = time.perf_counter()
+    with readonly_connection(timeout) as conn:
+        df, truncated = fetch_limited(conn.execute(query, params), max_rows)
+    query_metrics.record(query, time.perf_counter() - started, len(df),
+                         int(df.memory_usage(deep=True).sum()), source="custom")
+    return df, truncated
+
+
+def fetch_limited(cursor, max_rows, on_batch=None, batch_size=1000):
+    """
+    Fetch at most ``max_rows`` rows from an executed cursor, in batches.
+
+    ``on_batch(rows_so_far)`` is called after every batch (progress reports,
+    cancellation checks). Returns (DataFrame, truncated).
+    """
+    return fetch_dataframe(cursor, max_rows, on_batch, batch_size)
+
+
+# ------------------------------
+# TYPED RESULT FETCHING
+# ------------------------------
+# Declared type of every table column name (names declared differently in two tables are left out)
+_COLUMN_KINDS = {}
+for _columns in TABLE_COLUMNS.values():
+    for _name, _kind in _columns.items():
+        _COLUMN_KINDS[_name] = _kind if _COLUMN_KINDS.get(_name, _kind) == _kind else None
+
+
+class _TypedColumn:
+    """
+    One result column collected batch by batch as Arrow arrays.
+
+    Table columns are expected to hold their declared type (int64 /
+    string, dictionary-encoded for DICTIONARY_COLUMNS); computed ones
+    (COUNT(*), AVG(...), aliases) take the type of the first values seen.
+    Integers are widened to doubles when fractions follow. SQLite lets a
+    column mix types - such a column falls back to Python objects, which is
+    what pandas.read_sql_query would give.
+    """
+
+    def __init__(self, name):
+        kind = _COLUMN_KINDS.get(name)
+        self.type = None if kind is None else pa.int64() if kind == "int" else pa.string()
+        self.dictionary = name in DICTIONARY_COLUMNS and self.type == pa.string()
+        self.chunks = []
+        self.objects = None         # Python values once the column could not be typed
+        self.leading_nulls = 0      # All-NULL rows seen before an inferred type was known
+
+    def append(self, values):
+        if self.objects is not None:
+            self.objects.extend(values)
+            return
+        try:
+            array = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):  # Mixed types within the batch
+            array = None
+        if array is not None and pa.types.is_null(array.type):
+            if self.type is None:
+                self.leading_nulls += len(values)
+                return
+            array = pa.nulls(len(values), self.type)
+        elif array is not None and self.type is None:
+            self.type = array.type
+            if self.leading_nulls:
+                self.chunks.append(pa.nulls(self.leading_nulls, self.type))
+        elif array is not None and array.type != self.type:
+            if pa.types.is_integer(self.type) and pa.types.is_floating(array.type):
+                # Integers so far, now fractions (e.g. CASE ... THEN 1 ELSE 0.5)
+                self.type = array.type
+                self.chunks = [chunk.cast(self.type) for chunk in self.chunks]
+            elif pa.types.is_floating(self.type) and pa.types.is_integer(array.type):
+                array = array.cast(self.type)
+            else:
+                array = None
+        if array is None:
+            self.objects = self.values() + list(values)
+            return
+        self.chunks.append(array.dictionary_encode() if self.dictionary else array)
+
+    def values(self):
+        """Everything collected so far as Python values."""
+        if self.objects is not None:
+            return self.objects
+        return [None] * self.leading_nulls + [v for chunk in self.chunks for v in chunk.to_pylist()]
+
+    def to_series(self):
+        if self.objects is not None or self.type is None:
+            return pd.Series(self.values(), dtype=object)
+        if self.dictionary:
+            column = pa.chunked_array(self.chunks, pa.dictionary(pa.int32(), pa.string()))
+            series = column.unify_dictionaries().to_pandas()
+            # Categories in sorted order, so sorting the column sorts by value
+            return series.cat.reorder_categories(sorted(series.cat.categories))
+        return pa.chunked_array(self.chunks, self.type).to_pandas()
+
+
+def fetch_dataframe(cursor, max_rows=None, on_batch=None, batch_size=FETCH_BATCH_ROWS):
+    """
+    Turn an executed cursor into a DataFrame with typed columns.
+
+    Rows are fetched ``batch_size`` at a time and each batch goes straight
+    into Arrow column buffers (see _TypedColumn) - int64 for ids, Quantity
+    and counts, categoricals for DICTIONARY_COLUMNS - so the Python tuples
+    of only one batch exist at a time, instead of every row as tuples and
+    again as object columns like ``pandas.read_sql_query`` builds them.
+
+    Parameters:
+    ----------
+    cursor : sqlite3.Cursor
+        An executed statement.
+    max_rows : int, optional
+        Rows kept at most (all rows when None).
+    on_batch : callable, optional
+        Called with the rows fetched so far after every batch.
+
+    Returns:
+    -------
+    (pd.DataFrame, bool)
+        The rows, and whether the result was cut off at ``max_rows``.
+    """
+    if cursor.description is None:
+        return pd.DataFrame(), False
+    names = [d[0] for d in cursor.description]
+    columns = [_TypedColumn(name) for name in names] if pa is not None else None
+    rows, fetched = [], 0
+    while max_rows is None or fetched <= max_rows:
+        batch = cursor.fetchmany(batch_size if max_rows is None else min(batch_size, max_rows + 1 - fetched))
+        if not batch:
+            break
+        fetched += len(batch)
+        if max_rows is not None and fetched > max_rows:
+            batch = batch[:len(batch) - (fetched - max_rows)]
+        if columns is None:
+            rows += batch
+        elif batch:
+            for column, values in zip(columns, zip(*batch)):
+                column.append(values)
+        if on_batch is not None:
+            on_batch(fetched if max_rows is None else min(fetched, max_rows))
+    truncated = max_rows is not None and fetched > max_rows
+    if columns is None:
+        return pd.DataFrame.from_records(rows, columns=names), truncated
+    df = pd.concat([column.to_series() for column in columns], axis=1, ignore_index=True)
+    df.columns = names
+    return df, truncated
+
+
+# ------------------------------
+# BROWSE PAGES: FILTERS & PAGINATION
+# ------------------------------
+def _browse_where(table, filters):
+    """Build a parameterized WHERE clause from {column: value} filters."""
+    _id_col, filter_columns = BROWSE_TABLES[table]
+    clauses, params = [], []
+    for column, value in filters.items():
+        if column not in filter_columns:
+            raise ValueError(f"Cannot filter {table} by {column}")
+        clauses.append(f"{column} = ?")
+        params.append(value)
+    return clauses, params
+
+
+def distinct_values(table, column):
+    """Sorted distinct values of a filter column (cached like any other read)."""
+    if column not in BROWSE_TABLES[table][1]:
+        raise ValueError(f"Cannot filter {table} by {column}")
+    df = read_dataframe(f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL ORDER BY {column}")
+    return df[column].tolist()
+
+
+def count_rows(table, filters=None):
+    """Number of rows matching the filters."""
+    clauses, params = _browse_where(table, filters or {})
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return int(read_dataframe(f"SELECT COUNT(*) AS n FROM {table}{where}", params)["n"][0])
+
+
+def fetch_page(table, filters=None, after_id=None, before_id=None, page_size=PAGE_SIZE):
+    """
+    Fetch one page of a table using keyset pagination on its id column.
+
+    Only the rows on the page are read - instead of OFFSET (which still walks
+    every skipped row) the query seeks straight to ``id > after_id`` (next
+    page) or ``id < before_id`` (previous page) using the primary key.
+
+    Parameters:
+    ----------
+    table : str
+        One of BROWSE_TABLES.
+    filters : dict
+        {column: value} equality filters, pushed into the WHERE clause.
+    after_id, before_id : int or None
+        Cursor: return the page after / before this id (neither = first page).
+    page_size : int
+        Number of rows per page.
+
+    Returns:
+    -------
+    (pd.DataFrame, bool, bool)
+        The page rows (ascending id), whether a previous page exists and
+        whether a next page exists.
+    """
+    id_col, _filter_columns = BROWSE_TABLES[table]
+    clauses, params = _browse_where(table, filters or {})
+    backwards = before_id is not None
+    if backwards:
+        clauses.append(f"{id_col} < ?")
+        params.append(before_id)
+    elif after_id is not None:
+        clauses.append(f"{id_col} > ?")
+        params.append(after_id)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = "DESC" if backwards else "ASC"
+
+    # Ask for one extra row to find out whether there is another page
+    df = read_dataframe(f"SELECT * FROM {table}{where} ORDER BY {id_col} {order} LIMIT ?",
+                        params + [page_size + 1])
+    has_more = len(df) > page_size
+    df = df.iloc[:page_size]
+    if backwards:
+        df = df.iloc[::-1]
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after_id is not None, has_more
+    return df.reset_index(drop=True), has_prev, has_next
+
+
+# ------------------------------
+# DASHBOARD COUNTERS
+# ------------------------------
+STATS_TABLES = ["providers", "receivers", "food_listings", "claims"]
+
+
+def dashboard_counts():
+    """Row count of each main table, read from the trigger-maintained table_stats."""
+    df = read_dataframe("SELECT table_name, row_count FROM table_stats")
+    return dict(zip(df["table_name"], df["row_count"]))
+
+
+def provider_city_counts():
+    """Providers per city (DataFrame with City, provider_count), largest first."""
+    return read_dataframe("SELECT City, provider_count FROM provider_city_counts ORDER BY provider_count DESC")
+
+
+def reconcile_stats():
+    """
+    Compare the dashboard counters with real COUNT(*)s and fix any drift.
+
+    The triggers keep the counters exact for every write that goes through
+    SQLite, so drift should only come from manual edits (e.g. triggers
+    dropped while bulk-editing the file). Runs every RECONCILE_INTERVAL
+    seconds in the background; the check runs on the writer so no write can
+    slip in between counting and fixing.
+
+    Returns:
+    -------
+    dict
+        {"checked_at": ..., "drift": {table: (stored, actual)}}, with
+        per-city (stored, actual) pairs under "provider_city_counts". An
+        empty drift means the counters were correct.
+    """
+    def check_and_fix(conn):
+        drift = {}
+        stored = dict(conn.execute("SELECT table_name, row_count FROM table_stats").fetchall())
+        for table in STATS_TABLES:
+            actual = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            if stored.get(table) != actual:
+                drift[table] = (stored.get(table), actual)
+                conn.execute("INSERT INTO table_stats (table_name, row_count) VALUES (?, ?) "
+                             "ON CONFLICT (table_name) DO UPDATE SET row_count = excluded.row_count",
+                             (table, actual))
+
+        stored = dict(conn.execute("SELECT City, provider_count FROM provider_city_counts").fetchall())
+        actual = dict(conn.execute("SELECT City, COUNT(*) FROM providers WHERE City IS NOT NULL GROUP BY City").fetchall())
+        city_drift = {city: (stored.get(city), actual.get(city))
+                      for city in stored.keys() | actual.keys() if stored.get(city) != actual.get(city)}
+        if city_drift:
+            drift["provider_city_counts"] = city_drift
+            conn.execute("DELETE FROM provider_city_counts")
+            conn.executemany("INSERT INTO provider_city_counts (City, provider_count) VALUES (?, ?)",
+                             actual.items())
+        return drift
+
+    drift = get_writer().submit(check_and_fix, tables=["table_stats", "provider_city_counts"])
+    return {"checked_at": time.strftime("%Y-%m-%d %H:%M:%S"), "drift": drift}
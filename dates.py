@@ -0,0 +1,57 @@
+# ============================================================
+# 📅 Date Helpers
+# ------------------------------------------------------------
+# The database stores dates as ISO-8601 text so they sort and
+# compare correctly (and can use indexes):
+#   food_listings.Expiry_Date -> "YYYY-MM-DD"
+#   claims.Timestamp          -> "YYYY-MM-DD HH:MM:SS"
+# These helpers convert user input and legacy "M/D/YYYY" values.
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+from datetime import date, datetime
+
+# Accepted input formats, tried in order
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y"]
+TIMESTAMP_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M",
+                     "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%Y-%m-%d", "%m/%d/%Y"]
+
+
+def _parse(value, formats):
+    text = str(value).strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {value!r}")
+
+
+def to_iso_date(value):
+    """
+    Convert a date (date/datetime object or text such as "3/17/2025") to
+    "YYYY-MM-DD". ``None`` stays ``None``; anything unparseable raises ValueError.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return _parse(value, DATE_FORMATS).date().isoformat()
+
+
+def to_iso_timestamp(value):
+    """
+    Convert a timestamp (datetime object or text such as "3/5/2025 5:26") to
+    "YYYY-MM-DD HH:MM:SS". ``None`` stays ``None``; anything unparseable raises ValueError.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).isoformat(sep=" ", timespec="seconds")
+    return _parse(value, TIMESTAMP_FORMATS).isoformat(sep=" ", timespec="seconds")
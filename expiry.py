@@ -0,0 +1,151 @@
+# ============================================================
+# ⏰ Expiry Priority Index
+# ------------------------------------------------------------
+# Keeps the food listings that still have food left, of every
+# Location, sorted by Expiry_Date in memory, so "what spoils next
+# here?" is answered without touching the database.
+# Features:
+# ✅ Top-N soonest-expiring listings per Location (or overall)
+# ✅ Updated incrementally by the CRUD forms (sync_listing)
+# ✅ Fully rebuilt by a background job to pick up other writers
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import bisect                  # Bisect - keeps each Location's list sorted
+import heapq                   # Heapq - merges the per-Location lists for "All"
+import itertools               # Itertools - take the first n merged items
+import os                      # OS - to read configuration from environment variables
+import threading               # Threading - the index is shared by all sessions
+from datetime import date, datetime
+
+from database import get_connection
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+# Seconds between two full rebuilds of the index in the background
+EXPIRY_REFRESH_INTERVAL = float(os.environ.get("FOOD_DB_EXPIRY_REFRESH_INTERVAL", "300"))
+
+# Claims in these states hold their Quantity of a listing (see migration 7)
+ACTIVE_CLAIM_STATUSES = ("Pending", "Completed")
+
+# food_listings.Quantity is what is left, so this reads the partial index
+# idx_food_listings_available instead of checking every listing's claims
+_AVAILABLE_SQL = """
+    SELECT f.Food_ID, f.Location, f.Expiry_Date
+    FROM food_listings f
+    WHERE f.Quantity > 0 AND f.Expiry_Date IS NOT NULL
+"""
+
+
+# ------------------------------
+# PRIORITY INDEX
+# ------------------------------
+class ExpiryIndex:
+    """
+    Listings with food left, grouped by Location, each group sorted by
+    (Expiry_Date, Food_ID).
+
+    ISO dates sort as text, so a plain sorted list + bisect gives
+    O(log n) inserts/removals and lets top() skip already-expired items
+    with one binary search.
+    """
+
+    def __init__(self):
+        self._by_location = {}   # Location -> sorted list of (Expiry_Date, Food_ID)
+        self._entries = {}       # Food_ID -> (Location, Expiry_Date)
+        self._lock = threading.Lock()
+        self.built_at = None     # Time of the last full rebuild
+
+    # ---- maintenance ----
+    def rebuild(self):
+        """Reload every listing with food left from the database. Returns the number indexed."""
+        with get_connection() as conn:
+            rows = conn.execute(_AVAILABLE_SQL).fetchall()
+        by_location, entries = {}, {}
+        for food_id, location, expiry in rows:
+            by_location.setdefault(location, []).append((expiry, food_id))
+            entries[food_id] = (location, expiry)
+        for items in by_location.values():
+            items.sort()
+        with self._lock:
+            self._by_location, self._entries = by_location, entries
+            self.built_at = datetime.now().isoformat(sep=" ", timespec="seconds")
+        return len(entries)
+
+    def _remove(self, food_id):
+        old = self._entries.pop(food_id, None)
+        if old is None:
+            return
+        location, expiry = old
+        items = self._by_location[location]
+        pos = bisect.bisect_left(items, (expiry, food_id))
+        if pos < len(items) and items[pos] == (expiry, food_id):
+            items.pop(pos)
+        if not items:
+            del self._by_location[location]
+
+    def sync_listing(self, food_id):
+        """
+        Re-read one listing after it (or a claim on it) was added, changed or
+        deleted, and add it to / remove it from the index accordingly.
+        """
+        with get_connection() as conn:
+            row = conn.execute(_AVAILABLE_SQL + " AND f.Food_ID = ?", (food_id,)).fetchone()
+        with self._lock:
+            self._remove(food_id)
+            if row is not None:
+                _id, location, expiry = row
+                bisect.insort(self._by_location.setdefault(location, []), (expiry, food_id))
+                self._entries[food_id] = (location, expiry)
+
+    # ---- queries ----
+    def ensure_built(self):
+        if self.built_at is None:
+            self.rebuild()
+
+    def locations(self):
+        """Locations that currently have listings with food left."""
+        self.ensure_built()
+        with self._lock:
+            return sorted(loc for loc in self._by_location if loc is not None)
+
+    def top(self, location=None, n=10, include_expired=False):
+        """
+        The ``n`` soonest-expiring listings with food left.
+
+        Parameters:
+        ----------
+        location : str or None
+            Only this Location (None = across all Locations).
+        n : int
+            Number of listings to return.
+        include_expired : bool
+            If False, listings whose Expiry_Date is before today are skipped.
+
+        Returns:
+        -------
+        list of (Expiry_Date, Food_ID, Location)
+        """
+        self.ensure_built()
+        today = "" if include_expired else date.today().isoformat()
+
+        def upcoming(loc, items):
+            start = bisect.bisect_left(items, (today,))
+            return ((expiry, food_id, loc) for expiry, food_id in items[start:start + n])
+
+        with self._lock:
+            if location is not None:
+                return list(upcoming(location, self._by_location.get(location, [])))
+            # Each Location's list is already sorted: merge lazily, stop after n
+            streams = [upcoming(loc, items) for loc, items in self._by_location.items()]
+            return list(itertools.islice(heapq.merge(*streams), n))
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by every session in the process (like the connection pool)
+expiry_index = ExpiryIndex()
@@ -0,0 +1,201 @@
+# ============================================================
+# 📤 Streaming Export to CSV, Parquet and Arrow IPC
+# ------------------------------------------------------------
+# Writes a table or any SELECT straight from the SQLite cursor
+# to a file, a batch of rows at a time, so memory use stays the
+# same no matter how many rows are exported.
+#
+# Command line:
+#   python export_data.py --table claims --format parquet -o claims.parquet
+#   python export_data.py --query "SELECT * FROM claims WHERE Status = 'Completed'" -o done.csv
+# In the app every browse page and the Custom SQL Query Executor
+# have an "Export" button.
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import csv                     # CSV - streaming CSV writer
+import io                      # IO - text wrapper around binary outputs
+import os                      # OS - to read configuration from environment variables
+
+import database
+from database import TABLE_COLUMNS, BROWSE_TABLES, get_connection, readonly_connection
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+EXPORT_BATCH_ROWS = 10_000     # Rows fetched from the cursor and written at a time
+# Time budget (seconds) for exporting user-typed SQL from the Custom SQL Query Executor
+CUSTOM_EXPORT_TIMEOUT = float(os.environ.get("FOOD_DB_CUSTOM_EXPORT_TIMEOUT", "300"))
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+MIME_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet",
+              "arrow": "application/vnd.apache.arrow.file"}
+
+# Known column types (from the four main tables) used to build Arrow schemas
+_KNOWN_TYPES = {col: kind for columns in TABLE_COLUMNS.values() for col, kind in columns.items()}
+
+
+# ------------------------------
+# WRITERS
+# ------------------------------
+class _CsvWriter:
+    def __init__(self, out, columns):
+        self._text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+        self._csv = csv.writer(self._text)
+        self._csv.writerow(columns)
+
+    def write(self, rows):
+        self._csv.writerows(rows)
+
+    def close(self):
+        self._text.flush()
+        self._text.detach()  # Leave the caller's file open
+
+
+class _ArrowWriter:
+    """Writes Parquet or Arrow IPC (file format) batches with a fixed schema."""
+
+    def __init__(self, out, columns, first_rows, fmt):
+        try:
+            import pyarrow as pa
+        except ImportError as exc:
+            raise RuntimeError("Parquet / Arrow export needs the 'pyarrow' package") from exc
+        self._pa = pa
+        self.schema = pa.schema([(c, self._column_type(c, i, first_rows)) for i, c in enumerate(columns)])
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(out, self.schema)
+        else:
+            self._writer = pa.ipc.new_file(out, self.schema)
+
+    def _column_type(self, name, index, rows):
+        """Type from the table definitions, else from the first non-NULL value."""
+        pa = self._pa
+        kind = _KNOWN_TYPES.get(name)
+        if kind is not None:
+            return pa.int64() if kind == "int" else pa.string()
+        sample = next((row[index] for row in rows if row[index] is not None), None)
+        if isinstance(sample, int):
+            return pa.int64()
+        if isinstance(sample, float):
+            return pa.float64()
+        if isinstance(sample, bytes):
+            return pa.binary()
+        return pa.string()
+
+    def _array(self, values, field):
+        pa = self._pa
+        try:
+            return pa.array(values, type=field.type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            # SQLite columns can mix types; fall back to text for text columns
+            if field.type == pa.string():
+                return pa.array([None if v is None else str(v) for v in values], type=field.type)
+            if field.type == pa.int64():
+                return pa.array([None if v is None else float(v) for v in values]).cast(pa.int64(), safe=False)
+            raise
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        arrays = [self._array(list(col), field) for col, field in zip(columns, self.schema)]
+        self._writer.write_batch(self._pa.record_batch(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+# ------------------------------
+# EXPORT
+# ------------------------------
+def export_query(query, out, fmt="csv", params=(), batch_size=EXPORT_BATCH_ROWS, timeout=None):
+    """
+    Stream the result of a SELECT into ``out``.
+
+    Parameters:
+    ----------
+    query : str
+        SELECT statement to export.
+    out : str or binary file-like
+        Output path or open binary file.
+    fmt : str
+        "csv", "parquet" or "arrow" (Arrow IPC file).
+    params : tuple
+        Query parameters.
+    batch_size : int
+        Rows fetched and written per batch (memory use is proportional to this).
+    timeout : float or None
+        If given, the query runs on a guarded read-only connection and is
+        stopped after this many seconds (used for user-typed SQL).
+
+    Returns:
+    -------
+    int
+        Number of rows written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt} (use {', '.join(FORMATS)})")
+
+    close_out = isinstance(out, str)
+    if close_out:
+        out = open(out, "wb")
+    written = 0
+    try:
+        with get_connection() if timeout is None else readonly_connection(timeout) as conn:
+            # Exports accept user SQL: make sure it cannot change anything
+            conn.execute("PRAGMA query_only = ON")
+            try:
+                cursor = conn.execute(query, params)
+                if cursor.description is None:
+                    raise ValueError("Only queries that return rows (SELECT) can be exported")
+                columns = [d[0] for d in cursor.description]
+
+                rows = cursor.fetchmany(batch_size)
+                writer = _CsvWriter(out, columns) if fmt == "csv" else _ArrowWriter(out, columns, rows, fmt)
+                try:
+                    while rows:
+                        writer.write(rows)
+                        written += len(rows)
+                        rows = cursor.fetchmany(batch_size)
+                finally:
+                    writer.close()
+            finally:
+                conn.execute("PRAGMA query_only = OFF")
+    finally:
+        if close_out:
+            out.close()
+    return written
+
+
+def export_table(table, out, fmt="csv", filters=None, batch_size=EXPORT_BATCH_ROWS):
+    """Export a whole table (optionally with browse-page {column: value} filters) in id order."""
+    id_col, filter_columns = BROWSE_TABLES[table]
+    filters = filters or {}
+    for column in filters:
+        if column not in filter_columns:
+            raise ValueError(f"Cannot filter {table} by {column}")
+    where = " AND ".join(f"{c} = ?" for c in filters)
+    query = f"SELECT * FROM {table}{' WHERE ' + where if where else ''} ORDER BY {id_col}"
+    return export_query(query, out, fmt, tuple(filters.values()), batch_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a table or query result from the food wastage database")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--table", choices=sorted(BROWSE_TABLES), help="Table to export")
+    source.add_argument("--query", help="SELECT statement to export")
+    parser.add_argument("--format", choices=sorted(FORMATS), help="Output format (default: from the file extension)")
+    parser.add_argument("-o", "--output", required=True, help="Output file")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_ROWS, help="Rows per batch")
+    parser.add_argument("--db", default=database.DB_PATH, help="Path to the SQLite database file")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    fmt = args.format or next((f for f, ext in FORMATS.items() if args.output.lower().endswith(ext)), "csv")
+    if args.table:
+        count = export_table(args.table, args.output, fmt, batch_size=args.batch_size)
+    else:
+        count = export_query(args.query, args.output, fmt, batch_size=args.batch_size)
+    print(f"Wrote {count:,} rows to {args.output}")
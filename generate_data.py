@@ -0,0 +1,337 @@
+# ============================================================
+# 🧪 Synthetic Data Generator
+# ------------------------------------------------------------
+# Builds a new database with realistic providers, receivers,
+# food listings and claims at any size, for testing how the app
+# and its queries scale beyond the shipped 1,000-row tables.
+# Features:
+# ✅ Deterministic: the same seed & size give the same database
+# ✅ Skewed (Zipf) cities, foods, providers, listings & receivers
+# ✅ Same schema as the app (created by migrations.py)
+# ✅ Generated and loaded in chunks, indexes built once at the end
+#
+# Command line:
+#   python generate_data.py --rows 1m -o food_1m.db
+#   python generate_data.py --rows 10m -o food_10m.db --seed 7
+#   FOOD_DB_PATH=food_1m.db streamlit run app.py
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import os                      # OS - to refuse overwriting existing files
+import sqlite3                 # SQLite - the generated database
+import time                    # Time - progress reporting
+from datetime import date, datetime, timedelta
+
+import numpy as np             # NumPy - vectorized random generation
+
+from database import TABLE_COLUMNS
+from expiry import ACTIVE_CLAIM_STATUSES
+from migrations import apply_migrations
+from search import rebuild_indexes
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+# Named sizes: rows in food_listings and in claims (providers & receivers get a tenth)
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+GENERATION_CHUNK = 200_000     # Rows generated & inserted at a time (part of the seed, keep fixed)
+DEFAULT_SEED = 42
+DEFAULT_BASE_DATE = "2025-03-15"  # Expiry dates & claim times are spread around this day
+ZIPF_SKEW = 1.1                # Higher = a few cities/foods/providers get even more of the rows
+
+PROVIDER_TYPES = (["Supermarket", "Grocery Store", "Restaurant", "Catering Service"], [0.35, 0.3, 0.25, 0.1])
+RECEIVER_TYPES = (["NGO", "Shelter", "Charity", "Individual"], [0.35, 0.25, 0.2, 0.2])
+MEAL_TYPES = (["Lunch", "Dinner", "Breakfast", "Snacks"], [0.35, 0.3, 0.2, 0.15])
+CLAIM_STATUSES = (["Completed", "Pending", "Cancelled"], [0.5, 0.3, 0.2])
+# Food name -> the food types it can be listed as (most popular first, for the Zipf skew)
+FOODS = {
+    "Bread": ["Vegetarian", "Vegan"], "Rice": ["Vegan", "Vegetarian"], "Vegetables": ["Vegan"],
+    "Fruits": ["Vegan"], "Soup": ["Vegetarian", "Non-Vegetarian", "Vegan"], "Pasta": ["Vegetarian", "Vegan"],
+    "Dairy": ["Vegetarian"], "Salad": ["Vegan", "Vegetarian"], "Chicken": ["Non-Vegetarian"],
+    "Fish": ["Non-Vegetarian"],
+}
+
+# Building blocks for fake-but-plausible names (like the shipped data)
+_CITY_PREFIXES = ["", "North ", "South ", "East ", "West ", "Lake ", "Port ", "New ", "Fort ", "Mount "]
+_CITY_ROOTS = ["Jessica", "Kelly", "Carl", "Regina", "James", "Andrea", "Hanson", "Welch", "Guzman", "Lewis",
+               "Randall", "Sheena", "Jesus", "Martin", "Harris", "Clark", "Walker", "Young", "Allen", "King",
+               "Wright", "Scott", "Green", "Baker", "Adams", "Nelson", "Hill", "Campbell", "Mitchell", "Roberts",
+               "Carter", "Phillips", "Evans", "Turner", "Torres", "Parker", "Collins", "Edwards", "Stewart",
+               "Flores", "Morris", "Nguyen", "Murphy", "Rivera", "Cook", "Rogers", "Morgan", "Peterson"]
+_CITY_SUFFIXES = ["", "ville", "town", "burgh", "mouth", "view", "side", "chester", "port", "berg"]
+_STATES = ["AL", "AZ", "CA", "CO", "CT", "FL", "GA", "IL", "IN", "KS", "KY", "LA", "MA", "MD", "MI", "MN",
+           "MO", "NC", "NJ", "NM", "NV", "NY", "OH", "OK", "OR", "PA", "SC", "TN", "TX", "UT", "VA", "WA", "WI"]
+_FIRST_NAMES = ["Donald", "Laurie", "Ashley", "Michael", "Sarah", "David", "Maria", "James", "Linda", "Robert",
+                "Emily", "Daniel", "Laura", "Kevin", "Nancy", "Brian", "Karen", "Jason", "Lisa", "Eric"]
+_SURNAMES = [root for root in _CITY_ROOTS if root not in ("Jessica", "Kelly", "Regina", "Andrea", "Sheena", "Jesus")]
+_COMPANY_SUFFIXES = ["Foods", "Market", "Kitchen", "Grocers", "Bakery", "Catering", "and Sons", "LLC", "Inc", "Group"]
+_STREETS = ["Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Washington", "Lake", "Hill", "Park", "River", "Sunset"]
+
+
+# ------------------------------
+# RANDOM HELPERS
+# ------------------------------
+def _rng(seed, table, chunk):
+    """Independent stream per (table, chunk): output does not depend on generation order."""
+    return np.random.default_rng([seed, table, chunk])
+
+
+def zipf_weights(n, skew=ZIPF_SKEW):
+    """Probabilities proportional to 1 / rank**skew for ranks 1..n."""
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+class SkewedChoice:
+    """
+    Draws ids 1..n with a Zipf distribution over a fixed random ranking, so
+    the popular ids are scattered rather than always the smallest ones.
+    ``salt`` (an int) gives each kind of choice its own ranking.
+    """
+
+    def __init__(self, n, seed, salt, skew=ZIPF_SKEW):
+        self.cumulative = np.cumsum(zipf_weights(n, skew))
+        self.ranking = np.random.default_rng([seed, salt]).permutation(n)
+
+    def draw(self, rng, size):
+        ranks = np.searchsorted(self.cumulative, rng.random(size) * self.cumulative[-1], side="right")
+        return self.ranking[np.minimum(ranks, len(self.ranking) - 1)] + 1
+
+
+def _pick(rng, choices, size):
+    values, probabilities = choices
+    return np.array(values, dtype=object)[rng.choice(len(values), size=size, p=probabilities)]
+
+
+def _phones(rng, size):
+    area, exchange, line = rng.integers(200, 1000, size), rng.integers(200, 1000, size), rng.integers(0, 10000, size)
+    return [f"+1-{a}-{b}-{c:04d}" for a, b, c in zip(area, exchange, line)]
+
+
+def city_names(count):
+    """``count`` distinct city names, in a fixed order."""
+    names = [p + r + s for s in _CITY_SUFFIXES for p in _CITY_PREFIXES for r in _CITY_ROOTS]
+    if count > len(names):
+        names += [f"{name} {i}" for i in range(2, count // len(names) + 2) for name in names]
+    return names[:count]
+
+
+# ------------------------------
+# TABLE GENERATORS (one chunk each)
+# ------------------------------
+class Generator:
+    """
+    Generates the four tables chunk by chunk.
+
+    Parameters:
+    ----------
+    rows : int
+        Rows in food_listings and in claims; providers & receivers get rows // 10
+        (at least 100).
+    seed : int
+        Random seed - the same seed and size always give the same data.
+    base_date : str
+        "YYYY-MM-DD" around which expiry dates and claim times are spread.
+    """
+
+    def __init__(self, rows, seed=DEFAULT_SEED, base_date=DEFAULT_BASE_DATE):
+        self.seed = seed
+        self.base_date = date.fromisoformat(base_date)
+        self.sizes = {"providers": max(rows // 10, 100), "receivers": max(rows // 10, 100),
+                      "food_listings": rows, "claims": rows}
+        # Roughly one city per 30 providers, so a few big cities and a long tail
+        self.cities = np.array(city_names(max(self.sizes["providers"] // 30, 20)), dtype=object)
+        self.city_choice = SkewedChoice(len(self.cities), seed, salt=1)
+        self.food_names = list(FOODS)
+        self.food_weights = zipf_weights(len(self.food_names), 0.8)
+        self.provider_choice = SkewedChoice(self.sizes["providers"], seed, salt=2)
+        self.receiver_choice = SkewedChoice(self.sizes["receivers"], seed, salt=3)
+        self.listing_choice = SkewedChoice(self.sizes["food_listings"], seed, salt=4, skew=0.6)
+        # Listings need their provider's city & type; claims need the listing's expiry & what is left of it
+        self._provider_city = None
+        self._provider_type = None
+        self._expiry_offset = np.zeros(rows + 1, dtype=np.int16)
+        self._listed = np.zeros(rows + 1, dtype=np.int32)
+        self._left = np.zeros(rows + 1, dtype=np.int32)
+
+    def chunks(self, table):
+        """Yield (columns, rows) chunks for a table, in id order."""
+        total = self.sizes[table]
+        make = getattr(self, f"_{table}")
+        for number, start in enumerate(range(0, total, GENERATION_CHUNK)):
+            ids = np.arange(start + 1, min(start + GENERATION_CHUNK, total) + 1)
+            yield make(_rng(self.seed, list(self.sizes).index(table), number), ids)
+
+    def _providers(self, rng, ids):
+        n = len(ids)
+        if self._provider_city is None:
+            self._provider_city = np.empty(self.sizes["providers"] + 1, dtype=object)
+            self._provider_type = np.empty(self.sizes["providers"] + 1, dtype=object)
+        cities = self.cities[self.city_choice.draw(rng, n) - 1]
+        types = _pick(rng, PROVIDER_TYPES, n)
+        self._provider_city[ids], self._provider_type[ids] = cities, types
+        surnames = rng.choice(_SURNAMES, size=(n, 2))
+        suffixes = rng.choice(_COMPANY_SUFFIXES, size=n)
+        states = rng.choice(_STATES, size=n)
+        numbers, streets = rng.integers(1, 99999, size=n), rng.choice(_STREETS, size=n)
+        zips = rng.integers(10000, 99999, size=n)
+        names = [f"{a}-{b} {s}" for (a, b), s in zip(surnames, suffixes)]
+        # Same shape as the shipped data: "<street>\n<town>, <STATE> <zip>"
+        addresses = [f"{num} {street} Street\n{city}, {state} {zip_code}"
+                     for num, street, city, state, zip_code in zip(numbers, streets, cities, states, zips)]
+        rows = zip(ids.tolist(), names, types, addresses, cities, _phones(rng, n))
+        return ["Provider_ID", "Name", "Type", "Address", "City", "Contact"], list(rows)
+
+    def _receivers(self, rng, ids):
+        n = len(ids)
+        names = [f"{first} {last}" for first, last in zip(rng.choice(_FIRST_NAMES, size=n),
+                                                          rng.choice(_SURNAMES, size=n))]
+        cities = self.cities[self.city_choice.draw(rng, n) - 1]
+        rows = zip(ids.tolist(), names, _pick(rng, RECEIVER_TYPES, n), cities, _phones(rng, n))
+        return ["Receiver_ID", "Name", "Type", "City", "Contact"], list(rows)
+
+    def _food_listings(self, rng, ids):
+        n = len(ids)
+        providers = self.provider_choice.draw(rng, n)
+        food = rng.choice(len(self.food_names), size=n, p=self.food_weights)
+        food_types = [FOODS[self.food_names[f]][i % len(FOODS[self.food_names[f]])]
+                      for f, i in zip(food, rng.integers(0, 6, size=n))]
+        quantities = np.clip(rng.lognormal(3.0, 0.7, size=n), 1, 500).astype(int)
+        offsets = rng.integers(-15, 31, size=n)
+        self._expiry_offset[ids] = offsets
+        self._listed[ids] = self._left[ids] = quantities
+        expiry = [(self.base_date + timedelta(days=int(d))).isoformat() for d in offsets]
+        rows = zip(ids.tolist(), [self.food_names[f] for f in food], quantities.tolist(), expiry,
+                   providers.tolist(), self._provider_type[providers], self._provider_city[providers],
+                   food_types, _pick(rng, MEAL_TYPES, n))
+        return ["Food_ID", "Food_Name", "Quantity", "Expiry_Date", "Provider_ID", "Provider_Type",
+                "Location", "Food_Type", "Meal_Type"], list(rows)
+
+    def _claims(self, rng, ids):
+        n = len(ids)
+        food = self.listing_choice.draw(rng, n)
+        # Claimed 0-10 days before the listing expires, at any time of day
+        seconds = rng.integers(0, 10 * 86400, size=n)
+        base = datetime(self.base_date.year, self.base_date.month, self.base_date.day)
+        stamps = [(base + timedelta(days=int(d), seconds=-int(s))).isoformat(sep=" ")
+                  for d, s in zip(self._expiry_offset[food], seconds)]
+        receivers, statuses = self.receiver_choice.draw(rng, n), _pick(rng, CLAIM_STATUSES, n)
+        # Receivers ask for part of a listing; an active claim gets what is still left of
+        # that, and one that finds nothing left has been cancelled
+        wanted = np.maximum(1, self._listed[food] * rng.uniform(0.1, 1.0, size=n)).astype(int)
+        quantities = wanted.copy()
+        for i, (food_id, status) in enumerate(zip(food.tolist(), statuses)):
+            if status in ACTIVE_CLAIM_STATUSES:
+                quantities[i] = taken = min(wanted[i], self._left[food_id])
+                if taken:
+                    self._left[food_id] -= taken
+                else:
+                    statuses[i], quantities[i] = "Cancelled", wanted[i]
+        rows = zip(ids.tolist(), food.tolist(), receivers.tolist(), statuses, stamps, quantities.tolist())
+        return ["Claim_ID", "Food_ID", "Receiver_ID", "Status", "Timestamp", "Quantity"], list(rows)
+
+
+# ------------------------------
+# DATABASE BUILD
+# ------------------------------
+def _rebuild_derived(conn):
+    """Recompute the trigger-maintained tables once after the bulk load."""
+    conn.execute("DELETE FROM table_stats")
+    for table in TABLE_COLUMNS:
+        conn.execute(f"INSERT INTO table_stats (table_name, row_count) SELECT '{table}', COUNT(*) FROM {table}")
+    conn.execute("DELETE FROM provider_city_counts")
+    conn.execute("INSERT INTO provider_city_counts (City, provider_count) "
+                 "SELECT City, COUNT(*) FROM providers WHERE City IS NOT NULL GROUP BY City")
+    # Listings hold what is left after their active claims (the stock triggers were dropped during the load)
+    active = ", ".join(f"'{status}'" for status in ACTIVE_CLAIM_STATUSES)
+    conn.execute(f"""UPDATE food_listings SET Quantity = Quantity - c.claimed
+                     FROM (SELECT Food_ID, SUM(Quantity) AS claimed FROM claims
+                           WHERE Status IN ({active}) GROUP BY Food_ID) AS c
+                     WHERE food_listings.Food_ID = c.Food_ID""")
+    conn.execute("DELETE FROM mv_change_log")  # A fresh database has no changes to replay
+    conn.execute("DELETE FROM cdc_outbox")     # ... nor any to send downstream
+    rebuild_indexes(conn)  # Full-text search indexes (their triggers were dropped during the load)
+
+
+def generate_database(path, rows, seed=DEFAULT_SEED, base_date=DEFAULT_BASE_DATE, progress=print):
+    """
+    Create a new database at ``path`` filled with synthetic data.
+
+    The schema comes from migrations.py (so it always matches the app).
+    Triggers and indexes are dropped during the load and recreated at the
+    end - building an index once is far faster than updating it per row.
+
+    Returns:
+    -------
+    dict
+        Rows written per table.
+    """
+    # Start from the original (key-less) tables so every migration applies as usual
+    conn = sqlite3.connect(path)
+    for table, columns in TABLE_COLUMNS.items():
+        definition = ", ".join(f"{c} {'INTEGER' if kind == 'int' else 'TEXT'}" for c, kind in columns.items())
+        conn.execute(f"CREATE TABLE {table} ({definition})")
+    conn.commit()
+    conn.close()
+    apply_migrations(path)
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")  # Safe here: a failed build is simply redone
+    marks = ", ".join("?" for _ in TABLE_COLUMNS)
+    saved = conn.execute(f"""SELECT type, name, sql FROM sqlite_master
+                             WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+                               AND tbl_name IN ({marks})""", list(TABLE_COLUMNS)).fetchall()
+    for kind, name, _sql in saved:
+        conn.execute(f'DROP {kind.upper()} "{name}"')
+
+    generator, written = Generator(rows, seed, base_date), {}
+    started = time.perf_counter()
+    for table in TABLE_COLUMNS:  # Parents before children
+        written[table] = 0
+        for columns, chunk in generator.chunks(table):
+            conn.execute("BEGIN")
+            conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) "
+                             f"VALUES ({', '.join('?' for _ in columns)})", chunk)
+            conn.execute("COMMIT")
+            written[table] += len(chunk)
+            progress(f"{table}: {written[table]:,} rows ({time.perf_counter() - started:.0f}s)")
+
+    progress("Building indexes and triggers...")
+    conn.execute("BEGIN")
+    for kind, _name, sql in sorted(saved, key=lambda s: s[0] != "index"):
+        conn.execute(sql)
+    _rebuild_derived(conn)
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+    conn.close()
+    return written
+
+
+def parse_size(text):
+    """'10k' / '1m' / '10m' or a plain number of rows."""
+    return SIZES.get(text.lower()) or int(text.replace("_", "").replace(",", ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic food wastage database")
+    parser.add_argument("--rows", default="10k", help=f"Listings & claims: {', '.join(SIZES)} or a number")
+    parser.add_argument("-o", "--output", required=True, help="New database file")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Random seed")
+    parser.add_argument("--base-date", default=DEFAULT_BASE_DATE, help="Centre of expiry dates (YYYY-MM-DD)")
+    parser.add_argument("--force", action="store_true", help="Overwrite the output file")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        if not args.force:
+            parser.error(f"{args.output} exists (use --force to overwrite)")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.output + suffix):
+                os.remove(args.output + suffix)
+    started = time.perf_counter()
+    counts = generate_database(args.output, parse_size(args.rows), args.seed, args.base_date)
+    print(f"Done in {time.perf_counter() - started:.1f}s: " + ", ".join(f"{t} {n:,}" for t, n in counts.items()))
@@ -0,0 +1,386 @@
+# ============================================================
+# 📍 Offline Geocoding & Nearest-Receiver Index
+# ------------------------------------------------------------
+# Turns provider addresses and receiver cities into coordinates
+# with a bundled gazetteer (no network), and answers "which
+# receivers are closest to this provider?" from memory.
+# Features:
+# ✅ Gazetteer file: state centroids, plus optional city rows
+# ✅ Coordinates cached per provider / receiver (geocodes table)
+# ✅ KD-tree over receiver locations: k nearest in microseconds
+# ✅ Refreshed incrementally: only new or changed rows are geocoded
+#
+# Receivers only have a City, so they are placed in the state that
+# provider addresses in the same city are in. The bundled file is
+# state-level; add "state,city,latitude,longitude" rows to
+# gazetteer.csv (or point FOOD_APP_GAZETTEER at a bigger file) for
+# city-level precision.
+#
+# Command line:
+#   python geocoding.py --db food_1m.db --provider 42 -k 10
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import bisect                  # Bisect - receivers at one location kept sorted by id
+import csv                     # CSV - the gazetteer file
+import heapq                   # Heapq - best-first KD-tree search
+import itertools               # Itertools - tie-breaker for the search heap
+import math                    # Math - unit vectors & great-circle distances
+import os                      # OS - to read configuration from environment variables
+import re                      # Regex - reading "City, ST 12345" from an address
+import threading               # Threading - the index is shared by all sessions
+import time                    # Time - lookup timing for the command line
+from collections import Counter
+from datetime import datetime
+
+import database
+from database import get_connection, get_writer
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+GAZETTEER_PATH = os.environ.get("FOOD_APP_GAZETTEER",
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.csv"))
+
+# Seconds between two incremental refreshes in the background
+GEO_REFRESH_INTERVAL = float(os.environ.get("FOOD_APP_GEO_REFRESH_INTERVAL", "60"))
+
+EARTH_RADIUS_KM = 6371.0
+
+# Last line of a US address: "Port Jesus, IA 61188" (military "FPO AE 12345" has no comma)
+_ADDRESS_LINE = re.compile(r"^(?P<city>[^,]+),\s*(?P<state>[A-Z]{2})\s+\d{5}(?:-\d{4})?$")
+
+_CHANGED_PROVIDERS_SQL = """
+    SELECT p.Provider_ID, p.Address FROM providers p
+    LEFT JOIN geocodes g ON g.kind = 'provider' AND g.id = p.Provider_ID
+    WHERE g.id IS NULL OR g.source IS NOT p.Address
+"""
+_CHANGED_RECEIVERS_SQL = """
+    SELECT r.Receiver_ID, r.City FROM receivers r
+    LEFT JOIN geocodes g ON g.kind = 'receiver' AND g.id = r.Receiver_ID
+    WHERE g.id IS NULL OR g.source IS NOT r.City
+"""
+
+
+def parse_address(address):
+    """(city, state) from the last line of an address, or None."""
+    if not address:
+        return None
+    match = _ADDRESS_LINE.match(address.strip().splitlines()[-1].strip())
+    return (match["city"].strip(), match["state"]) if match else None
+
+
+# ------------------------------
+# GAZETTEER
+# ------------------------------
+class Gazetteer:
+    """Place -> coordinates, read from a CSV with columns state, city, latitude, longitude."""
+
+    def __init__(self, path=GAZETTEER_PATH):
+        self.places = {}       # (state, lower-case city or "") -> (latitude, longitude)
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                key = (row["state"].strip().upper(), (row.get("city") or "").strip().lower())
+                self.places[key] = (float(row["latitude"]), float(row["longitude"]))
+
+    def locate(self, city, state):
+        """(latitude, longitude, precision) of the most precise match, or None."""
+        if not state:
+            return None
+        if city and (state, city.lower()) in self.places:
+            return self.places[(state, city.lower())] + ("city",)
+        if (state, "") in self.places:
+            return self.places[(state, "")] + ("state",)
+        return None
+
+
+# ------------------------------
+# KD-TREE
+# ------------------------------
+def _unit_vector(latitude, longitude):
+    """Point on the unit sphere: straight-line distance grows with great-circle distance."""
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def _chord_to_km(squared_chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(squared_chord) / 2))
+
+
+class KDTree:
+    """3-d tree over unit vectors; nearest() yields points closest first."""
+
+    def __init__(self, points):
+        self.points = points
+        self.root = self._build(list(range(len(points))), 0)
+
+    def _build(self, indices, depth):
+        if not indices:
+            return None
+        axis = depth % 3
+        indices.sort(key=lambda i: self.points[i][axis])
+        mid = len(indices) // 2
+        return (indices[mid], axis, self._build(indices[:mid], depth + 1), self._build(indices[mid + 1:], depth + 1))
+
+    def nearest(self, query):
+        """
+        Yield (squared distance, point index) in increasing distance.
+
+        Best-first search: subtrees wait in the heap under a lower bound of
+        their distance, so a point is only yielded once nothing unvisited
+        can be closer - the caller stops as soon as it has enough.
+        """
+        tie = itertools.count()
+        heap = [(0.0, next(tie), False, self.root)] if self.root is not None else []
+        while heap:
+            distance, _, is_point, item = heapq.heappop(heap)
+            if is_point:
+                yield distance, item
+                continue
+            index, axis, left, right = item
+            point = self.points[index]
+            heapq.heappush(heap, (sum((q - p) ** 2 for q, p in zip(query, point)), next(tie), True, index))
+            diff = query[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            if near is not None:
+                heapq.heappush(heap, (distance, next(tie), False, near))
+            if far is not None:
+                heapq.heappush(heap, (max(distance, diff * diff), next(tie), False, far))
+
+
+# ------------------------------
+# NEAREST-RECEIVER INDEX
+# ------------------------------
+class GeoIndex:
+    """
+    Provider coordinates plus every located receiver, grouped by location.
+
+    Many receivers share a location (a state or city centroid), so the
+    KD-tree holds the distinct locations only and each location keeps a
+    sorted list of its Receiver_IDs. A new receiver at a known location is
+    a bisect.insort; only a new location rebuilds the (small) tree.
+    """
+
+    def __init__(self, gazetteer_path=GAZETTEER_PATH):
+        self._gazetteer_path = gazetteer_path
+        self._gazetteer = None
+        self._providers = {}     # Provider_ID -> (latitude, longitude, precision)
+        self._receivers = {}     # Receiver_ID -> location index
+        self._locations = []     # (latitude, longitude) of each location
+        self._location_ids = {}  # (latitude, longitude) -> location index
+        self._at_location = []   # location index -> sorted list of Receiver_IDs
+        self._tree = None        # Rebuilt lazily after a new location appears
+        self._lock = threading.Lock()
+        self.built_at = None     # Time of the last full load
+        self.refreshed_at = None
+
+    @property
+    def gazetteer(self):
+        if self._gazetteer is None:
+            self._gazetteer = Gazetteer(self._gazetteer_path)
+        return self._gazetteer
+
+    # ---- geocoding (database cache) ----
+    def _geocode_changes(self):
+        """
+        Geocode providers / receivers that are new or whose text changed, store
+        them in the geocodes table and drop rows of deleted ones.
+
+        Returns:
+        -------
+        (list of geocodes rows written, list of (kind, id) deleted)
+        """
+        with get_connection() as conn:
+            providers = conn.execute(_CHANGED_PROVIDERS_SQL).fetchall()
+        rows = []
+        for provider_id, address in providers:
+            city, state = parse_address(address) or (None, None)
+            rows.append(("provider", provider_id, address, city, state) + (self.gazetteer.locate(city, state) or (None,) * 3))
+
+        def store_providers(conn):
+            conn.executemany("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            # A receiver's City is placed in the state most provider addresses in that city are in
+            counts = Counter()
+            for city, state, n in conn.execute("SELECT city, state, COUNT(*) FROM geocodes WHERE kind = 'provider' "
+                                               "AND state IS NOT NULL GROUP BY city, state"):
+                counts[(city.lower(), state)] = n
+            receivers = conn.execute(_CHANGED_RECEIVERS_SQL).fetchall()
+            if rows:  # New provider addresses may place receivers that could not be located before
+                receivers += conn.execute("SELECT r.Receiver_ID, r.City FROM receivers r JOIN geocodes g "
+                                          "ON g.kind = 'receiver' AND g.id = r.Receiver_ID "
+                                          "WHERE g.latitude IS NULL AND g.source IS r.City").fetchall()
+            return counts, receivers
+
+        counts, receivers = get_writer().submit(store_providers, tables=["geocodes"])
+        city_states = {}
+        for (city, state), n in counts.most_common():
+            city_states.setdefault(city, state)
+        for receiver_id, city in receivers:
+            state = city_states.get(city.lower()) if city else None
+            rows.append(("receiver", receiver_id, city, city, state) + (self.gazetteer.locate(city, state) or (None,) * 3))
+
+        def store_receivers(conn):
+            conn.executemany("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             [row for row in rows if row[0] == "receiver"])
+            deleted = conn.execute("""SELECT kind, id FROM geocodes g WHERE
+                (kind = 'provider' AND NOT EXISTS (SELECT 1 FROM providers WHERE Provider_ID = g.id)) OR
+                (kind = 'receiver' AND NOT EXISTS (SELECT 1 FROM receivers WHERE Receiver_ID = g.id))""").fetchall()
+            conn.executemany("DELETE FROM geocodes WHERE kind = ? AND id = ?", deleted)
+            return deleted
+
+        deleted = get_writer().submit(store_receivers, tables=["geocodes"])
+        return rows, deleted
+
+    # ---- in-memory index ----
+    def _place_receiver(self, receiver_id, latitude, longitude):
+        self._remove_receiver(receiver_id)
+        if latitude is None:
+            return
+        key = (latitude, longitude)
+        location = self._location_ids.get(key)
+        if location is None:
+            location = self._location_ids[key] = len(self._locations)
+            self._locations.append(key)
+            self._at_location.append([])
+            self._tree = None
+        bisect.insort(self._at_location[location], receiver_id)
+        self._receivers[receiver_id] = location
+
+    def _remove_receiver(self, receiver_id):
+        location = self._receivers.pop(receiver_id, None)
+        if location is not None:
+            ids = self._at_location[location]
+            del ids[bisect.bisect_left(ids, receiver_id)]
+
+    def _apply(self, rows, deleted=()):
+        with self._lock:
+            for kind, row_id, _source, _city, _state, latitude, longitude, precision in rows:
+                if kind == "receiver":
+                    self._place_receiver(row_id, latitude, longitude)
+                elif latitude is None:
+                    self._providers.pop(row_id, None)
+                else:
+                    self._providers[row_id] = (latitude, longitude, precision)
+            for kind, row_id in deleted:
+                if kind == "receiver":
+                    self._remove_receiver(row_id)
+                else:
+                    self._providers.pop(row_id, None)
+
+    def rebuild(self):
+        """Geocode whatever is missing, then load every cached coordinate. Returns the rows loaded."""
+        self._geocode_changes()
+        with get_connection() as conn:
+            rows = conn.execute("SELECT * FROM geocodes WHERE latitude IS NOT NULL").fetchall()
+        with self._lock:
+            self._providers, self._receivers = {}, {}
+            self._locations, self._location_ids, self._at_location, self._tree = [], {}, [], None
+        self._apply(rows)
+        self.built_at = self.refreshed_at = datetime.now().isoformat(sep=" ", timespec="seconds")
+        return len(rows)
+
+    def refresh(self):
+        """Geocode new / changed rows and update the index with just those. Returns how many changed."""
+        if self.built_at is None:
+            return self.rebuild()
+        rows, deleted = self._geocode_changes()
+        self._apply(rows, deleted)
+        self.refreshed_at = datetime.now().isoformat(sep=" ", timespec="seconds")
+        return len(rows) + len(deleted)
+
+    def ensure_built(self):
+        if self.built_at is None:
+            self.rebuild()
+
+    # ---- queries ----
+    def provider_location(self, provider_id):
+        """(latitude, longitude, precision) of a provider, or None if it could not be located."""
+        self.ensure_built()
+        return self._providers.get(provider_id)
+
+    def nearest(self, latitude, longitude, k=10, exclude=()):
+        """
+        The ``k`` receivers closest to a point.
+
+        Parameters:
+        ----------
+        latitude, longitude : float
+        k : int
+            Number of receivers to return.
+        exclude : collection of int
+            Receiver_IDs to skip (e.g. receivers without free slots).
+
+        Returns:
+        -------
+        list of (Receiver_ID, distance in km)
+            Closest first; receivers at the same location by Receiver_ID.
+        """
+        self.ensure_built()
+        with self._lock:
+            if self._tree is None:
+                self._tree = KDTree([_unit_vector(lat, lon) for lat, lon in self._locations])
+            tree, at_location = self._tree, self._at_location
+            found = []
+            for squared, location in tree.nearest(_unit_vector(latitude, longitude)):
+                km = _chord_to_km(squared)
+                for receiver_id in at_location[location]:
+                    if receiver_id not in exclude:
+                        found.append((receiver_id, km))
+                        if len(found) == k:
+                            return found
+            return found
+
+    def nearest_to_provider(self, provider_id, k=10, exclude=()):
+        """The ``k`` receivers closest to a provider ([] if the provider could not be located)."""
+        location = self.provider_location(provider_id)
+        return [] if location is None else self.nearest(location[0], location[1], k, exclude)
+
+    def unlocated_in_provider_city(self, provider_id, k=10, exclude=()):
+        """
+        Up to ``k`` receivers in the provider's City that have no coordinates
+        (the nearest-receiver search cannot see them), lowest Receiver_ID first.
+        """
+        with get_connection() as conn:
+            rows = conn.execute("""SELECT r.Receiver_ID FROM receivers r
+                                   WHERE r.City = (SELECT City FROM providers WHERE Provider_ID = ?)
+                                     AND NOT EXISTS (SELECT 1 FROM geocodes g WHERE g.kind = 'receiver'
+                                                     AND g.id = r.Receiver_ID AND g.latitude IS NOT NULL)
+                                   ORDER BY r.Receiver_ID""", (provider_id,)).fetchall()
+        exclude = set(exclude)
+        return [receiver_id for receiver_id, in rows if receiver_id not in exclude][:k]
+
+    def stats(self):
+        self.ensure_built()
+        with self._lock:
+            return {"providers": len(self._providers), "receivers": len(self._receivers),
+                    "locations": len(self._locations), "built_at": self.built_at,
+                    "refreshed_at": self.refreshed_at}
+
+
+# Shared by every session in the process (like the connection pool)
+geo_index = GeoIndex()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Geocode providers & receivers and find receivers near a provider")
+    parser.add_argument("--db", default=database.DB_PATH, help="Database to use")
+    parser.add_argument("--provider", type=int, help="Provider_ID to find the nearest receivers for")
+    parser.add_argument("-k", type=int, default=10, help="Number of receivers")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    started = time.perf_counter()
+    geo_index.rebuild()
+    stats = geo_index.stats()
+    print(f"{stats['providers']:,} providers and {stats['receivers']:,} receivers located at "
+          f"{stats['locations']:,} places in {time.perf_counter() - started:.2f}s")
+    if args.provider is not None:
+        started = time.perf_counter()
+        nearest = geo_index.nearest_to_provider(args.provider, args.k)
+        elapsed = time.perf_counter() - started
+        for receiver_id, km in nearest:
+            print(f"  Receiver {receiver_id:>8}  {km:8.1f} km")
+        print(f"Lookup took {elapsed * 1e6:.0f} µs")
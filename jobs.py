@@ -0,0 +1,222 @@
+# ============================================================
+# 🧵 Background Query Jobs
+# ------------------------------------------------------------
+# Runs slow Analysis queries on a worker pool instead of the
+# Streamlit script thread, so the page stays responsive.
+# Features:
+# ✅ Each query gets a job id; its status & rows fetched can be polled
+# ✅ Cancel stops SQLite mid-statement (Connection.interrupt)
+# ✅ All of a session's jobs can be cancelled at once (navigation)
+# ✅ Read-only, time-limited connections (database.readonly_connection)
+# ✅ Optionally on the DuckDB engine (analytics.py), falling back to SQLite
+# ✅ Finished jobs are forgotten after JOB_RESULT_TTL seconds
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import os                      # OS - to read configuration from environment variables
+import sqlite3                 # SQLite - to recognise interrupted statements
+import threading               # Threading - locks & cancel flags
+import time                    # Time - elapsed times & result expiry
+import uuid                    # UUID - job ids
+from concurrent.futures import ThreadPoolExecutor
+
+from analytics import analytics_engine, AnalyticsUnsupported, SQLITE, DUCKDB
+from database import readonly_connection, fetch_limited, CUSTOM_QUERY_TIMEOUT, CUSTOM_QUERY_MAX_ROWS
+from metrics import query_metrics
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+# Worker threads running queries (shared by all sessions)
+JOB_WORKERS = int(os.environ.get("FOOD_APP_JOB_WORKERS", "4"))
+
+# Seconds a finished job's result is kept for the page to pick up
+JOB_RESULT_TTL = float(os.environ.get("FOOD_APP_JOB_RESULT_TTL", "600"))
+
+# Time budget for predefined Analysis queries run as jobs (they do not block the page)
+ANALYSIS_JOB_TIMEOUT = float(os.environ.get("FOOD_APP_ANALYSIS_JOB_TIMEOUT", "120"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueryJob:
+    """One submitted query: its state, progress and (when done) its result."""
+
+    def __init__(self, title, sql, params, owner, timeout, max_rows, engine=SQLITE):
+        self.id = uuid.uuid4().hex[:12]
+        self.title = title
+        self.sql = sql
+        self.params = params
+        self.owner = owner          # Streamlit session that submitted it
+        self.page = query_metrics.current_page()  # Metrics are recorded against the submitting page
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.engine = engine        # Engine asked for
+        self.fallback = None        # Why DuckDB handed the query to SQLite (then ran_on is "sqlite")
+        self.status = QUEUED
+        self.rows = 0               # Rows fetched so far (progress)
+        self.result = None          # DataFrame (SQLite) or pyarrow.Table (DuckDB) once DONE
+        self.truncated = False
+        self.error = None           # Exception once FAILED
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._conn = None           # SQLite connection or DuckDB cursor, for interrupt()
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()  # Guards _conn against interrupt() after close
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    @property
+    def ran_on(self):
+        """Engine that ran (or runs) the query."""
+        return SQLITE if self.fallback is not None else self.engine
+
+    @property
+    def elapsed(self):
+        """Seconds spent running (so far)."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def cancel(self):
+        """Ask the job to stop; a running statement is interrupted at once."""
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self.status, self.finished_at = CANCELLED, time.monotonic()
+            return
+        with self._lock:
+            if self._conn is not None:
+                self._conn.interrupt()
+
+    def _check_cancelled(self, rows):
+        self.rows = rows
+        if self._cancel.is_set():
+            raise sqlite3.OperationalError("interrupted")
+
+    def _set_conn(self, conn):
+        with self._lock:
+            self._conn = conn
+
+    def _run_sqlite(self):
+        with readonly_connection(self.timeout) as conn:
+            self._set_conn(conn)
+            try:
+                self._check_cancelled(0)
+                self.status, self.started_at = RUNNING, time.monotonic()
+                cursor = conn.execute(self.sql, self.params)
+                self.result, self.truncated = fetch_limited(cursor, self.max_rows, self._check_cancelled)
+            finally:
+                self._set_conn(None)
+        with query_metrics.page(self.page):
+            query_metrics.record(self.sql, self.elapsed, len(self.result),
+                                 int(self.result.memory_usage(deep=True).sum()), source="job")
+
+    def _run_duckdb(self):
+        self._check_cancelled(0)
+        self.status, self.started_at = RUNNING, time.monotonic()
+        with query_metrics.page(self.page):
+            self.result, self.truncated = analytics_engine.run(self.sql, self.params, self.timeout, self.max_rows,
+                                                               self._set_conn, self._check_cancelled)
+
+    def run(self):
+        try:
+            if self.engine == DUCKDB:
+                try:
+                    self._run_duckdb()
+                except AnalyticsUnsupported as exc:
+                    self.fallback = str(exc)
+            if self.ran_on == SQLITE:
+                self._run_sqlite()
+            self.rows = len(self.result)
+            self.status = DONE
+        except sqlite3.OperationalError as exc:
+            if self._cancel.is_set() and "interrupted" in str(exc):
+                self.status = CANCELLED
+            else:
+                self.status, self.error = FAILED, exc
+        except Exception as exc:  # Reported to the page instead of killing the worker
+            self.status, self.error = FAILED, exc
+        finally:
+            self.finished_at = time.monotonic()
+
+
+# ------------------------------
+# JOB MANAGER
+# ------------------------------
+class JobManager:
+    """Worker pool plus the registry of submitted jobs."""
+
+    def __init__(self, workers=JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, title, sql, params=(), owner=None, timeout=CUSTOM_QUERY_TIMEOUT,
+               max_rows=CUSTOM_QUERY_MAX_ROWS, engine=SQLITE):
+        """
+        Queue a read-only query and return its QueryJob straight away.
+
+        Parameters:
+        ----------
+        title : str
+            Shown in the UI (query name or "Custom SQL").
+        sql, params :
+            The statement and its parameters.
+        owner : str or None
+            Session id, for cancel_owner().
+        timeout : float
+            Wall-clock budget (the query fails with QueryTimeout after it).
+        max_rows : int
+            Rows kept at most (the result is marked truncated beyond that).
+        engine : str
+            "sqlite" or "duckdb" (see analytics.py; queries DuckDB cannot
+            run fall back to SQLite).
+        """
+        self._purge()
+        job = QueryJob(title, sql, params, owner, timeout, max_rows, engine)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(job.run)
+        return job
+
+    def get(self, job_id):
+        """The job with this id, or None once it has expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel()
+            return True
+        return False
+
+    def cancel_owner(self, owner):
+        """Cancel every unfinished job of a session. Returns how many were cancelled."""
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if j.owner == owner and not j.finished]
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def jobs(self, owner=None):
+        with self._lock:
+            return [j for j in self._jobs.values() if owner is None or j.owner == owner]
+
+    def _purge(self):
+        """Forget finished jobs whose result nobody collected in time."""
+        cutoff = time.monotonic() - JOB_RESULT_TTL
+        with self._lock:
+            for job_id in [i for i, j in self._jobs.items() if j.finished and j.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+
+# Shared by every session in the process (like the connection pool)
+query_jobs = JobManager()
@@ -0,0 +1,287 @@
+# ============================================================
+# 👥 Concurrent-Session Load Test
+# ------------------------------------------------------------
+# Runs N headless sessions of app.py at once (Streamlit's
+# AppTest) against the same database and replays scripted
+# navigation and CRUD forms.
+#
+# AppTest swaps process-wide Streamlit state (the runtime,
+# config options) on every run, so two AppTests cannot run in
+# one process at the same time. Each simulated user therefore
+# gets its own worker process: the sessions share the database
+# file (and its locks) but not the in-memory pool and caches.
+# Reports, for each number of users:
+# ✅ p50 / p95 / p99 rerun latency per page & action
+# ✅ Throughput (reruns per second)
+# ✅ Errors, with "database is locked" / pool timeouts counted apart
+#
+# Command line (CRUD steps add rows - use a copy or a generated database):
+#   python generate_data.py --rows 100000 -o load.db
+#   python load_test.py --db load.db --users 1,4,16,32 --duration 30
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import json                    # JSON - results file
+import multiprocessing         # Multiprocessing - one worker process per simulated user
+import os                      # OS - absolute paths for AppTest
+import random                  # Random - each user follows its own (seeded) script
+import time                    # Time - rerun latency & test duration
+from datetime import date, timedelta
+
+import database
+from metrics import LatencyHistogram
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+RERUN_TIMEOUT = 120            # Seconds before AppTest gives up on one rerun
+
+# Error messages that mean sessions were waiting on each other
+LOCK_ERROR_MARKERS = ("database is locked", "database table is locked", "No database connection available")
+
+# What a simulated user does next, with relative weights
+ACTIONS = [
+    ("home", 10),
+    ("browse", 30),             # One of the four browse pages
+    ("browse_next", 10),        # ... then its "Next" button
+    ("expiring", 10),
+    ("analysis", 15),           # A random predefined query
+    ("add_listing", 8),
+    ("add_claim", 10),
+    ("update_claim", 7),
+]
+
+BROWSE_PAGES = {"📦 Providers": "providers", "🎯 Receivers": "receivers",
+                "🍛 Food Listings": "food_listings", "📋 Claims": "claims"}
+
+
+# ------------------------------
+# RESULTS
+# ------------------------------
+class LoadResults:
+    """Latency histograms and error counts per step (one per worker, then merged)."""
+
+    def __init__(self):
+        self.histograms = {}   # step -> LatencyHistogram (µs)
+        self.errors = {}       # step -> count
+        self.lock_errors = {}  # step -> count
+        self.samples = []      # First few error messages, for the report
+
+    def record(self, step, seconds, error=None):
+        self.histograms.setdefault(step, LatencyHistogram()).record(seconds * 1e6)
+        if error is not None:
+            is_lock = any(marker in error for marker in LOCK_ERROR_MARKERS)
+            target = self.lock_errors if is_lock else self.errors
+            target[step] = target.get(step, 0) + 1
+            if len(self.samples) < 10:
+                self.samples.append(f"{step}: {error[:200]}")
+
+    def merge(self, other):
+        for step, histogram in other.histograms.items():
+            self.histograms.setdefault(step, LatencyHistogram()).merge(histogram)
+        for mine, theirs in ((self.errors, other.errors), (self.lock_errors, other.lock_errors)):
+            for step, n in theirs.items():
+                mine[step] = mine.get(step, 0) + n
+        self.samples += other.samples[:max(10 - len(self.samples), 0)]
+
+    def report(self, users, seconds):
+        """Summary dict for one load level."""
+        ms = lambda us: None if us is None else round(us / 1000, 2)
+        steps = {}
+        total = LatencyHistogram()
+        for step, histogram in sorted(self.histograms.items()):
+            if step != "startup":  # Startup happens before the measured period
+                total.merge(histogram)
+            steps[step] = {"reruns": histogram.count, "p50_ms": ms(histogram.percentile(50)),
+                           "p95_ms": ms(histogram.percentile(95)), "p99_ms": ms(histogram.percentile(99)),
+                           "max_ms": ms(histogram.max), "errors": self.errors.get(step, 0),
+                           "lock_errors": self.lock_errors.get(step, 0)}
+        return {"users": users, "seconds": round(seconds, 2), "reruns": total.count,
+                "reruns_per_sec": round(total.count / seconds, 2) if seconds else 0.0,
+                "p50_ms": ms(total.percentile(50)), "p95_ms": ms(total.percentile(95)),
+                "p99_ms": ms(total.percentile(99)),
+                "errors": sum(self.errors.values()), "lock_errors": sum(self.lock_errors.values()),
+                "error_samples": self.samples, "steps": steps}
+
+
+# ------------------------------
+# SIMULATED USER
+# ------------------------------
+def _widget(elements, label):
+    """The widget with this label (AppTest looks widgets up by index or key only)."""
+    for widget in elements:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"Widget {label!r} is not on the page")
+
+
+class SimulatedUser:
+    """One headless session that keeps performing random scripted steps."""
+
+    def __init__(self, user_id, seed, results, id_ranges):
+        from streamlit.testing.v1 import AppTest  # Only needed when the load test runs
+        self.at = AppTest.from_file(APP_PATH, default_timeout=RERUN_TIMEOUT)
+        self.rng = random.Random(f"{seed}-{user_id}")
+        self.results = results
+        self.id_ranges = id_ranges
+        self.page = None
+
+    def _timed(self, step, rerun):
+        """Run one rerun, record its latency and any error the page shows."""
+        started = time.perf_counter()
+        error = None
+        try:
+            rerun()
+        except Exception as exc:  # Timeouts and AppTest failures count as errors too
+            error = repr(exc)
+        elapsed = time.perf_counter() - started
+        if error is None and len(self.at.exception):
+            error = self.at.exception[0].message
+        if error is None and len(self.at.error):
+            error = str(self.at.error[0].value)
+        self.results.record(step, elapsed, error)
+
+    def navigate(self, page):
+        self._timed(page, lambda: self.at.sidebar.selectbox[0].select(page).run())
+        self.page = page
+
+    def step(self):
+        action = self.rng.choices([a for a, _ in ACTIONS], weights=[w for _, w in ACTIONS])[0]
+        if action == "home":
+            self.navigate("🏠 Home")
+        elif action == "browse" or (action == "browse_next" and self.page not in BROWSE_PAGES):
+            self.navigate(self.rng.choice(list(BROWSE_PAGES)))
+        elif action == "browse_next":
+            button = self.at.button(key=f"next_{BROWSE_PAGES[self.page]}")
+            if not button.disabled:
+                self._timed(f"{self.page} · Next", lambda: button.click().run())
+        elif action == "expiring":
+            self.navigate("⏰ Expiring Soon")
+        elif action == "analysis":
+            if self.page != "📊 Analysis":
+                self.navigate("📊 Analysis")
+            select = _widget(self.at.selectbox, "Select a Predefined Query")
+            query = self.rng.choice(select.options)
+            self._timed("📊 Analysis · query", lambda: select.select(query).run())
+        else:
+            self.crud(action)
+
+    def crud(self, action):
+        if self.page != "✏️ CRUD Operations":
+            self.navigate("✏️ CRUD Operations")
+        operation = {"add_listing": "Add Food Listing", "add_claim": "Add Claim",
+                     "update_claim": "Update Claim Status"}[action]
+        radio = _widget(self.at.radio, "Select Operation")
+        if radio.value != operation:
+            self._timed("✏️ CRUD · choose form", lambda: radio.set_value(operation).run())
+
+        pick = lambda table: self.rng.randint(*self.id_ranges[table])
+        if action == "add_listing":
+            _widget(self.at.number_input, "Provider ID").set_value(pick("providers"))
+            _widget(self.at.text_input, "Food Name").set_value("Load Test Bread")
+            _widget(self.at.text_input, "Location").set_value("Load Test City")
+            _widget(self.at.date_input, "Expiry Date").set_value(date.today() + timedelta(days=3))
+            button = "Add Listing"
+        elif action == "add_claim":
+            _widget(self.at.number_input, "Food ID").set_value(pick("food_listings"))
+            _widget(self.at.number_input, "Receiver ID").set_value(pick("receivers"))
+            button = "Add Claim"
+        else:
+            _widget(self.at.number_input, "Claim ID").set_value(pick("claims"))
+            _widget(self.at.selectbox, "New Status").set_value(self.rng.choice(["Pending", "Completed", "Cancelled"]))
+            button = "Update Status"
+        submit = _widget(self.at.button, button)
+        self._timed(f"✏️ {operation}", lambda: submit.click().run())
+
+    def start(self):
+        self._timed("startup", self.at.run)
+        self.page = "🏠 Home"
+
+    def run(self, stop_at):
+        while time.monotonic() < stop_at:
+            try:
+                self.step()
+            except LookupError as exc:  # The page did not render as expected
+                self.results.record("script", 0.0, repr(exc))
+                self.navigate("🏠 Home")
+
+
+# ------------------------------
+# LOAD LEVELS
+# ------------------------------
+def _id_ranges():
+    ranges = {}
+    for table, (id_col, _filters) in database.BROWSE_TABLES.items():
+        row = database.read_dataframe(f"SELECT MIN({id_col}) AS lo, MAX({id_col}) AS hi FROM {table}", cache=False)
+        ranges[table] = (int(row["lo"][0] or 1), int(row["hi"][0] or 1))
+    return ranges
+
+
+def _user_process(user_id, seed, db_path, duration, id_ranges, ready, results_queue):
+    """Worker process: start one session, wait for the others, then run for ``duration`` seconds."""
+    database.DB_PATH = db_path
+    results = LoadResults()
+    user = SimulatedUser(user_id, seed, results, id_ranges)
+    try:
+        user.start()
+        ready.wait()  # Every session is up: the measured period starts together
+        user.run(time.monotonic() + duration)
+    finally:
+        results_queue.put(results)
+
+
+def run_level(users, duration, seed=0):
+    """Run ``users`` concurrent sessions for ``duration`` seconds; return the report dict."""
+    id_ranges = _id_ranges()
+    context = multiprocessing.get_context("spawn")  # Clean processes (no inherited threads)
+    ready = context.Barrier(users + 1)
+    results_queue = context.Queue()
+    workers = [context.Process(target=_user_process, daemon=True,
+                               args=(i, seed, database.DB_PATH, duration, id_ranges, ready, results_queue))
+               for i in range(users)]
+    for worker in workers:
+        worker.start()
+    ready.wait(timeout=RERUN_TIMEOUT + 60)
+    started = time.perf_counter()
+
+    results = LoadResults()
+    for _ in workers:
+        results.merge(results_queue.get(timeout=duration + RERUN_TIMEOUT + 60))
+    elapsed = time.perf_counter() - started
+    for worker in workers:
+        worker.join()
+    return results.report(users, elapsed)
+
+
+def print_report(report):
+    print(f"\n👥 {report['users']} users · {report['reruns']} reruns in {report['seconds']}s "
+          f"({report['reruns_per_sec']}/s) · p50 {report['p50_ms']} ms · p95 {report['p95_ms']} ms · "
+          f"p99 {report['p99_ms']} ms · {report['errors']} errors · {report['lock_errors']} lock errors")
+    for step, s in report["steps"].items():
+        print(f"   {step:<32} {s['reruns']:>6} reruns  p50 {s['p50_ms']:>9} ms  p95 {s['p95_ms']:>9} ms  "
+              f"p99 {s['p99_ms']:>9} ms  errors {s['errors']} / locked {s['lock_errors']}")
+    for sample in report["error_samples"]:
+        print(f"   ! {sample}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test app.py with concurrent headless sessions")
+    parser.add_argument("--db", default=database.DB_PATH, help="Database to use (CRUD steps write to it)")
+    parser.add_argument("--users", default="1,2,4,8", help="Comma-separated numbers of concurrent users")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per load level")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the users' random scripts")
+    parser.add_argument("-o", "--output", help="Write all reports as JSON to this file")
+    args = parser.parse_args()
+
+    database.DB_PATH = os.path.abspath(args.db)  # Passed on to every worker process
+    reports = []
+    for users in [int(n) for n in args.users.split(",")]:
+        reports.append(run_level(users, args.duration, args.seed))
+        print_report(reports[-1])
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
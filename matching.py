@@ -0,0 +1,345 @@
+# ============================================================
+# 🤝 Receiver–Listing Matching Engine
+# ------------------------------------------------------------
+# Proposes who should claim which food listing with food left, so
+# nothing has to be typed into "Add Claim" by Food_ID.
+# Features:
+# ✅ Globally optimal allocation per city (min-cost flow)
+# ✅ Food that spoils first and large quantities are matched first
+# ✅ Portion size suited to the receiver type (Individual ... Shelter)
+# ✅ Receivers' open (Pending) claims use up their daily slots
+# ✅ Proposals are bulk-accepted as Pending claims
+#
+# Receivers in the same city and of the same Type cost the same
+# for every listing, so instead of a listings x receivers matrix
+# the flow runs over listings x receiver types (a handful of
+# nodes) - a city's tens of thousands of listings solve in
+# seconds. Each type's listings are then spread round-robin over
+# its receivers.
+#
+# Command line:
+#   python matching.py --db food_1m.db --city "Lake Baker" --as-of 2025-03-20
+#   python matching.py --city "New Walkerview" --accept
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import heapq                   # Heapq - cheapest listing to move between receiver types
+import os                      # OS - to read configuration from environment variables
+import time                    # Time - solve time reported with the proposals
+from datetime import date, datetime, timedelta
+
+import numpy as np             # NumPy - vectorized cost matrix & slot assignment
+import pandas as pd            # Pandas - listings, receivers & proposals
+
+import database
+from database import read_dataframe, get_writer
+from dates import to_iso_timestamp
+from reservations import try_reserve
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+# Only listings expiring within this many days (from the "as of" date) are matched
+MATCH_HORIZON_DAYS = int(os.environ.get("FOOD_APP_MATCH_HORIZON_DAYS", "7"))
+
+# Per receiver Type: (typical quantity per claim, claims a receiver can take per day)
+RECEIVER_PROFILES = {
+    "Individual": (5, 1),
+    "Charity": (20, 3),
+    "NGO": (30, 5),
+    "Shelter": (40, 5),
+}
+DEFAULT_PROFILE = (20, 2)      # Receiver types not listed above
+
+# How much a portion-size mismatch discounts a match (per unit of |log ratio|)
+FIT_WEIGHT = 0.1
+
+_LISTINGS_SQL = """
+    SELECT f.Food_ID, f.Food_Name, f.Food_Type, f.Quantity, f.Location, f.Expiry_Date
+    FROM food_listings f
+    WHERE f.Quantity > 0
+      AND f.Expiry_Date BETWEEN ? AND ?
+"""
+
+_RECEIVERS_SQL = """
+    SELECT r.Receiver_ID, r.Name, r.Type, r.City,
+           (SELECT COUNT(*) FROM claims c
+            WHERE c.Receiver_ID = r.Receiver_ID AND c.Status = 'Pending') AS pending
+    FROM receivers r
+"""
+
+
+# ------------------------------
+# COST MODEL
+# ------------------------------
+def match_costs(quantity, days_left, receiver_types, horizon=MATCH_HORIZON_DAYS):
+    """
+    Cost of giving each listing to a receiver of each type (lower is better).
+
+    A match saves the listing's Quantity, weighted up the sooner it
+    expires (x1 at the horizon, x(horizon + 1) when it expires today), and
+    discounted a little when the quantity is far from what that receiver
+    type usually takes. Costs are negative (a match always beats letting
+    the food spoil); leaving a listing unmatched costs 0.
+
+    Parameters:
+    ----------
+    quantity, days_left : array-like of shape (n,)
+    receiver_types : list of str
+        One column per type.
+
+    Returns:
+    -------
+    numpy.ndarray of shape (n, len(receiver_types))
+    """
+    quantity = np.asarray(quantity, dtype=float)
+    urgency = (horizon + 1) / (np.asarray(days_left, dtype=float) + 1)
+    typical = np.array([RECEIVER_PROFILES.get(t, DEFAULT_PROFILE)[0] for t in receiver_types], dtype=float)
+    misfit = np.abs(np.log(quantity[:, None] / typical[None, :]))
+    return -quantity[:, None] * (urgency[:, None] - FIT_WEIGHT * np.minimum(misfit, 5.0))
+
+
+# ------------------------------
+# SOLVER
+# ------------------------------
+def solve_min_cost_flow(costs, capacity):
+    """
+    Optimal assignment of rows (listings) to capacitated columns (receiver
+    types); a row may also stay unassigned at cost 0.
+
+    Rows are added one at a time along the shortest augmenting path, which
+    keeps the assignment optimal after every row (successive shortest
+    paths). The residual graph only has one node per column plus
+    "unassigned": moving a row from column c to d costs the cheapest such
+    move, kept in one heap per (c, d). Bellman-Ford on those few nodes
+    finds the path; most rows go straight to their cheapest column.
+
+    Parameters:
+    ----------
+    costs : numpy.ndarray of shape (n, k)
+    capacity : array-like of shape (k,)
+        Rows each column can take.
+
+    Returns:
+    -------
+    numpy.ndarray of shape (n,)
+        Column of each row, or -1 if it is left unassigned.
+    """
+    n, k = costs.shape
+    unassigned = k                                   # Extra node: cost 0, no capacity limit
+    cost = np.hstack([costs, np.zeros((n, 1))]).tolist()
+    room = [int(c) for c in capacity] + [n]
+    where = [-1] * n
+    heaps = [[[] for _ in range(k + 1)] for _ in range(k + 1)]  # heaps[c][d]: (move cost, row) for rows in c
+
+    def place(row, column):
+        where[row] = column
+        room[column] -= 1
+        row_cost = cost[row]
+        for d in range(k + 1):
+            if d != column:
+                heapq.heappush(heaps[column][d], (row_cost[d] - row_cost[column], row))
+
+    def cheapest_move(c, d):
+        heap = heaps[c][d]
+        while heap and where[heap[0][1]] != c:       # Stale: the row has moved since
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    for row in np.argsort(costs.min(axis=1), kind="stable").tolist():  # Most valuable first
+        row_cost = cost[row]
+        best = min(range(k + 1), key=row_cost.__getitem__)
+        if room[best] > 0:
+            place(row, best)  # Its cheapest column has room: no path can do better
+            continue
+
+        dist, via = list(row_cost), [None] * (k + 1)
+        for _ in range(k):
+            changed = False
+            for c in range(k + 1):
+                for d in range(k + 1):
+                    if c == d:
+                        continue
+                    move = cheapest_move(c, d)
+                    if move is not None and dist[c] + move[0] < dist[d] - 1e-9:
+                        dist[d], via[d], changed = dist[c] + move[0], (c, move[1]), True
+            if not changed:
+                break
+
+        target = min((d for d in range(k + 1) if room[d] > 0), key=dist.__getitem__)
+        while via[target] is not None:               # Shift rows along the path, last move first
+            source, moved = via[target]
+            room[source] += 1
+            place(moved, target)
+            target = source
+        place(row, target)
+
+    return np.array([-1 if w == unassigned else w for w in where])
+
+
+def _spread(slots, count):
+    """
+    Positions (in ``slots``) of the receivers taking ``count`` listings,
+    round-robin over their free slots: everyone gets a first listing
+    before anyone gets a second one.
+    """
+    owner = np.repeat(np.arange(len(slots)), slots)
+    turn = np.arange(len(owner)) - np.repeat(np.cumsum(slots) - slots, slots)  # 0, 1, ... per receiver
+    return owner[np.lexsort((owner, turn))][:count]
+
+
+# ------------------------------
+# PROPOSALS
+# ------------------------------
+def busy_receivers():
+    """Receiver_IDs whose Pending claims already fill the claims they can take per day."""
+    pending = read_dataframe("""SELECT r.Receiver_ID, r.Type, COUNT(*) AS pending
+                                FROM claims c JOIN receivers r ON r.Receiver_ID = c.Receiver_ID
+                                WHERE c.Status = 'Pending' GROUP BY r.Receiver_ID""")
+    daily = pending["Type"].astype(str).map(lambda t: RECEIVER_PROFILES.get(t, DEFAULT_PROFILE)[1])
+    return set(pending.loc[pending["pending"] >= daily, "Receiver_ID"].astype(int))
+
+
+def load_candidates(as_of=None, horizon=MATCH_HORIZON_DAYS, city=None):
+    """Listings with food left expiring within the horizon, and receivers with free slots."""
+    as_of = as_of or date.today()
+    until = as_of + timedelta(days=horizon)
+    params = [as_of.isoformat(), until.isoformat()]
+    listings_sql, receivers_sql = _LISTINGS_SQL, _RECEIVERS_SQL
+    if city is not None:
+        listings_sql += " AND f.Location = ?"
+        receivers_sql += " WHERE r.City = ?"
+    listings = read_dataframe(listings_sql, params + ([city] if city is not None else []), cache=False)
+    receivers = read_dataframe(receivers_sql, [city] if city is not None else [], cache=False)
+
+    daily = receivers["Type"].astype(str).map(lambda t: RECEIVER_PROFILES.get(t, DEFAULT_PROFILE)[1])
+    receivers["slots"] = (daily - receivers["pending"]).clip(lower=0).astype(int)
+    receivers = receivers[receivers["slots"] > 0]
+    listings["Days_Left"] = (pd.to_datetime(listings["Expiry_Date"]) - pd.Timestamp(as_of)).dt.days
+    return listings, receivers
+
+
+def propose_matches(as_of=None, horizon=MATCH_HORIZON_DAYS, city=None):
+    """
+    Propose an optimal allocation of what is left of the listings to
+    receivers in the same city.
+
+    Parameters:
+    ----------
+    as_of : datetime.date or None
+        Day the batch is for (default: today).
+    horizon : int
+        Only listings expiring within this many days are considered.
+    city : str or None
+        One city (listing Location = receiver City), or None for every city.
+
+    Returns:
+    -------
+    (pandas.DataFrame, dict)
+        One row per proposed claim, most urgent first, and statistics
+        (listings, receivers, matched, quantity, unmatched quantity, cities, seconds).
+    """
+    started = time.perf_counter()
+    listings, receivers = load_candidates(as_of, horizon, city)
+    # Work on positions & NumPy arrays: a pandas operation per city is too slow with thousands of cities
+    cities, city_codes = np.unique(np.concatenate([listings["Location"].astype(str).to_numpy(),
+                                                   receivers["City"].astype(str).to_numpy()]), return_inverse=True)
+    listing_city, receiver_city = city_codes[:len(listings)], city_codes[len(listings):]
+    types, receiver_type = np.unique(receivers["Type"].astype(str).to_numpy(), return_inverse=True)
+    slots = receivers["slots"].to_numpy()
+    quantity, days_left = listings["Quantity"].to_numpy(), listings["Days_Left"].to_numpy()
+
+    # Receivers grouped by city, then type, most free slots first
+    receiver_order = np.lexsort((-slots, receiver_type, receiver_city))
+    bounds = np.searchsorted(receiver_city[receiver_order], np.arange(len(cities) + 1))
+    listing_order = np.argsort(listing_city, kind="stable")
+    listing_bounds = np.searchsorted(listing_city[listing_order], np.arange(len(cities) + 1))
+
+    matched_listings, matched_receivers, scores = [], [], []
+    for code in range(len(cities)):
+        rows = listing_order[listing_bounds[code]:listing_bounds[code + 1]]
+        members = receiver_order[bounds[code]:bounds[code + 1]]
+        if not len(rows) or not len(members):
+            continue
+        city_types = np.unique(receiver_type[members])
+        capacity = np.array([slots[members][receiver_type[members] == t].sum() for t in city_types])
+        costs = match_costs(quantity[rows], days_left[rows], types[city_types], horizon)
+        assigned = solve_min_cost_flow(costs, capacity)
+
+        for column, type_code in enumerate(city_types):
+            chosen = np.flatnonzero(assigned == column)
+            if not len(chosen):
+                continue
+            chosen = chosen[np.argsort(days_left[rows[chosen]], kind="stable")]  # Most urgent to the emptiest receivers
+            of_type = members[receiver_type[members] == type_code]
+            matched_listings.append(rows[chosen])
+            matched_receivers.append(of_type[_spread(slots[of_type], len(chosen))])
+            scores.append(-costs[chosen, column])
+
+    picked = np.concatenate(matched_listings) if matched_listings else np.array([], dtype=int)
+    chosen = np.concatenate(matched_receivers) if matched_receivers else np.array([], dtype=int)
+    matches = listings.iloc[picked][["Food_ID", "Food_Name", "Food_Type", "Quantity", "Location",
+                                     "Expiry_Date", "Days_Left"]].reset_index(drop=True)
+    matches["Receiver_ID"] = receivers["Receiver_ID"].to_numpy()[chosen]
+    matches["Receiver_Name"] = receivers["Name"].to_numpy()[chosen]
+    matches["Receiver_Type"] = receivers["Type"].to_numpy()[chosen]
+    matches["Score"] = np.concatenate(scores).round(2) if scores else np.array([], dtype=float)
+    matches = matches.sort_values(["Days_Left", "Score"], ascending=[True, False], kind="stable", ignore_index=True)
+    matched_quantity = int(matches["Quantity"].sum())
+    stats = {"listings": len(listings), "receivers": len(receivers), "matched": len(matches),
+             "quantity": matched_quantity, "unmatched_quantity": int(listings["Quantity"].sum()) - matched_quantity,
+             "cities": int(matches["Location"].nunique()), "seconds": time.perf_counter() - started}
+    return matches, stats
+
+
+def accept_matches(pairs):
+    """
+    Record proposed matches as Pending claims, in one transaction.
+
+    Each claim takes what is left of its listing; a listing claimed in
+    full by someone else since the proposal was made is skipped rather
+    than claimed twice (see reservations.py).
+
+    Parameters:
+    ----------
+    pairs : iterable of (Food_ID, Receiver_ID)
+
+    Returns:
+    -------
+    list of int
+        Food_IDs that were claimed.
+    """
+    pairs = [(int(food_id), int(receiver_id)) for food_id, receiver_id in pairs]
+    timestamp = to_iso_timestamp(datetime.now())
+
+    def write(conn):
+        conn.execute("BEGIN IMMEDIATE")
+        return [food_id for food_id, receiver_id in pairs
+                if try_reserve(conn, food_id, receiver_id, "Pending", timestamp)["won"]]
+
+    return get_writer().submit(write, tables=["claims"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Propose (and optionally accept) receiver-listing matches")
+    parser.add_argument("--db", default=database.DB_PATH, help="Database to use")
+    parser.add_argument("--city", help="Only this city (default: every city)")
+    parser.add_argument("--as-of", type=date.fromisoformat, help="Day of the batch, YYYY-MM-DD (default: today)")
+    parser.add_argument("--horizon", type=int, default=MATCH_HORIZON_DAYS, help="Days ahead to consider")
+    parser.add_argument("-o", "--output", help="Write the proposals to this CSV file")
+    parser.add_argument("--accept", action="store_true", help="Record every proposal as a Pending claim")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    matches, stats = propose_matches(args.as_of, args.horizon, args.city)
+    print(f"{stats['matched']:,} of {stats['listings']:,} listings matched to {stats['receivers']:,} receivers "
+          f"in {stats['cities']:,} cities ({stats['quantity']:,} units, {stats['unmatched_quantity']:,} left) "
+          f"in {stats['seconds']:.2f}s")
+    if args.output:
+        matches.to_csv(args.output, index=False)
+    if args.accept:
+        claimed = accept_matches(zip(matches["Food_ID"], matches["Receiver_ID"]))
+        print(f"{len(claimed):,} claims recorded")
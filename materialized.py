@@ -0,0 +1,186 @@
+# ============================================================
+# 🧊 Materialized Views for the Predefined Analysis Queries
+# ------------------------------------------------------------
+# Each predefined query's result is stored in its own table
+# (mv_<query name>) and the Analysis page reads that table
+# instead of re-running the joins on every selection.
+# Features:
+# ✅ Triggers log every change to the base tables (mv_change_log)
+# ✅ Only views whose source tables changed are recomputed
+# ✅ Queries run on a read snapshot - writers are not blocked
+# ✅ "As of" timestamps & pending-change counts for the UI
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import os                      # OS - to read configuration from environment variables
+import re                      # Regex - to turn query titles into table names
+from datetime import datetime  # Datetime - refresh timestamps
+
+from database import get_connection, get_writer, read_dataframe, refresh_catalog, tables_in_sql
+from queries import PREDEFINED_QUERIES, LIVE_QUERIES
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+# Seconds between two background refreshes of out-of-date views
+MV_REFRESH_INTERVAL = float(os.environ.get("FOOD_DB_MV_REFRESH_INTERVAL", "30"))
+
+# Tables whose changes are recorded in mv_change_log by triggers
+BASE_TABLES = {"providers", "receivers", "food_listings", "claims"}
+
+
+def view_table(title):
+    """Name of the table holding a query's materialized result."""
+    return "mv_" + re.sub(r"\W+", "_", title.lower()).strip("_")
+
+
+def is_materialized(title):
+    """Live (time-dependent) queries are never materialized."""
+    return title in PREDEFINED_QUERIES and title not in LIVE_QUERIES
+
+
+def source_tables(title):
+    """Base tables a predefined query reads from."""
+    return sorted(tables_in_sql(PREDEFINED_QUERIES[title]) & BASE_TABLES)
+
+
+# ------------------------------
+# REFRESH
+# ------------------------------
+def _state(conn, title):
+    return conn.execute("SELECT last_seq FROM mv_state WHERE name = ?", (title,)).fetchone()
+
+
+def _changes_since(conn, tables, seq):
+    """Number of logged changes to ``tables`` after change number ``seq``."""
+    marks = ", ".join("?" for _ in tables)
+    return conn.execute(f"SELECT COUNT(*) FROM mv_change_log WHERE seq > ? AND table_name IN ({marks})",
+                        [seq] + list(tables)).fetchone()[0]
+
+
+def refresh_view(title, force=False):
+    """
+    Recompute one materialized view if any of its source tables changed.
+
+    The query runs on a pooled read connection inside a single read
+    transaction, so the result and the change-log position it reflects come
+    from the same snapshot. Only the final swap of the stored rows goes
+    through the write queue, so a slow join never holds the write lock.
+
+    Parameters:
+    ----------
+    title : str
+        Title of a predefined query (key of PREDEFINED_QUERIES).
+    force : bool
+        If True, recompute even when nothing changed.
+
+    Returns:
+    -------
+    bool
+        True if the view was recomputed.
+    """
+    sql = PREDEFINED_QUERIES[title]
+    tables = source_tables(title)
+
+    with get_connection() as conn:
+        conn.execute("BEGIN")  # One snapshot for the change-log position and the query
+        try:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'mv_change_log'").fetchone()
+            last_seq = row[0] if row else 0
+            state = _state(conn, title)
+            if state is not None and not force and _changes_since(conn, tables, state[0]) == 0:
+                return False
+            cursor = conn.execute(sql)
+            columns = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+        finally:
+            conn.rollback()
+
+    mv_table = view_table(title)
+    created = state is None
+
+    def store(wconn):
+        # Rebuilt from scratch so a changed query (new columns) just works;
+        # rowid keeps the query's ORDER BY.
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        wconn.execute(f'DROP TABLE IF EXISTS "{mv_table}"')
+        wconn.execute(f'CREATE TABLE "{mv_table}" ({column_list})')
+        wconn.executemany(f'INSERT INTO "{mv_table}" VALUES ({", ".join("?" for _ in columns)})', rows)
+        wconn.execute("""INSERT INTO mv_state (name, mv_table, last_seq, refreshed_at, row_count)
+                         VALUES (?, ?, ?, ?, ?)
+                         ON CONFLICT (name) DO UPDATE SET
+                             mv_table = excluded.mv_table, last_seq = excluded.last_seq,
+                             refreshed_at = excluded.refreshed_at, row_count = excluded.row_count""",
+                      (title, mv_table, last_seq, datetime.now().isoformat(sep=" ", timespec="seconds"), len(rows)))
+
+    get_writer().submit(store, tables=[mv_table, "mv_state"])
+    if created:
+        refresh_catalog()  # So the query cache knows about the new table
+    return True
+
+
+def refresh_stale_views():
+    """
+    Refresh every out-of-date view, then drop change-log rows that all views
+    have already seen. Runs periodically in the background (see app.py).
+
+    Returns:
+    -------
+    list of str
+        Titles of the views that were recomputed.
+    """
+    refreshed = [title for title in PREDEFINED_QUERIES if is_materialized(title) and refresh_view(title)]
+
+    # A change can be forgotten once every view reading that table has seen it
+    readers = {table: [t for t in PREDEFINED_QUERIES if is_materialized(t) and table in source_tables(t)]
+               for table in BASE_TABLES}
+
+    def prune(wconn):
+        seen = dict(wconn.execute("SELECT name, last_seq FROM mv_state").fetchall())
+        removed = 0
+        for table, titles in readers.items():
+            if all(title in seen for title in titles):
+                upto = min((seen[title] for title in titles), default=None)
+                removed += wconn.execute("DELETE FROM mv_change_log WHERE table_name = ? AND seq <= COALESCE(?, seq)",
+                                         (table, upto)).rowcount
+        return removed
+
+    get_writer().submit(prune, tables=["mv_change_log"])
+    return refreshed
+
+
+# ------------------------------
+# READING VIEWS
+# ------------------------------
+def has_view(title):
+    """True if the query's view has been computed (read_view will not have to run the query)."""
+    if not is_materialized(title):
+        return False
+    return not read_dataframe("SELECT 1 FROM mv_state WHERE name = ?", (title,)).empty
+
+
+def read_view(title):
+    """
+    Return (DataFrame, status) for a predefined query.
+
+    Materialized queries are read from their view table (computed on first
+    use). ``status`` is a dict with ``refreshed_at`` and ``pending_changes``,
+    or None for live queries, which are simply executed.
+    """
+    if not is_materialized(title):
+        return read_dataframe(PREDEFINED_QUERIES[title]), None
+
+    state = read_dataframe("SELECT mv_table, last_seq, refreshed_at FROM mv_state WHERE name = ?", (title,))
+    if state.empty:
+        refresh_view(title)
+        state = read_dataframe("SELECT mv_table, last_seq, refreshed_at FROM mv_state WHERE name = ?", (title,))
+
+    mv_table, last_seq, refreshed_at = state.iloc[0]
+    tables = source_tables(title)
+    marks = ", ".join("?" for _ in tables)
+    pending = read_dataframe(f"SELECT COUNT(*) AS n FROM mv_change_log WHERE seq > ? AND table_name IN ({marks})",
+                             [int(last_seq)] + tables)["n"][0]
+    df = read_dataframe(f'SELECT * FROM "{mv_table}" ORDER BY rowid')
+    return df, {"refreshed_at": refreshed_at, "pending_changes": int(pending)}
@@ -0,0 +1,275 @@
+# ============================================================
+# 📈 Query Instrumentation & Latency Histograms
+# ------------------------------------------------------------
+# Every statement run through database.read_dataframe() and
+# database.execute_write() is timed and recorded here, per
+# (page, statement). Used by the hidden "🩺 Diagnostics" page
+# and exported in Prometheus text format.
+# Features:
+# ✅ HDR-style log-linear histograms (~6% precision, any range)
+# ✅ Rows returned & DataFrame memory per statement
+# ✅ Calling page tracked per Streamlit session thread
+# ✅ Prometheus text export (download or periodic file write)
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import os                      # OS - configuration & atomic file replace
+import re                      # Regex - normalizing SQL into labels
+import threading               # Threading - per-session page & shared registry lock
+from contextlib import contextmanager
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+# Sub-buckets per power of two: 16 -> every bucket is at most ~6% wide
+HISTOGRAM_SUB_BUCKETS = 16
+
+# Distinct (page, statement) series kept; further ones are merged into "other"
+# so ad-hoc custom SQL cannot grow the registry without bound
+MAX_SERIES = int(os.environ.get("FOOD_APP_METRICS_MAX_SERIES", "500"))
+
+# If set, the Prometheus text export is written to this file every
+# METRICS_FILE_INTERVAL seconds (for a node_exporter-style textfile scraper)
+METRICS_FILE = os.environ.get("FOOD_APP_METRICS_FILE")
+METRICS_FILE_INTERVAL = float(os.environ.get("FOOD_APP_METRICS_FILE_INTERVAL", "15"))
+
+# Show the "🩺 Diagnostics" page to everyone (otherwise only with ?diagnostics=1 in the URL)
+DIAGNOSTICS_ENABLED = os.environ.get("FOOD_APP_DIAGNOSTICS", "0") == "1"
+
+# Histogram buckets (seconds) used in the Prometheus export
+PROMETHEUS_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Page recorded for statements not issued by a Streamlit script run
+BACKGROUND_PAGE = "background"
+
+
+# ------------------------------
+# HISTOGRAM
+# ------------------------------
+class LatencyHistogram:
+    """
+    Log-linear histogram of latencies in microseconds (HdrHistogram layout).
+
+    Values below HISTOGRAM_SUB_BUCKETS get one bucket each; above that every
+    power of two is split into HISTOGRAM_SUB_BUCKETS equal buckets, so the
+    relative error is bounded at any magnitude with only a few hundred
+    buckets. Counts are kept in a sparse dict.
+    """
+
+    def __init__(self, sub_buckets=HISTOGRAM_SUB_BUCKETS):
+        self.sub = sub_buckets
+        self._sub_bits = sub_buckets.bit_length()
+        self.counts = {}       # bucket index -> count
+        self.count = 0
+        self.total = 0         # Sum of all values (µs)
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value < self.sub:
+            return value
+        shift = value.bit_length() - self._sub_bits
+        return self.sub * (shift + 1) + (value >> shift) - self.sub
+
+    def bucket_bounds(self, index):
+        """(lowest, highest) value counted in a bucket."""
+        if index < self.sub:
+            return index, index
+        shift, offset = divmod(index - self.sub, self.sub)
+        mantissa = self.sub + offset
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, micros):
+        value = max(int(micros), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, pct):
+        """Value (µs) at or below which ``pct`` percent of recordings fall."""
+        if not self.count:
+            return None
+        target = max(1, -(-self.count * pct // 100))  # ceil
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self.bucket_bounds(index)[1], self.max)
+        return self.max
+
+    def cumulative(self, bounds_micros):
+        """Number of recordings <= each bound (for Prometheus ``le`` buckets)."""
+        ordered = sorted(self.counts.items())
+        result, seen, i = [], 0, 0
+        for bound in bounds_micros:
+            while i < len(ordered) and self.bucket_bounds(ordered[i][0])[1] <= bound:
+                seen += ordered[i][1]
+                i += 1
+            result.append(seen)
+        return result
+
+
+# ------------------------------
+# REGISTRY
+# ------------------------------
+class QueryMetrics:
+    """Latency histogram plus row / memory totals for each (page, statement)."""
+
+    def __init__(self):
+        self._series = {}      # (page, statement, source) -> dict
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # ---- calling page ----
+    def set_page(self, page):
+        """Record the current menu choice for statements run on this thread."""
+        self._local.page = page
+
+    @contextmanager
+    def page(self, page):
+        """Attribute statements run inside the block to ``page``."""
+        previous = getattr(self._local, "page", None)
+        self._local.page = page
+        try:
+            yield
+        finally:
+            self._local.page = previous
+
+    def current_page(self):
+        return getattr(self._local, "page", None) or BACKGROUND_PAGE
+
+    # ---- recording ----
+    def record(self, statement, seconds, rows=0, nbytes=0, source="db"):
+        """
+        Record one executed statement.
+
+        Parameters:
+        ----------
+        statement : str
+            SQL text (whitespace is normalized for the label).
+        seconds : float
+            Wall time.
+        rows : int
+            Rows returned (or changed, for writes).
+        nbytes : int
+            Memory of the resulting DataFrame (0 for writes & cache hits).
+        source : str
+            "db" (ran on SQLite), "cache" (served by the query cache), "write",
+            "custom" (Custom SQL on a guarded read-only connection), "job"
+            (Analysis query run in the background, see jobs.py) or "duckdb"
+            (Analysis query run on the DuckDB copy, see analytics.py).
+        """
+        key = (self.current_page(), normalize_sql(statement), source)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                if len(self._series) >= MAX_SERIES:
+                    key = (key[0], "other", source)
+                series = self._series.setdefault(
+                    key, {"histogram": LatencyHistogram(), "rows": 0, "bytes": 0, "max_bytes": 0})
+            series["histogram"].record(seconds * 1e6)
+            series["rows"] += rows
+            series["bytes"] += nbytes
+            series["max_bytes"] = max(series["max_bytes"], nbytes)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    # ---- reporting ----
+    def _copy(self):
+        with self._lock:
+            copied = {}
+            for key, series in self._series.items():
+                histogram = LatencyHistogram(series["histogram"].sub)
+                histogram.merge(series["histogram"])
+                copied[key] = dict(series, histogram=histogram)
+            return copied
+
+    @staticmethod
+    def _row(histogram, **fields):
+        ms = lambda us: None if us is None else us / 1000
+        return dict(fields, calls=histogram.count,
+                    p50_ms=ms(histogram.percentile(50)), p95_ms=ms(histogram.percentile(95)),
+                    p99_ms=ms(histogram.percentile(99)), max_ms=ms(histogram.max),
+                    total_ms=histogram.total / 1000)
+
+    def summary(self):
+        """One dict per (page, statement, source), slowest total time first."""
+        rows = []
+        for (page, statement, source), series in self._copy().items():
+            histogram = series["histogram"]
+            rows.append(self._row(histogram, page=page, statement=statement, source=source,
+                                  avg_rows=series["rows"] / histogram.count if histogram.count else 0,
+                                  total_mb=series["bytes"] / 2**20, max_mb=series["max_bytes"] / 2**20))
+        return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+    def page_summary(self):
+        """Latency over all statements issued while each page was rendering."""
+        pages = {}
+        for (page, _statement, _source), series in self._copy().items():
+            pages.setdefault(page, LatencyHistogram()).merge(series["histogram"])
+        rows = [self._row(histogram, page=page) for page, histogram in pages.items()]
+        return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+    def prometheus_text(self):
+        """All series in Prometheus text exposition format."""
+        bounds = [b * 1e6 for b in PROMETHEUS_BUCKETS]
+        lines = [
+            "# HELP food_app_query_duration_seconds Wall time of SQL statements issued by the app.",
+            "# TYPE food_app_query_duration_seconds histogram",
+        ]
+        totals = []
+        for (page, statement, source), series in sorted(self._copy().items()):
+            labels = f'page="{_escape(page)}",statement="{_escape(statement)}",source="{source}"'
+            histogram = series["histogram"]
+            for le, n in zip(PROMETHEUS_BUCKETS, histogram.cumulative(bounds)):
+                lines.append(f'food_app_query_duration_seconds_bucket{{{labels},le="{le}"}} {n}')
+            lines.append(f'food_app_query_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"food_app_query_duration_seconds_sum{{{labels}}} {histogram.total / 1e6:.6f}")
+            lines.append(f"food_app_query_duration_seconds_count{{{labels}}} {histogram.count}")
+            totals.append((labels, series))
+
+        lines += ["# HELP food_app_query_rows_total Rows returned (or changed) by SQL statements.",
+                  "# TYPE food_app_query_rows_total counter"]
+        lines += [f"food_app_query_rows_total{{{labels}}} {s['rows']}" for labels, s in totals]
+        lines += ["# HELP food_app_query_result_bytes_total Memory of DataFrames built from query results.",
+                  "# TYPE food_app_query_result_bytes_total counter"]
+        lines += [f"food_app_query_result_bytes_total{{{labels}}} {s['bytes']}" for labels, s in totals]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_file(self, path=None):
+        """Atomically (re)write the Prometheus text file. Returns the path."""
+        path = path or METRICS_FILE
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)  # The scraper never sees a half-written file
+        return path
+
+
+def normalize_sql(statement):
+    """Collapse whitespace so the same statement always gets the same label."""
+    return re.sub(r"\s+", " ", statement).strip()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Shared by every session in the process (like the connection pool)
+query_metrics = QueryMetrics()
@@ -0,0 +1,649 @@
+# ============================================================
+# 🧱 Schema Migrations for food_wastage.db
+# ------------------------------------------------------------
+# Versioned, in-order schema changes applied automatically when
+# the app starts (see database.bootstrap_database).
+# Features:
+# ✅ Each migration runs once, inside its own transaction
+# ✅ Applied versions are recorded in the schema_migrations table
+# ✅ Before/after EXPLAIN QUERY PLAN report for the analysis queries
+# ✅ Check that migrates a copy of a database from start to finish
+#
+# Run manually (prints the query-plan report):
+#   python migrations.py [--db food_wastage.db]
+# Check the migrations on a copy (the database itself is left alone):
+#   python migrations.py --db food_wastage.db --check
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import os                      # OS - temporary copy for --check
+import sqlite3                 # SQLite - lightweight relational database
+import tempfile                # Tempfile - directory holding the --check copy
+from datetime import datetime  # Datetime - to timestamp applied migrations
+
+from dates import to_iso_date, to_iso_timestamp
+from queries import PREDEFINED_QUERIES
+
+# ------------------------------
+# MIGRATION REGISTRY
+# ------------------------------
+MIGRATIONS = []  # List of (version, description, function(conn))
+
+
+def migration(version, description):
+    """Decorator that registers a migration function under a version number."""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+def execute_script(conn, script):
+    """
+    Execute several SQL statements without committing.
+
+    ``sqlite3.executescript`` always COMMITs first, which would break the
+    one-transaction-per-migration rule, so statements are run one by one.
+    """
+    statement = ""
+    for piece in script.split(";"):
+        statement += piece + ";"
+        # A trigger body contains ";" too - wait until the statement is complete
+        if sqlite3.complete_statement(statement):
+            if statement.strip(" \n;"):
+                conn.execute(statement)
+            statement = ""
+
+
+# ------------------------------
+# MIGRATIONS
+# ------------------------------
+@migration(1, "Primary keys, foreign keys and indexes")
+def add_keys_and_indexes(conn):
+    # The original tables were written by pandas.to_sql with no keys at all.
+    # SQLite cannot add a PRIMARY KEY to an existing table, so each table is
+    # rebuilt and its rows copied across.
+    execute_script(conn, """
+        CREATE TABLE providers_new (
+            Provider_ID INTEGER PRIMARY KEY,
+            Name TEXT,
+            Type TEXT,
+            Address TEXT,
+            City TEXT,
+            Contact TEXT
+        );
+        INSERT INTO providers_new (Provider_ID, Name, Type, Address, City, Contact)
+            SELECT Provider_ID, Name, Type, Address, City, Contact FROM providers;
+
+        CREATE TABLE receivers_new (
+            Receiver_ID INTEGER PRIMARY KEY,
+            Name TEXT,
+            Type TEXT,
+            City TEXT,
+            Contact TEXT
+        );
+        INSERT INTO receivers_new (Receiver_ID, Name, Type, City, Contact)
+            SELECT Receiver_ID, Name, Type, City, Contact FROM receivers;
+
+        CREATE TABLE food_listings_new (
+            Food_ID INTEGER PRIMARY KEY,
+            Food_Name TEXT,
+            Quantity INTEGER,
+            Expiry_Date TEXT,
+            Provider_ID INTEGER REFERENCES providers (Provider_ID),
+            Provider_Type TEXT,
+            Location TEXT,
+            Food_Type TEXT,
+            Meal_Type TEXT
+        );
+        INSERT INTO food_listings_new (Food_ID, Food_Name, Quantity, Expiry_Date, Provider_ID,
+                                       Provider_Type, Location, Food_Type, Meal_Type)
+            SELECT Food_ID, Food_Name, Quantity, Expiry_Date, Provider_ID,
+                   Provider_Type, Location, Food_Type, Meal_Type FROM food_listings;
+
+        -- Deleting a food listing also removes the claims made on it
+        CREATE TABLE claims_new (
+            Claim_ID INTEGER PRIMARY KEY,
+            Food_ID INTEGER REFERENCES food_listings (Food_ID) ON DELETE CASCADE,
+            Receiver_ID INTEGER REFERENCES receivers (Receiver_ID),
+            Status TEXT,
+            Timestamp TEXT
+        );
+        INSERT INTO claims_new (Claim_ID, Food_ID, Receiver_ID, Status, Timestamp)
+            SELECT Claim_ID, Food_ID, Receiver_ID, Status, Timestamp FROM claims;
+
+        DROP TABLE claims;
+        DROP TABLE food_listings;
+        DROP TABLE receivers;
+        DROP TABLE providers;
+        ALTER TABLE providers_new RENAME TO providers;
+        ALTER TABLE receivers_new RENAME TO receivers;
+        ALTER TABLE food_listings_new RENAME TO food_listings;
+        ALTER TABLE claims_new RENAME TO claims;
+
+        -- Join / filter columns used by the browse pages and analysis queries
+        CREATE INDEX idx_claims_food ON claims (Food_ID);
+        CREATE INDEX idx_claims_receiver_status ON claims (Receiver_ID, Status);
+        CREATE INDEX idx_food_listings_provider ON food_listings (Provider_ID);
+        CREATE INDEX idx_food_listings_location_meal ON food_listings (Location, Meal_Type);
+        CREATE INDEX idx_providers_city ON providers (City);
+
+        -- Give the query planner row counts for the new indexes
+        ANALYZE;
+    """)
+
+
+@migration(2, "Trigger-maintained dashboard counters")
+def add_dashboard_counters(conn):
+    # Row counts for the Home page metrics and the "Providers per City" chart,
+    # kept up to date by triggers so the dashboard never has to COUNT(*).
+    execute_script(conn, """
+        CREATE TABLE table_stats (
+            table_name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL
+        );
+        INSERT INTO table_stats (table_name, row_count)
+            SELECT 'providers', COUNT(*) FROM providers UNION ALL
+            SELECT 'receivers', COUNT(*) FROM receivers UNION ALL
+            SELECT 'food_listings', COUNT(*) FROM food_listings UNION ALL
+            SELECT 'claims', COUNT(*) FROM claims;
+
+        CREATE TABLE provider_city_counts (
+            City TEXT PRIMARY KEY,
+            provider_count INTEGER NOT NULL
+        );
+        INSERT INTO provider_city_counts (City, provider_count)
+            SELECT City, COUNT(*) FROM providers WHERE City IS NOT NULL GROUP BY City;
+    """)
+
+    for table in ("providers", "receivers", "food_listings", "claims"):
+        execute_script(conn, f"""
+            CREATE TRIGGER trg_{table}_count_insert AFTER INSERT ON {table} BEGIN
+                UPDATE table_stats SET row_count = row_count + 1 WHERE table_name = '{table}';
+            END;
+            CREATE TRIGGER trg_{table}_count_delete AFTER DELETE ON {table} BEGIN
+                UPDATE table_stats SET row_count = row_count - 1 WHERE table_name = '{table}';
+            END;
+        """)
+
+    execute_script(conn, """
+        CREATE TRIGGER trg_providers_city_insert AFTER INSERT ON providers
+        WHEN NEW.City IS NOT NULL BEGIN
+            INSERT INTO provider_city_counts (City, provider_count) VALUES (NEW.City, 1)
+                ON CONFLICT (City) DO UPDATE SET provider_count = provider_count + 1;
+        END;
+
+        CREATE TRIGGER trg_providers_city_delete AFTER DELETE ON providers
+        WHEN OLD.City IS NOT NULL BEGIN
+            UPDATE provider_city_counts SET provider_count = provider_count - 1 WHERE City = OLD.City;
+            DELETE FROM provider_city_counts WHERE City = OLD.City AND provider_count <= 0;
+        END;
+
+        CREATE TRIGGER trg_providers_city_update AFTER UPDATE OF City ON providers
+        WHEN OLD.City IS NOT NEW.City BEGIN
+            UPDATE provider_city_counts SET provider_count = provider_count - 1 WHERE City = OLD.City;
+            DELETE FROM provider_city_counts WHERE City = OLD.City AND provider_count <= 0;
+            INSERT INTO provider_city_counts (City, provider_count)
+                SELECT NEW.City, 1 WHERE NEW.City IS NOT NULL
+                ON CONFLICT (City) DO UPDATE SET provider_count = provider_count + 1;
+        END;
+
+        -- The Home page chart reads the cities in this order
+        CREATE INDEX idx_provider_city_counts_count ON provider_city_counts (provider_count DESC);
+    """)
+
+
+@migration(3, "Change log and state table for materialized views")
+def add_materialized_view_log(conn):
+    # Every insert/update/delete on the base tables appends one row here.
+    # materialized.py uses it to find out which views are out of date.
+    execute_script(conn, """
+        CREATE TABLE mv_change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            row_id INTEGER,
+            changed_at TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        CREATE INDEX idx_mv_change_log_table ON mv_change_log (table_name, seq);
+
+        CREATE TABLE mv_state (
+            name TEXT PRIMARY KEY,
+            mv_table TEXT NOT NULL,
+            last_seq INTEGER NOT NULL,
+            refreshed_at TEXT NOT NULL,
+            row_count INTEGER NOT NULL
+        );
+    """)
+
+    id_columns = {"providers": "Provider_ID", "receivers": "Receiver_ID",
+                  "food_listings": "Food_ID", "claims": "Claim_ID"}
+    for table, id_col in id_columns.items():
+        execute_script(conn, f"""
+            CREATE TRIGGER trg_{table}_mv_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO mv_change_log (table_name, op, row_id) VALUES ('{table}', 'I', NEW.{id_col});
+            END;
+            CREATE TRIGGER trg_{table}_mv_update AFTER UPDATE ON {table} BEGIN
+                INSERT INTO mv_change_log (table_name, op, row_id) VALUES ('{table}', 'U', NEW.{id_col});
+            END;
+            CREATE TRIGGER trg_{table}_mv_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO mv_change_log (table_name, op, row_id) VALUES ('{table}', 'D', OLD.{id_col});
+            END;
+        """)
+
+
+@migration(4, "ISO-8601 dates with validation and indexes")
+def normalize_dates(conn):
+    # Expiry_Date / Timestamp were stored as "3/17/2025" / "3/5/2025 5:26".
+    # Text in that form does not sort by date and SQLite's date() returns
+    # NULL for it, so rewrite everything as ISO-8601.
+    for table, id_col, column, convert in [("food_listings", "Food_ID", "Expiry_Date", to_iso_date),
+                                           ("claims", "Claim_ID", "Timestamp", to_iso_timestamp)]:
+        updates = []
+        for row_id, value in conn.execute(f"SELECT {id_col}, {column} FROM {table} WHERE {column} IS NOT NULL"):
+            try:
+                iso = convert(value)
+            except ValueError:
+                continue  # Leave values we cannot read untouched
+            if iso != value:
+                updates.append((iso, row_id))
+        conn.executemany(f"UPDATE {table} SET {column} = ? WHERE {id_col} = ?", updates)
+
+    execute_script(conn, """
+        -- Reject writes that are not ISO-8601 (date() / datetime() give back
+        -- exactly the same text only for a valid ISO value)
+        CREATE TRIGGER trg_food_listings_expiry_insert BEFORE INSERT ON food_listings
+        WHEN NEW.Expiry_Date IS NOT NULL AND NEW.Expiry_Date IS NOT date(NEW.Expiry_Date) BEGIN
+            SELECT RAISE(ABORT, 'Expiry_Date must be an ISO date (YYYY-MM-DD)');
+        END;
+        CREATE TRIGGER trg_food_listings_expiry_update BEFORE UPDATE OF Expiry_Date ON food_listings
+        WHEN NEW.Expiry_Date IS NOT NULL AND NEW.Expiry_Date IS NOT date(NEW.Expiry_Date) BEGIN
+            SELECT RAISE(ABORT, 'Expiry_Date must be an ISO date (YYYY-MM-DD)');
+        END;
+        CREATE TRIGGER trg_claims_timestamp_insert BEFORE INSERT ON claims
+        WHEN NEW.Timestamp IS NOT NULL AND NEW.Timestamp IS NOT datetime(NEW.Timestamp) BEGIN
+            SELECT RAISE(ABORT, 'Timestamp must be an ISO timestamp (YYYY-MM-DD HH:MM:SS)');
+        END;
+        CREATE TRIGGER trg_claims_timestamp_update BEFORE UPDATE OF Timestamp ON claims
+        WHEN NEW.Timestamp IS NOT NULL AND NEW.Timestamp IS NOT datetime(NEW.Timestamp) BEGIN
+            SELECT RAISE(ABORT, 'Timestamp must be an ISO timestamp (YYYY-MM-DD HH:MM:SS)');
+        END;
+
+        -- Expiry and time-window queries become index range scans
+        CREATE INDEX idx_food_listings_expiry ON food_listings (Expiry_Date);
+        CREATE INDEX idx_claims_timestamp ON claims (Timestamp);
+        ANALYZE;
+    """)
+
+
+@migration(5, "Geocode cache for providers and receivers")
+def add_geocode_cache(conn):
+    # Coordinates found by geocoding.py, so the gazetteer lookup runs once per
+    # row (and again only when its Address / City text changes)
+    execute_script(conn, """
+        CREATE TABLE geocodes (
+            kind TEXT NOT NULL,          -- 'provider' or 'receiver'
+            id INTEGER NOT NULL,         -- Provider_ID / Receiver_ID
+            source TEXT,                 -- Address / City the coordinates were derived from
+            city TEXT,                   -- City & state read from the address
+            state TEXT,
+            latitude REAL,               -- NULL: could not be located
+            longitude REAL,
+            precision TEXT,              -- 'city' or 'state'
+            PRIMARY KEY (kind, id)
+        ) WITHOUT ROWID;
+    """)
+
+
+@migration(6, "Full-text search indexes (FTS5) for listings, providers and receivers")
+def add_search_indexes(conn):
+    # External-content FTS5 tables: the text stays in the base tables, the
+    # index only holds the terms. Triggers keep it in step with every write.
+    indexes = {
+        "food_listings": ("Food_ID", ["Food_Name", "Food_Type", "Location"]),
+        "providers": ("Provider_ID", ["Name", "Address", "City"]),
+        "receivers": ("Receiver_ID", ["Name", "City"]),
+    }
+    for table, (id_col, columns) in indexes.items():
+        cols = ", ".join(columns)
+        new_values = ", ".join(f"NEW.{c}" for c in columns)
+        old_values = ", ".join(f"OLD.{c}" for c in columns)
+        execute_script(conn, f"""
+            CREATE VIRTUAL TABLE fts_{table} USING fts5(
+                {cols}, content='{table}', content_rowid='{id_col}',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            );
+            CREATE TRIGGER trg_{table}_fts_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO fts_{table} (rowid, {cols}) VALUES (NEW.{id_col}, {new_values});
+            END;
+            CREATE TRIGGER trg_{table}_fts_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO fts_{table} (fts_{table}, rowid, {cols}) VALUES ('delete', OLD.{id_col}, {old_values});
+            END;
+            CREATE TRIGGER trg_{table}_fts_update AFTER UPDATE OF {id_col}, {cols} ON {table} BEGIN
+                INSERT INTO fts_{table} (fts_{table}, rowid, {cols}) VALUES ('delete', OLD.{id_col}, {old_values});
+                INSERT INTO fts_{table} (rowid, {cols}) VALUES (NEW.{id_col}, {new_values});
+            END;
+            INSERT INTO fts_{table} (fts_{table}) VALUES ('rebuild');
+        """)
+
+
+@migration(7, "Claimed quantities and remaining stock on food listings")
+def add_claim_quantities(conn):
+    # From now on food_listings.Quantity is what is LEFT of a listing: every
+    # active claim takes its own Quantity off it, cancelling or deleting the
+    # claim puts it back. The triggers do both in the same statement as the
+    # claim write, so the stock can never drift from the claims.
+    active = "'Pending', 'Completed'"
+    execute_script(conn, f"""
+        ALTER TABLE claims ADD COLUMN Quantity INTEGER;
+
+        -- Until now a claim took the whole listing. Where a listing was claimed
+        -- more than once only its first active claim got the food, so
+        -- listed quantity = what is left + what active claims hold stays true.
+        UPDATE claims SET Quantity = CASE
+            WHEN Status IN ({active}) AND Claim_ID > (SELECT MIN(c.Claim_ID) FROM claims c
+                                                     WHERE c.Food_ID = claims.Food_ID AND c.Status IN ({active}))
+            THEN 0
+            ELSE (SELECT f.Quantity FROM food_listings f WHERE f.Food_ID = claims.Food_ID)
+        END;
+        UPDATE food_listings SET Quantity = 0
+        WHERE EXISTS (SELECT 1 FROM claims c WHERE c.Food_ID = food_listings.Food_ID AND c.Status IN ({active}));
+
+        -- Refuse to hand out more than is left (whichever code writes the claim)
+        CREATE TRIGGER trg_claims_stock_check_insert BEFORE INSERT ON claims
+        WHEN NEW.Status IN ({active})
+         AND NEW.Quantity > (SELECT Quantity FROM food_listings WHERE Food_ID = NEW.Food_ID) BEGIN
+            SELECT RAISE(ABORT, 'Claim Quantity is more than is left of the listing');
+        END;
+        CREATE TRIGGER trg_claims_stock_check_update BEFORE UPDATE OF Status, Quantity, Food_ID ON claims
+        WHEN NEW.Status IN ({active})
+         AND NEW.Quantity > (SELECT Quantity FROM food_listings WHERE Food_ID = NEW.Food_ID)
+                            + CASE WHEN OLD.Status IN ({active}) AND OLD.Food_ID = NEW.Food_ID
+                                   THEN ifnull(OLD.Quantity, 0) ELSE 0 END BEGIN
+            SELECT RAISE(ABORT, 'Claim Quantity is more than is left of the listing');
+        END;
+
+        -- Take the claimed quantity off the listing; a claim without a Quantity takes all that is left
+        CREATE TRIGGER trg_claims_stock_insert AFTER INSERT ON claims
+        WHEN NEW.Status IN ({active}) BEGIN
+            UPDATE claims SET Quantity = (SELECT Quantity FROM food_listings WHERE Food_ID = NEW.Food_ID)
+            WHERE Claim_ID = NEW.Claim_ID AND NEW.Quantity IS NULL;
+            UPDATE food_listings SET Quantity = Quantity - ifnull(NEW.Quantity, Quantity) WHERE Food_ID = NEW.Food_ID;
+        END;
+        CREATE TRIGGER trg_claims_stock_delete AFTER DELETE ON claims
+        WHEN OLD.Status IN ({active}) BEGIN
+            UPDATE food_listings SET Quantity = Quantity + ifnull(OLD.Quantity, 0) WHERE Food_ID = OLD.Food_ID;
+        END;
+        -- Status / quantity changes: give back what the old claim held, take what the new one holds
+        -- (skipped for the NULL -> quantity fill-in above, which was already taken off)
+        CREATE TRIGGER trg_claims_stock_update AFTER UPDATE OF Status, Quantity, Food_ID ON claims
+        WHEN OLD.Quantity IS NOT NULL BEGIN
+            UPDATE food_listings SET Quantity = Quantity + OLD.Quantity
+            WHERE Food_ID = OLD.Food_ID AND OLD.Status IN ({active});
+            UPDATE food_listings SET Quantity = Quantity - ifnull(NEW.Quantity, 0)
+            WHERE Food_ID = NEW.Food_ID AND NEW.Status IN ({active});
+        END;
+
+        -- "Still available" = stock left; a partial index holds only those listings
+        CREATE INDEX idx_food_listings_available ON food_listings (Expiry_Date, Location) WHERE Quantity > 0;
+        ANALYZE;
+    """)
+
+
+@migration(8, "Change-data-capture outbox and consumer cursors")
+def add_change_outbox(conn):
+    # Every insert/update/delete on the base tables appends one compact record
+    # here for downstream consumers (see cdc.py): inserts carry the whole row,
+    # updates only the columns that changed, deletes just the id. Unlike
+    # mv_change_log this is kept until every registered consumer acknowledged it.
+    execute_script(conn, """
+        CREATE TABLE cdc_outbox (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,  -- Never reused, even after compaction
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,                       -- 'I', 'U' or 'D'
+            row_id INTEGER,
+            changes TEXT,                           -- JSON object {column: new value}; NULL for deletes
+            changed_at TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+
+        CREATE TABLE cdc_consumers (
+            name TEXT PRIMARY KEY,
+            acked_seq INTEGER NOT NULL,             -- Everything up to here has been processed
+            registered_at TEXT NOT NULL,
+            acked_at TEXT
+        );
+    """)
+
+    id_columns = {"providers": "Provider_ID", "receivers": "Receiver_ID",
+                  "food_listings": "Food_ID", "claims": "Claim_ID"}
+    for table, id_col in id_columns.items():
+        # The columns as they are now; a later migration adding a column recreates these triggers
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        new_row = ", ".join(f"'{c}', NEW.{c}" for c in columns)
+        changed = " UNION ALL ".join(f"SELECT '{c}' AS k, NEW.{c} AS v WHERE NEW.{c} IS NOT OLD.{c}" for c in columns)
+        any_changed = " OR ".join(f"NEW.{c} IS NOT OLD.{c}" for c in columns)
+        execute_script(conn, f"""
+            CREATE TRIGGER trg_{table}_cdc_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO cdc_outbox (table_name, op, row_id, changes)
+                VALUES ('{table}', 'I', NEW.{id_col}, json_object({new_row}));
+            END;
+            CREATE TRIGGER trg_{table}_cdc_update AFTER UPDATE ON {table}
+            WHEN {any_changed} BEGIN
+                INSERT INTO cdc_outbox (table_name, op, row_id, changes)
+                SELECT '{table}', 'U', OLD.{id_col}, json_group_object(k, v) FROM ({changed});
+            END;
+            CREATE TRIGGER trg_{table}_cdc_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO cdc_outbox (table_name, op, row_id) VALUES ('{table}', 'D', OLD.{id_col});
+            END;
+        """)
+
+
+@migration(9, "Every claim carries a quantity")
+def fill_claim_quantities(conn):
+    # A claim with a NULL Quantity held nothing, so the stock triggers skipped
+    # it - and moving a cancelled one back to Pending / Completed took nothing
+    # off its listing. Now every claim gets a quantity when it is written and
+    # it can no longer be set back to NULL.
+    active = "'Pending', 'Completed'"
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(claims)")]
+    new_row = ", ".join(f"'{c}', NEW.{c}" for c in columns)
+    execute_script(conn, f"""
+        -- Active ones held nothing (their listing had no quantity); inactive ones ask for 1 when reactivated
+        UPDATE claims SET Quantity = CASE WHEN Status IN ({active}) THEN 0 ELSE 1 END
+        WHERE Quantity IS NULL;
+
+        -- One trigger logs the insert to the outbox, then fills in a missing Quantity (all that is
+        -- left for an active claim, 1 otherwise) and takes it off the listing. Its statements run
+        -- in order, so the insert record always comes before the updates it causes - two
+        -- separate triggers would depend on the order SQLite happens to fire them in.
+        DROP TRIGGER trg_claims_cdc_insert;
+        DROP TRIGGER trg_claims_stock_insert;
+        CREATE TRIGGER trg_claims_stock_insert AFTER INSERT ON claims BEGIN
+            INSERT INTO cdc_outbox (table_name, op, row_id, changes)
+            VALUES ('claims', 'I', NEW.Claim_ID, json_object({new_row}));
+            UPDATE claims SET Quantity = CASE WHEN NEW.Status IN ({active})
+                THEN ifnull((SELECT Quantity FROM food_listings WHERE Food_ID = NEW.Food_ID), 0) ELSE 1 END
+            WHERE Claim_ID = NEW.Claim_ID AND NEW.Quantity IS NULL;
+            UPDATE food_listings SET Quantity = Quantity - ifnull(NEW.Quantity, Quantity)
+            WHERE Food_ID = NEW.Food_ID AND NEW.Status IN ({active});
+        END;
+        CREATE TRIGGER trg_claims_quantity_not_null BEFORE UPDATE OF Quantity ON claims
+        WHEN NEW.Quantity IS NULL BEGIN
+            SELECT RAISE(ABORT, 'Claim Quantity cannot be NULL');
+        END;
+    """)
+
+
+# ------------------------------
+# MIGRATION RUNNER
+# ------------------------------
+def current_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)."""
+    conn.execute("""CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT,
+                        applied_at TEXT)""")
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+
+def pending_migrations(conn):
+    """Return the registered migrations that have not been applied yet."""
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+def apply_migrations(db_path):
+    """
+    Apply every pending migration to the database, oldest first.
+
+    Parameters:
+    ----------
+    db_path : str
+        Path to the SQLite database file.
+
+    Returns:
+    -------
+    list of (version, description)
+        The migrations that were applied by this call.
+    """
+    # Autocommit mode so transactions are controlled explicitly below
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    applied = []
+    try:
+        # Tables are rebuilt during migrations, so foreign keys are only
+        # checked once each migration has finished (see foreign_key_check)
+        conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("PRAGMA busy_timeout = 30000")
+        for version, description, func in MIGRATIONS:
+            # IMMEDIATE takes the write lock up front, so two processes
+            # starting at once cannot both apply the same migration
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if version <= current_version(conn):
+                    conn.execute("ROLLBACK")
+                    continue
+                func(conn)
+                problems = conn.execute("PRAGMA foreign_key_check").fetchall()
+                if problems:
+                    raise sqlite3.IntegrityError(
+                        f"Migration {version} left {len(problems)} rows violating foreign keys")
+                conn.execute("INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+                             (version, description, datetime.now().isoformat(timespec="seconds")))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            applied.append((version, description))
+    finally:
+        conn.close()
+    return applied
+
+
+# ------------------------------
+# QUERY PLAN REPORT
+# ------------------------------
+def query_plans(db_path, queries=PREDEFINED_QUERIES):
+    """Return {query title: [EXPLAIN QUERY PLAN lines]} for each query."""
+    conn = sqlite3.connect(db_path)
+    try:
+        plans = {}
+        for title, sql in queries.items():
+            try:
+                rows = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+            except sqlite3.OperationalError:
+                # The query reads columns a pending migration adds (e.g. claims.Quantity)
+                plans[title] = ["n/a (schema not migrated)"]
+                continue
+            plans[title] = [detail for _id, _parent, _unused, detail in rows]
+        return plans
+    finally:
+        conn.close()
+
+
+def migrate_with_report(db_path, queries=PREDEFINED_QUERIES):
+    """
+    Apply pending migrations and return a text report comparing the query
+    plans of the analysis queries before and after.
+    """
+    before = query_plans(db_path, queries)
+    applied = apply_migrations(db_path)
+    after = query_plans(db_path, queries)
+
+    lines = []
+    if applied:
+        lines.append("Applied migrations:")
+        lines += [f"  {version:>3}  {description}" for version, description in applied]
+    else:
+        lines.append("Database already up to date - no migrations applied.")
+    for title in queries:
+        lines.append("")
+        lines.append(f"== {title}")
+        lines += ["  before: " + step for step in before[title]]
+        lines += ["  after:  " + step for step in after[title]]
+    return "\n".join(lines)
+
+
+def check_migrations(db_path, queries=PREDEFINED_QUERIES):
+    """
+    Migrate a copy of a database from its current version to the latest one.
+
+    The copy lives in a temporary directory, so ``db_path`` (e.g. the
+    shipped baseline food_wastage.db) is never changed.
+
+    Returns:
+    -------
+    list of str
+        Problems found (empty when every migration applied cleanly, the
+        copy is at the latest version, passes the integrity and foreign-key
+        checks and runs every analysis query).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        copy_path = os.path.join(tmp, "check.db")
+        source, copy = sqlite3.connect(db_path), sqlite3.connect(copy_path)
+        try:
+            source.backup(copy)
+        finally:
+            source.close()
+            copy.close()
+        migrate_with_report(copy_path, queries)
+
+        problems = []
+        conn = sqlite3.connect(copy_path)
+        try:
+            latest = MIGRATIONS[-1][0]
+            version = current_version(conn)
+            if version != latest:
+                problems.append(f"schema at version {version}, expected {latest}")
+            integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            if integrity != "ok":
+                problems.append(f"integrity check: {integrity}")
+            violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+            if violations:
+                problems.append(f"{len(violations)} rows violate foreign keys")
+            for title, sql in queries.items():
+                try:
+                    conn.execute(sql).fetchall()
+                except sqlite3.Error as exc:
+                    problems.append(f"{title}: {exc}")
+        finally:
+            conn.close()
+        return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply schema migrations to the food wastage database")
+    parser.add_argument("--db", default="food_wastage.db", help="Path to the SQLite database file")
+    parser.add_argument("--check", action="store_true",
+                        help="Migrate a temporary copy start to finish and report problems (the database is left alone)")
+    args = parser.parse_args()
+    if args.check:
+        problems = check_migrations(args.db)
+        for problem in problems:
+            print(f"FAIL {problem}")
+        print(f"{len(problems)} problems" if problems else f"OK: migrated to version {MIGRATIONS[-1][0]}")
+        raise SystemExit(1 if problems else 0)
+    print(migrate_with_report(args.db))
@@ -0,0 +1,65 @@
+# ============================================================
+# 📊 Predefined Analytical Queries
+# ------------------------------------------------------------
+# The 15 insight queries shown on the "📊 Analysis" page.
+# Kept in their own module so the migration report and other
+# tools can use them without starting the Streamlit app.
+# ============================================================
+
+# What active (Pending / Completed) claims hold of each listing. Since
+# migration 7 food_listings.Quantity is what is LEFT, so a listing's listed
+# quantity is Quantity + claimed.
+_CLAIMED_PER_LISTING = """(SELECT Food_ID, SUM(Quantity) AS claimed FROM claims
+                             WHERE Status IN ('Pending', 'Completed') GROUP BY Food_ID)"""
+
+# Dictionary of predefined queries (title -> SQL)
+PREDEFINED_QUERIES = {
+    "Providers per City": "SELECT City, COUNT(*) AS provider_count FROM providers GROUP BY City ORDER BY provider_count DESC",
+    "Receivers per City": "SELECT City, COUNT(*) AS receiver_count FROM receivers GROUP BY City ORDER BY receiver_count DESC",
+    "Top Provider Types by Total Quantity": f"""SELECT f.Provider_Type, SUM(f.Quantity + ifnull(c.claimed, 0)) AS total_qty
+                                                FROM food_listings f
+                                                LEFT JOIN {_CLAIMED_PER_LISTING} c ON c.Food_ID = f.Food_ID
+                                                GROUP BY f.Provider_Type ORDER BY total_qty DESC""",
+    "Contact Info of Providers in a City": "SELECT Name, Contact, City FROM providers WHERE City='Delhi'",  # Example fixed query
+    "Top Receivers by Claimed Quantity": """SELECT r.Name, SUM(c.Quantity) AS total_claimed 
+                                            FROM claims c 
+                                            JOIN receivers r ON c.Receiver_ID = r.Receiver_ID 
+                                            WHERE c.Status IN ('Pending', 'Completed') 
+                                            GROUP BY r.Name ORDER BY total_claimed DESC""",
+    "Total Quantity of Food Available": "SELECT SUM(Quantity) AS total_available FROM food_listings WHERE Quantity > 0",
+    "City with Most Food Listings": """SELECT Location, COUNT(*) AS listings_count 
+                                       FROM food_listings 
+                                       GROUP BY Location ORDER BY listings_count DESC LIMIT 1""",
+    "Most Common Food Types": "SELECT Food_Type, COUNT(*) AS type_count FROM food_listings GROUP BY Food_Type ORDER BY type_count DESC",
+    "Claims per Food Item": """SELECT f.Food_Name, COUNT(c.Claim_ID) AS claims_count 
+                               FROM claims c 
+                               JOIN food_listings f ON c.Food_ID = f.Food_ID 
+                               GROUP BY f.Food_Name ORDER BY claims_count DESC""",
+    "Top Provider by Completed Claims": """SELECT p.Name, COUNT(c.Claim_ID) AS completed_claims 
+                                           FROM claims c 
+                                           JOIN food_listings f ON c.Food_ID = f.Food_ID 
+                                           JOIN providers p ON f.Provider_ID = p.Provider_ID 
+                                           WHERE c.Status = 'Completed' 
+                                           GROUP BY p.Name ORDER BY completed_claims DESC""",
+    "Claim Status Percentage": """SELECT Status, COUNT(*) * 100.0 / (SELECT COUNT(*) FROM claims) AS pct 
+                                  FROM claims GROUP BY Status""",
+    "Average Quantity Claimed per Receiver": """SELECT r.Name, AVG(c.Quantity) AS avg_claimed 
+                                                FROM claims c 
+                                                JOIN receivers r ON c.Receiver_ID = r.Receiver_ID 
+                                                WHERE c.Status IN ('Pending', 'Completed') 
+                                                GROUP BY r.Name ORDER BY avg_claimed DESC""",
+    "Most Claimed Meal Type": """SELECT Meal_Type, COUNT(*) AS meal_count 
+                                 FROM food_listings f 
+                                 JOIN claims c ON f.Food_ID = c.Food_ID 
+                                 GROUP BY Meal_Type ORDER BY meal_count DESC""",
+    "Total Quantity Donated by Each Provider": f"""SELECT p.Name, SUM(f.Quantity + ifnull(c.claimed, 0)) AS total_donated 
+                                                  FROM food_listings f 
+                                                  JOIN providers p ON f.Provider_ID = p.Provider_ID 
+                                                  LEFT JOIN {_CLAIMED_PER_LISTING} c ON c.Food_ID = f.Food_ID 
+                                                  GROUP BY p.Name ORDER BY total_donated DESC""",
+    "Food Items Expiring Soon": "SELECT * FROM food_listings WHERE Expiry_Date <= date('now','+3 day') ORDER BY Expiry_Date ASC"
+}
+
+# Queries whose result depends on the current date/time. They are always
+# run live instead of being stored as materialized views (see materialized.py).
+LIVE_QUERIES = {"Food Items Expiring Soon"}
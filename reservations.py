@@ -0,0 +1,298 @@
+# ============================================================
+# 🔒 Claim Reservation
+# ------------------------------------------------------------
+# A listing's food is never handed out twice, however many
+# receivers claim it at the same moment: every claim is a
+# conditional insert ("only if this much is still left") inside
+# a BEGIN IMMEDIATE transaction, and the caller gets a definitive
+# won / lost answer. The claimed quantity comes off the listing
+# in the same statement (triggers from migration 7).
+# Features:
+# ✅ Check-and-insert is one atomic write (no read-then-write race)
+# ✅ Safe across processes: BEGIN IMMEDIATE takes SQLite's write lock up front
+# ✅ Group commit: attempts queued at the same moment share one transaction
+# ✅ Partial claims: several receivers can share one listing
+# ✅ Benchmark proving no over-allocation under thousands of attempts/sec
+#
+# Command line (writes claims - run it on a copy of the database):
+#   python reservations.py --db food_copy.db --processes 4 --threads 32 --attempts 20000
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import multiprocessing as mp   # Multiprocessing - benchmark writers in separate processes
+import os                      # OS - to read configuration from environment variables
+import queue                   # Queue - attempts waiting for the next transaction
+import random                  # Random - benchmark picks listings & receivers at random
+import sqlite3                 # SQLite - foreign key errors
+import threading               # Threading - concurrent benchmark clients
+import time                    # Time - latency & throughput
+from concurrent.futures import Future
+from datetime import datetime
+
+import database
+from database import get_connection, get_writer
+from dates import to_iso_timestamp
+from expiry import ACTIVE_CLAIM_STATUSES
+from metrics import query_metrics, LatencyHistogram
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+# Most attempts committed in one transaction (the rest wait for the next one)
+RESERVATION_BATCH_SIZE = int(os.environ.get("FOOD_APP_RESERVATION_BATCH_SIZE", "256"))
+
+# Outcomes of a reservation
+WON = "won"
+FULLY_CLAIMED = "fully claimed"
+NOT_ENOUGH_LEFT = "not enough left"
+NO_SUCH_LISTING = "no such listing"
+NO_SUCH_RECEIVER = "no such receiver"
+
+_ACTIVE = ", ".join(f"'{status}'" for status in ACTIVE_CLAIM_STATUSES)
+
+# Inserts nothing when the listing does not exist or has less left than asked
+# for (a NULL quantity asks for everything that is left). Runs as one
+# statement under the write lock, so no other claim can slip in between the
+# check and the insert; the insert trigger takes the quantity off the listing.
+RESERVE_SQL = """
+    INSERT INTO claims (Food_ID, Receiver_ID, Status, Timestamp, Quantity)
+    SELECT f.Food_ID, ?, ?, ?, ifnull(?, f.Quantity) FROM food_listings f
+    WHERE f.Food_ID = ? AND f.Quantity > 0 AND f.Quantity >= ifnull(?, 1)
+"""
+
+# Re-activating a claim (e.g. Cancelled -> Pending) is a reservation too
+UPDATE_STATUS_SQL = f"""
+    UPDATE claims SET Status = ?
+    WHERE Claim_ID = ?
+      AND (? NOT IN ({_ACTIVE}) OR Status IN ({_ACTIVE})
+           OR Quantity <= (SELECT f.Quantity FROM food_listings f WHERE f.Food_ID = claims.Food_ID))
+"""
+
+
+def try_reserve(conn, food_id, receiver_id, status="Pending", timestamp=None, quantity=None):
+    """
+    Claim (part of) a listing for a receiver on ``conn`` (inside the caller's transaction).
+
+    Parameters:
+    ----------
+    quantity : int or None
+        Units wanted; None takes everything that is left.
+
+    Returns:
+    -------
+    dict
+        {"won": bool, "outcome": WON / FULLY_CLAIMED / NOT_ENOUGH_LEFT /
+        NO_SUCH_LISTING / NO_SUCH_RECEIVER, "claim_id": the new claim,
+        "quantity": units claimed, "remaining": units left on the listing}.
+    """
+    timestamp = timestamp or to_iso_timestamp(datetime.now())
+    result = {"won": False, "claim_id": None, "quantity": 0, "remaining": None}
+    try:
+        cursor = conn.execute(RESERVE_SQL, (receiver_id, status, timestamp, quantity, food_id, quantity))
+    except sqlite3.IntegrityError:  # Foreign key: the receiver does not exist
+        return dict(result, outcome=NO_SUCH_RECEIVER)
+    row = conn.execute("SELECT Quantity FROM food_listings WHERE Food_ID = ?", (food_id,)).fetchone()
+    if cursor.rowcount:
+        claimed = conn.execute("SELECT Quantity FROM claims WHERE Claim_ID = ?", (cursor.lastrowid,)).fetchone()[0]
+        return dict(result, won=True, outcome=WON, claim_id=cursor.lastrowid, quantity=claimed, remaining=row[0])
+    if row is None:
+        return dict(result, outcome=NO_SUCH_LISTING)
+    return dict(result, outcome=FULLY_CLAIMED if not row[0] or row[0] <= 0 else NOT_ENOUGH_LEFT, remaining=row[0])
+
+
+# ------------------------------
+# RESERVATION ENGINE
+# ------------------------------
+class ClaimReserver:
+    """
+    Funnels claim attempts into as few write transactions as possible.
+
+    Every attempt is queued and then a drain task is sent to the write
+    queue. The first drain to run takes up to RESERVATION_BATCH_SIZE
+    queued attempts, runs them one after another in a single
+    BEGIN IMMEDIATE transaction and, once that has committed, hands each
+    waiting caller its result; later drains find their attempts already
+    done. Under load one commit (the expensive part) serves hundreds of
+    attempts, and the attempts are still decided strictly one at a time.
+    """
+
+    def __init__(self, batch_size=RESERVATION_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._attempts = queue.Queue()
+
+    def reserve(self, food_id, receiver_id, status="Pending", quantity=None):
+        """Try to claim (part of) a listing. Returns the try_reserve() result once it has been committed."""
+        started = time.perf_counter()
+        quantity = None if quantity is None else int(quantity)
+        if quantity is not None and quantity < 1:
+            raise ValueError("A claim needs a quantity of at least 1")
+        attempt = (int(food_id), int(receiver_id), status, quantity, Future())
+        self._attempts.put(attempt)
+        batch = []
+
+        def drain(conn):
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._attempts.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return []
+            conn.execute("BEGIN IMMEDIATE")
+            timestamp = to_iso_timestamp(datetime.now())
+            return [try_reserve(conn, food, receiver, state, timestamp, units)
+                    for food, receiver, state, units, _ in batch]
+
+        try:
+            results = get_writer().submit(drain, tables=["claims"])
+        except BaseException as exc:
+            for *_, future in batch:
+                future.set_exception(exc)
+        else:
+            # Only now - after the commit - do the callers learn whether they won
+            for (*_, future), result in zip(batch, results):
+                future.set_result(result)
+        result = attempt[4].result()
+        query_metrics.record(RESERVE_SQL, time.perf_counter() - started, int(result["won"]), source="write")
+        return result
+
+
+# Shared by every session in the process (like the connection pool)
+claim_reserver = ClaimReserver()
+
+
+def reserve_claim(food_id, receiver_id, status="Pending", quantity=None):
+    """Claim ``quantity`` units of a listing (None = all that is left) if that much is left (see try_reserve())."""
+    return claim_reserver.reserve(food_id, receiver_id, status, quantity)
+
+
+def set_claim_status(claim_id, status):
+    """
+    Change a claim's status. Returns False (and changes nothing) when the claim
+    would become active again but its quantity is no longer left on the listing.
+    """
+    def write(conn):
+        conn.execute("BEGIN IMMEDIATE")
+        return conn.execute(UPDATE_STATUS_SQL, (status, claim_id, status)).rowcount > 0
+
+    return get_writer().submit(write, tables=["claims"])
+
+
+# ------------------------------
+# CONTENTION BENCHMARK
+# ------------------------------
+def _benchmark_process(db_path, targets, receivers, threads, attempts, seed, start, results):
+    """One app-like process: ``threads`` clients claiming 1-10 units of random target listings."""
+    database.DB_PATH = db_path
+    histogram, won, outcomes, lock = LatencyHistogram(), [], {}, threading.Lock()
+
+    def client(n):
+        rng = random.Random(seed * 1000 + n)
+        start.wait()
+        for _ in range(attempts):
+            began = time.perf_counter()
+            result = reserve_claim(rng.choice(targets), rng.choice(receivers), quantity=rng.randint(1, 10))
+            micros = (time.perf_counter() - began) * 1e6
+            with lock:
+                histogram.record(micros)
+                outcomes[result["outcome"]] = outcomes.get(result["outcome"], 0) + 1
+                if result["won"]:
+                    won.append((result["claim_id"], result["quantity"]))
+
+    get_writer()  # Open the connections before the clock starts
+    workers = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put((histogram, won, outcomes))
+
+
+def run_benchmark(db_path, processes=4, threads=32, attempts=20_000, listings=1_000, seed=0):
+    """
+    Hammer ``listings`` listings that still have food left with ``attempts``
+    claim attempts from processes x threads clients, then check that no
+    listing gave out more than it had.
+
+    Returns:
+    -------
+    dict
+        Attempts per second, latency percentiles (ms), outcome counts and
+        the checks: "over_allocations" (listings whose new claims plus what
+        is left differ from what they had, or that went below zero) and
+        "wins_match_claims" (every "won" answer is a claim in the database
+        with the same quantity, and vice versa).
+    """
+    database.DB_PATH = db_path
+    with get_connection() as conn:
+        before = dict(conn.execute("SELECT Food_ID, Quantity FROM food_listings WHERE Quantity > 0 "
+                                   "ORDER BY Food_ID DESC LIMIT ?", (listings,)).fetchall())
+        first_claim = conn.execute("SELECT ifnull(MAX(Claim_ID), 0) + 1 FROM claims").fetchone()[0]
+        receivers = [row[0] for row in conn.execute("SELECT Receiver_ID FROM receivers ORDER BY random() LIMIT 1000")]
+    targets = sorted(before)
+    if not targets or not receivers:
+        raise ValueError("The database needs listings with food left and receivers to benchmark")
+
+    context = mp.get_context("spawn")  # Fresh processes with their own pool & writer
+    start, results = context.Event(), context.Queue()
+    per_client = max(1, attempts // (processes * threads))
+    workers = [context.Process(target=_benchmark_process,
+                               args=(db_path, targets, receivers, threads, per_client, seed + p, start, results))
+               for p in range(processes)]
+    for worker in workers:
+        worker.start()
+    time.sleep(2)  # Let the processes import and connect
+    began = time.perf_counter()
+    start.set()
+    histogram, won, outcomes = LatencyHistogram(), [], {}
+    for _ in workers:
+        part_histogram, part_won, part_outcomes = results.get()
+        histogram.merge(part_histogram)
+        won += part_won
+        for outcome, n in part_outcomes.items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + n
+    seconds = time.perf_counter() - began
+    for worker in workers:
+        worker.join()
+
+    marks = ", ".join("?" for _ in targets)
+    with get_connection() as conn:
+        claimed = conn.execute(f"SELECT Claim_ID, Food_ID, Quantity FROM claims WHERE Claim_ID >= ? "
+                               f"AND Food_ID IN ({marks}) AND Status IN ({_ACTIVE})", [first_claim] + targets).fetchall()
+        after = dict(conn.execute(f"SELECT Food_ID, Quantity FROM food_listings WHERE Food_ID IN ({marks})",
+                                  targets).fetchall())
+    taken = {}
+    for _claim_id, food_id, quantity in claimed:
+        taken[food_id] = taken.get(food_id, 0) + quantity
+    ms = lambda pct: histogram.percentile(pct) / 1000
+    return {"attempts": histogram.count, "seconds": seconds, "attempts_per_sec": histogram.count / seconds,
+            "p50_ms": ms(50), "p99_ms": ms(99), "max_ms": histogram.max / 1000, "outcomes": outcomes,
+            "listings": len(targets), "units": sum(before.values()), "units_claimed": sum(taken.values()),
+            "fully_claimed": sum(after[food_id] == 0 for food_id in targets),
+            "over_allocations": sum(after[food_id] < 0 or after[food_id] + taken.get(food_id, 0) != before[food_id]
+                                    for food_id in targets),
+            "wins_match_claims": sorted(won) == sorted((claim_id, quantity) for claim_id, _, quantity in claimed)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent claim benchmark (writes claims: use a copy of the database)")
+    parser.add_argument("--db", required=True, help="Database to benchmark")
+    parser.add_argument("--processes", type=int, default=4, help="App processes competing for the write lock")
+    parser.add_argument("--threads", type=int, default=32, help="Concurrent clients per process")
+    parser.add_argument("--attempts", type=int, default=20_000, help="Claim attempts in total")
+    parser.add_argument("--listings", type=int, default=1_000, help="Listings (with food left) to fight over")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.db, args.processes, args.threads, args.attempts, args.listings, args.seed)
+    print(f"{report['attempts']:,} attempts in {report['seconds']:.2f}s = {report['attempts_per_sec']:,.0f}/s "
+          f"(p50 {report['p50_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms, max {report['max_ms']:.1f} ms)")
+    print("Outcomes:", ", ".join(f"{n:,} {outcome}" for outcome, n in sorted(report["outcomes"].items())))
+    print(f"{report['units_claimed']:,} of {report['units']:,} units claimed · "
+          f"{report['fully_claimed']:,} of {report['listings']:,} listings fully claimed · "
+          f"{report['over_allocations']} over-allocated · "
+          f"wins match claims: {'yes' if report['wins_match_claims'] else 'NO'}")
+    raise SystemExit(0 if report["over_allocations"] == 0 and report["wins_match_claims"] else 1)
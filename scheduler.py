@@ -0,0 +1,76 @@
+# ============================================================
+# ⏱️ Background Jobs
+# ------------------------------------------------------------
+# Tiny in-process scheduler for periodic maintenance tasks
+# (e.g. reconciling the dashboard counters). Jobs run on daemon
+# threads, so they stop automatically with the app.
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import threading               # Threading - each job runs on its own daemon thread
+from datetime import datetime  # Datetime - human-readable "last run" times
+
+# ------------------------------
+# JOB REGISTRY
+# ------------------------------
+_jobs = {}                     # Job name -> status dict (see job_status)
+_lock = threading.Lock()
+
+
+def schedule(name, interval, func, run_now=False):
+    """
+    Run ``func()`` every ``interval`` seconds on a background thread.
+
+    Scheduling the same name twice does nothing, so it is safe to call this
+    from code that runs on every Streamlit rerun.
+
+    Parameters:
+    ----------
+    name : str
+        Unique job name (shown in job_status()).
+    interval : float
+        Seconds between two runs (measured from the end of the previous run).
+    func : callable
+        The job. Its return value is kept as ``last_result``.
+    run_now : bool
+        If True, run once immediately instead of waiting one interval.
+    """
+    with _lock:
+        if name in _jobs:
+            return
+        status = {"interval": interval, "runs": 0, "last_run": None,
+                  "last_result": None, "last_error": None, "wake": threading.Event()}
+        _jobs[name] = status
+
+    def loop():
+        if not run_now:
+            status["wake"].wait(interval)
+        while True:
+            status["wake"].clear()
+            try:
+                status["last_result"] = func()
+                status["last_error"] = None
+            except Exception as exc:  # Keep the job alive; report the error instead
+                status["last_error"] = repr(exc)
+            status["runs"] += 1
+            status["last_run"] = datetime.now().isoformat(timespec="seconds")
+            status["wake"].wait(interval)
+
+    threading.Thread(target=loop, name=f"job-{name}", daemon=True).start()
+
+
+def run_soon(name):
+    """Wake a scheduled job up so it runs right away instead of at its next interval."""
+    status = _jobs.get(name)
+    if status is not None:
+        status["wake"].set()
+
+
+def job_status(name=None):
+    """Return the status dict of one job, or of all jobs keyed by name."""
+    public = lambda status: {k: v for k, v in status.items() if k != "wake"}
+    if name is not None:
+        return public(_jobs[name]) if name in _jobs else None
+    return {job: public(status) for job, status in _jobs.items()}
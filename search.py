@@ -0,0 +1,146 @@
+# ============================================================
+# 🔎 Full-Text Search
+# ------------------------------------------------------------
+# One search box for food listings, providers and receivers,
+# answered from SQLite FTS5 indexes instead of LIKE '%...%'
+# scans (the indexes & their triggers are created by migration 6).
+# Features:
+# ✅ Word-prefix matching ("brea" finds "Bread"), accents ignored
+# ✅ bm25 ranking, names weighted above the other columns
+# ✅ Hits of all three tables merged into one ranked, paged list
+#
+# Command line:
+#   python search.py --db food_1m.db "lake bread"
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import os                      # OS - to read configuration from environment variables
+import re                      # Regex - splitting the search text into words
+import time                    # Time - search time reported with the hits
+
+import pandas as pd            # Pandas - merging the hits of the three tables
+
+import database
+from database import read_dataframe
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+SEARCH_PAGE_SIZE = 10          # Hits per page in the sidebar
+
+# bm25 has to score every match before it can sort them; words matching more
+# rows than this in a table (e.g. "bread") are listed newest first instead
+SEARCH_RANK_LIMIT = int(os.environ.get("FOOD_APP_SEARCH_RANK_LIMIT", "5000"))
+
+# Per table: id column, indexed columns with their bm25 weights, how a hit is shown
+SEARCH_TABLES = {
+    "food_listings": {"label": "🍛 Listing", "id": "Food_ID",
+                      "columns": {"Food_Name": 3.0, "Food_Type": 1.0, "Location": 1.5},
+                      "name": "t.Food_Name", "details": "ifnull(t.Food_Type, '') || ' · ' || ifnull(t.Location, '') || ' · expires ' || ifnull(t.Expiry_Date, '?')"},
+    "providers": {"label": "📦 Provider", "id": "Provider_ID",
+                  "columns": {"Name": 3.0, "Address": 1.0, "City": 1.5},
+                  "name": "t.Name", "details": "ifnull(t.Type, '') || ' · ' || ifnull(t.City, '')"},
+    "receivers": {"label": "🎯 Receiver", "id": "Receiver_ID",
+                  "columns": {"Name": 3.0, "City": 1.5},
+                  "name": "t.Name", "details": "ifnull(t.Type, '') || ' · ' || ifnull(t.City, '')"},
+}
+
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix.
+
+    Words are quoted, so FTS5 operators (AND, NEAR, *, column filters)
+    typed by the user are searched for literally instead of raising errors.
+    Returns None when there is nothing to search for.
+    """
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{word}"*' for word in words) or None
+
+
+def _hits_sql(table, ranked):
+    """
+    Best hits of one table. Only the FTS5 index is sorted; the table itself
+    is read for the hits on the page, not for every match.
+    """
+    spec = SEARCH_TABLES[table]
+    weights = ", ".join(str(w) for w in spec["columns"].values())
+    if ranked:
+        hits = (f"SELECT rowid AS hit, rank AS score FROM fts_{table} "
+                f"WHERE fts_{table} MATCH ? AND rank MATCH 'bm25({weights})' ORDER BY rank LIMIT ?")
+    else:
+        hits = f"SELECT rowid AS hit, 0.0 AS score FROM fts_{table} WHERE fts_{table} MATCH ? ORDER BY rowid DESC LIMIT ?"
+    return f"""
+        SELECT '{spec['label']}' AS Type, t.{spec['id']} AS ID, {spec['name']} AS Name,
+               {spec['details']} AS Details, h.score AS score
+        FROM ({hits}) h JOIN {table} t ON t.{spec['id']} = h.hit
+        ORDER BY h.score, h.hit DESC
+    """
+
+
+def search(text, page=0, page_size=SEARCH_PAGE_SIZE):
+    """
+    One page of ranked hits across food listings, providers and receivers.
+
+    Each table returns its best (page + 1) * page_size + 1 hits; merged by
+    bm25 score those contain the requested page and tell whether another
+    page follows. Tables with more than SEARCH_RANK_LIMIT matches are not
+    ranked and come after the ranked ones, newest first.
+
+    Parameters:
+    ----------
+    text : str
+        What the user typed.
+    page : int
+        0-based page number.
+
+    Returns:
+    -------
+    (pandas.DataFrame, dict)
+        The hits (Type, ID, Name, Details, score) and {"counts": hits per
+        table, "has_next": bool, "seconds": float}.
+    """
+    started = time.perf_counter()
+    query = fts_query(text)
+    if query is None:
+        return pd.DataFrame(columns=["Type", "ID", "Name", "Details", "score"]), \
+            {"counts": {t: 0 for t in SEARCH_TABLES}, "has_next": False, "seconds": 0.0}
+
+    wanted = (page + 1) * page_size + 1
+    frames, counts = [], {}
+    for table in SEARCH_TABLES:
+        counts[table] = int(read_dataframe(f"SELECT COUNT(*) AS n FROM fts_{table} WHERE fts_{table} MATCH ?",
+                                           (query,))["n"][0])
+        if counts[table]:
+            frames.append(read_dataframe(_hits_sql(table, counts[table] <= SEARCH_RANK_LIMIT), (query, wanted)))
+    if not frames:
+        return pd.DataFrame(columns=["Type", "ID", "Name", "Details", "score"]), \
+            {"counts": counts, "has_next": False, "seconds": time.perf_counter() - started}
+    hits = pd.concat(frames, ignore_index=True)
+    hits = hits.sort_values("score", kind="stable", ignore_index=True)
+    page_hits = hits.iloc[page * page_size:(page + 1) * page_size].reset_index(drop=True)
+    return page_hits, {"counts": counts, "has_next": len(hits) > (page + 1) * page_size,
+                       "seconds": time.perf_counter() - started}
+
+
+def rebuild_indexes(conn):
+    """Rebuild every FTS5 index from its table (after loading with the triggers dropped)."""
+    for table in SEARCH_TABLES:
+        conn.execute(f"INSERT INTO fts_{table} (fts_{table}) VALUES ('rebuild')")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search food listings, providers and receivers")
+    parser.add_argument("text", help="Words to search for")
+    parser.add_argument("--db", default=database.DB_PATH, help="Database to search")
+    parser.add_argument("--page", type=int, default=0, help="0-based page number")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    hits, info = search(args.text, args.page)
+    print(hits.drop(columns="score").to_string(index=False))
+    print(f"{sum(info['counts'].values()):,} hits ({', '.join(f'{n:,} {t}' for t, n in info['counts'].items())}) "
+          f"in {info['seconds'] * 1000:.1f} ms")
@@ -0,0 +1,324 @@
+# ============================================================
+# 🔤 Typo-Tolerant Name Lookup (Trigram Index)
+# ------------------------------------------------------------
+# Finds providers / receivers by name even when the name is
+# misspelled ("Gonzales" finds "Gonzalez"), by comparing the
+# three-letter pieces (trigrams) two names have in common.
+# Features:
+# ✅ Similarity ranking like PostgreSQL pg_trgm (shared / all trigrams)
+# ✅ Inverted index in NumPy arrays: top matches among a million names in milliseconds
+# ✅ New rows added incrementally (refresh), full rebuild in the background
+#
+# Command line:
+#   python trigram.py --db food_1m.db providers "Gonzales Foods"
+# ============================================================
+
+# ------------------------------
+# Importing Required Libraries
+# ------------------------------
+import argparse                # Argparse - command line options
+import math                    # Math - trigrams a match must share
+import os                      # OS - to read configuration from environment variables
+import re                      # Regex - splitting names into words
+import threading               # Threading - the index is shared by all sessions
+import time                    # Time - lookup timing for the command line
+import unicodedata             # Unicodedata - "José" is indexed as "jose"
+from datetime import datetime
+
+import numpy as np             # NumPy - trigram extraction & match counting
+
+import database
+from database import get_connection
+
+# ------------------------------
+# CONFIGURATION
+# ------------------------------
+# Seconds between two refreshes (new rows) and two full rebuilds (updates & deletes)
+TRIGRAM_REFRESH_INTERVAL = float(os.environ.get("FOOD_APP_TRIGRAM_REFRESH_INTERVAL", "30"))
+TRIGRAM_REBUILD_INTERVAL = float(os.environ.get("FOOD_APP_TRIGRAM_REBUILD_INTERVAL", "600"))
+
+MIN_SIMILARITY = 0.3           # Matches below this are not returned (pg_trgm's default threshold)
+
+# A lookup first looks for matches at least this similar, and only lowers the
+# bar (down to MIN_SIMILARITY) when that finds fewer than k names
+SEARCH_THRESHOLDS = (0.6, 0.45)
+
+# Distinct names added since the last build are kept in a small Python index;
+# past this many they are merged into the NumPy arrays
+MAX_PENDING_NAMES = 50_000
+
+
+def normalize(name):
+    """Lower-case ASCII words, each padded like pg_trgm: "  word " (so word starts weigh more)."""
+    text = (name or "").lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return "".join(f"  {word} " for word in re.findall(r"[a-z0-9]+", text))
+
+
+def trigrams(name):
+    """Set of trigram codes of a name (three bytes packed into one int)."""
+    return _codes_of(normalize(name))
+
+
+def _codes_of(padded):
+    padded = padded.encode("ascii")
+    return {padded[i] << 16 | padded[i + 1] << 8 | padded[i + 2] for i in range(len(padded) - 2)}
+
+
+def _trigram_arrays(padded):
+    """
+    Unique (position, trigram code) pairs of many normalized names at once.
+
+    All names are laid end to end in one byte array, so every trigram is
+    three shifted slices of it; windows that run across two names are dropped.
+    """
+    lengths = np.fromiter((len(p) for p in padded), dtype=np.int64, count=len(padded))
+    data = np.frombuffer("".join(padded).encode("ascii"), dtype=np.uint8).astype(np.int64)
+    if len(data) < 3:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    codes = data[:-2] << 16 | data[1:-1] << 8 | data[2:]
+    owner = np.repeat(np.arange(len(padded)), lengths)[:-2]
+    ends = np.cumsum(lengths)
+    offset = np.arange(len(codes)) - np.repeat(ends - lengths, lengths)[:-2]
+    keep = offset <= lengths[owner] - 3                  # The whole window lies inside one name
+    pairs = _sorted_unique(owner[keep] << 24 | codes[keep])  # One entry per trigram per name
+    return pairs >> 24, pairs & 0xFFFFFF
+
+
+def _sorted_unique(values):
+    """np.unique() via one sort (np.unique itself is far slower on millions of int64)."""
+    values = np.sort(values)
+    first = np.ones(len(values), dtype=bool)
+    first[1:] = values[1:] != values[:-1]
+    return values[first]
+
+
+# ------------------------------
+# TRIGRAM INDEX
+# ------------------------------
+class TrigramIndex:
+    """
+    Names of one table, searchable by trigram similarity.
+
+    Rows whose names normalize alike ("Gonzales LLC", "GONZALES, LLC") share
+    one *term*, and the inverted index is over distinct terms - chains and
+    common names are indexed once, however many rows carry them. It is
+    stored CSR-style: ``codes`` (sorted trigram codes), ``starts`` (where
+    each code's postings begin) and ``postings`` (term numbers).
+    """
+
+    def __init__(self, table, id_column, name_column="Name"):
+        self.table, self.id_column, self.name_column = table, id_column, name_column
+        self._lock = threading.Lock()
+        self._clear()
+        self.built_at = None
+
+    def _clear(self):
+        self._ids, self._names, self._row_term = [], [], []  # Per row position
+        self._alive = bytearray()                    # 0 once a row was renamed (or deleted, at the next rebuild)
+        self._position = {}                          # id -> row position
+        self._terms = {}                             # normalized name -> term number
+        self._term_rows = []                         # term -> row positions
+        self._live = np.empty(0, dtype=np.int32)     # Alive rows per term
+        self._sizes = np.empty(0, dtype=np.int32)    # Trigrams per term
+        self._codes = np.empty(0, dtype=np.int64)
+        self._starts = np.zeros(1, dtype=np.int64)
+        self._postings = np.empty(0, dtype=np.int64)
+        self._pending = {}                           # trigram code -> terms added since the build
+        self._pending_from = 0                       # First term not in the arrays
+        self._max_id = 0
+
+    # ---- maintenance ----
+    def _add_rows(self, rows):
+        """Append (id, name) rows, creating a term for every new normalized name."""
+        joined, left = [], []                        # Term of each added / replaced row
+        normalized = {}
+        for row_id, name in rows:
+            old = self._position.get(row_id)
+            if old is not None and self._alive[old]:
+                self._alive[old] = 0                 # Renamed (or listed twice): the later name wins
+                left.append(self._row_term[old])
+            padded = normalized.get(name)
+            if padded is None:
+                padded = normalized[name] = normalize(name)
+            term = self._terms.get(padded)
+            if term is None:
+                term = self._terms[padded] = len(self._term_rows)
+                self._term_rows.append([])
+            position = len(self._ids)
+            self._ids.append(row_id)
+            self._names.append(name)
+            self._row_term.append(term)
+            self._alive.append(1)
+            self._term_rows[term].append(position)
+            self._position[row_id] = position
+            self._max_id = max(self._max_id, row_id)
+            joined.append(term)
+        terms = len(self._term_rows)
+        live = np.zeros(terms, dtype=np.int32)
+        live[:len(self._live)] = self._live
+        self._live = live + np.bincount(joined, minlength=terms) - np.bincount(left, minlength=terms)
+
+    def _build_arrays(self):
+        """(Re)build the NumPy inverted index over every term."""
+        terms, codes = _trigram_arrays(list(self._terms))
+        order = np.argsort(codes, kind="stable")
+        terms, codes = terms[order], codes[order]
+        first = np.flatnonzero(np.diff(codes, prepend=-1))  # Where each trigram's postings start
+        self._codes = codes[first]
+        self._starts = np.append(first, len(codes))
+        self._postings = terms
+        self._sizes = np.bincount(terms, minlength=len(self._terms)).astype(np.int32)
+        self._pending, self._pending_from = {}, len(self._terms)
+
+    def rebuild(self):
+        """Reload every name from the database. Returns the number indexed."""
+        with get_connection() as conn:
+            rows = conn.execute(f"SELECT {self.id_column}, {self.name_column} FROM {self.table} "
+                                f"WHERE {self.name_column} IS NOT NULL ORDER BY {self.id_column}").fetchall()
+        with self._lock:
+            self._clear()
+            self._add_rows(rows)
+            self._build_arrays()
+            self.built_at = datetime.now().isoformat(sep=" ", timespec="seconds")
+        return len(rows)
+
+    def add(self, rows):
+        """Index new (or renamed) rows: iterable of (id, name)."""
+        with self._lock:
+            first_new = len(self._terms)
+            self._add_rows(rows)
+            if len(self._terms) - self._pending_from > MAX_PENDING_NAMES:
+                self._build_arrays()  # Merge everything added so far into the arrays
+                return
+            sizes = []
+            for term, padded in enumerate(list(self._terms)[first_new:], start=first_new):
+                grams = _codes_of(padded)
+                for code in grams:
+                    self._pending.setdefault(code, []).append(term)
+                sizes.append(len(grams))
+            self._sizes = np.append(self._sizes, np.array(sizes, dtype=np.int32))
+
+    def refresh(self):
+        """Index rows added since the last build / refresh (by id). Returns how many were added."""
+        if self.built_at is None:
+            return self.rebuild()
+        with get_connection() as conn:
+            rows = conn.execute(f"SELECT {self.id_column}, {self.name_column} FROM {self.table} "
+                                f"WHERE {self.id_column} > ? AND {self.name_column} IS NOT NULL "
+                                f"ORDER BY {self.id_column}", (self._max_id,)).fetchall()
+        self.add(rows)
+        return len(rows)
+
+    def ensure_built(self):
+        if self.built_at is None:
+            self.rebuild()
+
+    # ---- queries ----
+    def _postings_of(self, code):
+        """Sorted terms containing a trigram (built arrays + terms added since)."""
+        i = np.searchsorted(self._codes, code)
+        built = self._postings[self._starts[i]:self._starts[i + 1]] if i < len(self._codes) and self._codes[i] == code \
+            else self._postings[:0]
+        pending = self._pending.get(code)
+        return built if pending is None else np.concatenate([built, np.array(pending, dtype=np.int64)])
+
+    def search(self, text, k=10, min_similarity=MIN_SIMILARITY):
+        """
+        The ``k`` rows whose names are most similar to ``text``.
+
+        A name with similarity >= t shares at least ceil(t * q) of the query's
+        q trigrams, so it contains one of its q - ceil(t * q) + 1 rarest
+        trigrams. Only terms found in those postings are candidates; the
+        common trigrams ("  j", "son") are then checked for the candidates
+        alone (binary search), instead of counting their long postings.
+
+        Returns:
+        -------
+        list of (id, name, similarity)
+            Most similar first; similarity = shared trigrams / all trigrams of both names.
+        """
+        self.ensure_built()
+        query = trigrams(text)
+        if not query:
+            return []
+        q = len(query)
+        with self._lock:
+            postings = sorted((self._postings_of(code) for code in query), key=len)
+            thresholds = sorted({t for t in SEARCH_THRESHOLDS if t > min_similarity} | {min_similarity}, reverse=True)
+            for threshold in thresholds:
+                rare = q - math.ceil(threshold * q - 1e-9) + 1
+                found = np.concatenate(postings[:rare])
+                if not len(found):
+                    continue
+                shared = np.bincount(found, minlength=len(self._terms))
+                candidates = np.flatnonzero(shared)
+                shared = shared[candidates]
+                sizes = self._sizes[candidates]
+
+                # Drop candidates that cannot reach the threshold even if they had every common trigram
+                best = np.minimum(shared + (q - rare), sizes)
+                possible = (best >= threshold * (q + sizes - best)) & (self._live[candidates] > 0)
+                candidates, shared, sizes = candidates[possible], shared[possible], sizes[possible]
+                for common in postings[rare:]:
+                    at = np.minimum(np.searchsorted(common, candidates), len(common) - 1)
+                    shared += common[at] == candidates
+
+                similarity = shared / (q + sizes - shared)
+                keep = similarity >= threshold
+                if keep.sum() >= k or threshold == thresholds[-1]:
+                    candidates, similarity = candidates[keep], similarity[keep]
+                    break
+            else:
+                return []
+
+            if len(candidates) > k:  # Every term has a row left, so k terms give at least k rows
+                top = np.argpartition(-similarity, k - 1)[:k]
+                candidates, similarity = candidates[top], similarity[top]
+            hits = []
+            for term, s in zip(candidates.tolist(), similarity.tolist()):
+                rows = (p for p in self._term_rows[term] if self._alive[p])
+                hits += [(self._ids[p], self._names[p], s) for p, _ in zip(rows, range(k))]
+            hits.sort(key=lambda hit: (-hit[2], hit[0]))
+            return hits[:k]
+
+    def __len__(self):
+        return self._alive.count(1)
+
+
+# Shared by every session in the process (like the connection pool)
+provider_names = TrigramIndex("providers", "Provider_ID")
+receiver_names = TrigramIndex("receivers", "Receiver_ID")
+NAME_INDEXES = {"providers": provider_names, "receivers": receiver_names}
+
+
+def refresh_name_indexes():
+    """Pick up new providers & receivers. Returns {table: rows added}."""
+    return {table: index.refresh() for table, index in NAME_INDEXES.items()}
+
+
+def rebuild_name_indexes():
+    """Reload both indexes (also drops deleted and renamed rows). Returns {table: rows indexed}."""
+    return {table: index.rebuild() for table, index in NAME_INDEXES.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Typo-tolerant provider / receiver name lookup")
+    parser.add_argument("table", choices=sorted(NAME_INDEXES), help="Table to search")
+    parser.add_argument("name", help="Name to look for (may be misspelled)")
+    parser.add_argument("--db", default=database.DB_PATH, help="Database to use")
+    parser.add_argument("-k", type=int, default=10, help="Number of matches")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    index = NAME_INDEXES[args.table]
+    started = time.perf_counter()
+    index.rebuild()
+    print(f"Indexed {len(index):,} names ({len(index._terms):,} distinct) in {time.perf_counter() - started:.2f}s")
+    started = time.perf_counter()
+    matches = index.search(args.name, args.k)
+    elapsed = time.perf_counter() - started
+    for row_id, name, similarity in matches:
+        print(f"  {row_id:>8}  {similarity:5.0%}  {name}")
+    print(f"Lookup took {elapsed * 1000:.1f} ms")